@@ -1,5 +1,7 @@
 from django.contrib import admin
+from core.bulk import run_admin_action
 from .models import MessageAnalytics, ClientEngagement, ReportData
+from .tasks import recalculate_analytics_rates
 
 
 @admin.register(MessageAnalytics)
@@ -24,9 +26,10 @@ class MessageAnalyticsAdmin(admin.ModelAdmin):
     actions = ['recalculate_rates']
 
     def recalculate_rates(self, request, queryset):
-        for analytics in queryset:
-            analytics.recalculate_rates()
-        self.message_user(request, f"Показатели для {queryset.count()} записей пересчитаны.")
+        run_admin_action(
+            self, request, queryset, MessageAnalytics.bulk_recalculate_rates, recalculate_analytics_rates,
+            "Показатели для {count} записей пересчитаны."
+        )
     recalculate_rates.short_description = "Пересчитать показатели для выбранных записей"
 
 
@@ -36,7 +39,7 @@ class ClientEngagementAdmin(admin.ModelAdmin):
                     'whatsapp_sent_count', 'whatsapp_read_count', 'updated_at')
     list_filter = ('updated_at',)
     search_fields = ('client__first_name', 'client__last_name', 'client__email')
-    readonly_fields = ('engagement_score',)
+    readonly_fields = ('engagement_score', 'best_send_hour', 'send_histogram_updated_at')
     fieldsets = (
         ('Клиент', {
             'fields': ('client', 'engagement_score')
@@ -48,6 +51,9 @@ class ClientEngagementAdmin(admin.ModelAdmin):
         ('WhatsApp статистика', {
             'fields': ('whatsapp_sent_count', 'whatsapp_delivered_count', 'whatsapp_read_count',
                       'last_whatsapp_sent', 'last_whatsapp_delivered', 'last_whatsapp_read')
+        }),
+        ('Время отправки', {
+            'fields': ('best_send_hour', 'send_histogram_updated_at')
         })
     )
     actions = ['calculate_engagement_score']
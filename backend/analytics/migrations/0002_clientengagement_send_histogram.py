@@ -0,0 +1,28 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientengagement',
+            name='best_send_hour',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Лучший час недели для отправки'),
+        ),
+        migrations.AddField(
+            model_name='clientengagement',
+            name='send_histogram',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Активность по часам недели'),
+        ),
+        migrations.AddField(
+            model_name='clientengagement',
+            name='send_histogram_updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Гистограмма обновлена'),
+        ),
+    ]
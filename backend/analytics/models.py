@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Case, F, FloatField, When
+from django.db.models.functions import Cast
 from django.utils.translation import gettext_lazy as _
 from clients.models import Client
 from campaigns.models import Campaign
@@ -67,6 +69,23 @@ class MessageAnalytics(models.Model):
 
         self.save(update_fields=['delivery_rate', 'open_rate', 'click_rate'])
 
+    @classmethod
+    def bulk_recalculate_rates(cls, pks):
+        """Пересчитывает проценты для записей одним UPDATE."""
+        def rate(numerator, denominator, field):
+            return Case(
+                When(**{f'{denominator}__gt': 0},
+                     then=Cast(numerator, FloatField()) * 100 / F(denominator)),
+                default=F(field),
+                output_field=FloatField()
+            )
+
+        return cls.objects.filter(pk__in=pks).update(
+            delivery_rate=rate('delivered_count', 'sent_count', 'delivery_rate'),
+            open_rate=rate('unique_open_count', 'delivered_count', 'open_rate'),
+            click_rate=rate('unique_click_count', 'unique_open_count', 'click_rate'),
+        )
+
 
 class ClientEngagement(models.Model):
     """Модель для отслеживания вовлеченности клиентов."""
@@ -99,6 +118,12 @@ class ClientEngagement(models.Model):
     # Оценка вовлеченности (рассчитывается на основе активности)
     engagement_score = models.FloatField(_("Оценка вовлеченности"), default=0.0)
 
+    # Гистограмма открытий/кликов/прочтений по часам недели (analytics.sendtime):
+    # 168 счетчиков uint16, 0 — понедельник 00:00 в TIME_ZONE
+    send_histogram = models.BinaryField(_("Активность по часам недели"), blank=True, null=True)
+    best_send_hour = models.PositiveSmallIntegerField(_("Лучший час недели для отправки"), blank=True, null=True)
+    send_histogram_updated_at = models.DateTimeField(_("Гистограмма обновлена"), blank=True, null=True)
+
     # Временные метки
     created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
     updated_at = models.DateTimeField(_("Дата обновления"), auto_now=True)
@@ -0,0 +1,238 @@
+"""
+Оптимизация времени отправки по активности клиента.
+
+Фоновая задача ``build_send_time_histograms`` раз в сутки агрегирует
+события ``open``, ``click`` и ``read`` за последние
+``SEND_TIME_LOOKBACK_DAYS`` дней одним запросом с группировкой по клиенту
+и часу недели и сохраняет для каждого клиента гистограмму из 168 счетчиков
+(``ClientEngagement.send_histogram``, 336 байт) и лучший час недели.
+
+Fan-out кампаний с ``optimize_send_time`` загружает гистограммы всей пачки
+одним запросом и назначает сообщению ``scheduled_at`` — начало самого
+активного часа клиента в ближайшие ``SEND_TIME_HORIZON_HOURS`` часов (не
+позже ``scheduled_end``) со сдвигом на ``id клиента % 60`` минут, чтобы
+отправка одного часа не приходилась на его начало. Клиентам с недостаточной
+историей (меньше ``SEND_TIME_MIN_EVENTS`` событий) время не назначается.
+Воркеры отправки не берут сообщения до ``scheduled_at``, в том числе после
+выпуска черновиков при распределении по окну (``campaigns.pacing``).
+"""
+import sys
+from array import array
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+from django.utils import timezone
+
+from .models import ClientEngagement
+
+HOURS_PER_WEEK = 7 * 24
+
+# События, которые считаются активностью клиента
+ENGAGEMENT_EVENTS = ('open', 'click', 'read')
+
+# Предел счетчика uint16
+MAX_COUNT = 0xFFFF
+
+
+def get_lookback_days():
+    return getattr(settings, 'SEND_TIME_LOOKBACK_DAYS', 90)
+
+
+def get_min_events():
+    return getattr(settings, 'SEND_TIME_MIN_EVENTS', 3)
+
+
+def get_horizon_hours():
+    return getattr(settings, 'SEND_TIME_HORIZON_HOURS', 24)
+
+
+def hour_of_week(value):
+    """Номер часа недели в ``TIME_ZONE``: 0 — понедельник 00:00."""
+    value = timezone.localtime(value)
+    return value.weekday() * 24 + value.hour
+
+
+def pack_histogram(counts):
+    """Упаковывает 168 счетчиков в байты (uint16, little-endian)."""
+    histogram = array('H', (min(count, MAX_COUNT) for count in counts))
+    if sys.byteorder == 'big':
+        histogram.byteswap()
+    return histogram.tobytes()
+
+
+def unpack_histogram(data):
+    """Распаковывает гистограмму; ``None`` для пустого значения."""
+    if not data:
+        return None
+    histogram = array('H')
+    histogram.frombytes(bytes(data))
+    if sys.byteorder == 'big':
+        histogram.byteswap()
+    return histogram if len(histogram) == HOURS_PER_WEEK else None
+
+
+def slot_score(histogram, hour):
+    """Активность часа со сглаживанием соседними часами."""
+    return (
+        2 * histogram[hour]
+        + histogram[(hour - 1) % HOURS_PER_WEEK]
+        + histogram[(hour + 1) % HOURS_PER_WEEK]
+    )
+
+
+def best_hour(histogram, hours=range(HOURS_PER_WEEK), min_events=None):
+    """
+    Самый активный час из ``hours``.
+
+    Returns:
+        int | None: Номер часа недели или ``None``, если событий меньше
+        ``min_events`` или в указанные часы активности нет
+    """
+    min_events = get_min_events() if min_events is None else min_events
+    if histogram is None or sum(histogram) < min_events:
+        return None
+    best, best_score = None, 0
+    for hour in hours:
+        score = slot_score(histogram, hour)
+        if score > best_score:
+            best, best_score = hour, score
+    return best
+
+
+def _save_histograms(histograms, now, min_events):
+    """Сохраняет гистограммы пачки клиентов: обновление и создание записей."""
+    engagements = {}
+    for engagement in (
+        ClientEngagement.objects.filter(client_id__in=histograms)
+        .order_by('client_id', 'pk')
+        .only('id', 'client_id')
+    ):
+        engagements.setdefault(engagement.client_id, engagement)
+
+    created = []
+    for client_id, counts in histograms.items():
+        engagement = engagements.get(client_id)
+        if engagement is None:
+            engagement = ClientEngagement(client_id=client_id)
+            created.append(engagement)
+        engagement.send_histogram = pack_histogram(counts)
+        engagement.best_send_hour = best_hour(counts, min_events=min_events)
+        engagement.send_histogram_updated_at = now
+
+    ClientEngagement.objects.bulk_update(
+        list(engagements.values()),
+        ['send_histogram', 'best_send_hour', 'send_histogram_updated_at']
+    )
+    ClientEngagement.objects.bulk_create(created)
+
+
+def build_histograms(now=None, batch_size=1000):
+    """
+    Пересчитывает гистограммы активности всех клиентов.
+
+    Группировка выполняется базой данных; в памяти одновременно находятся
+    гистограммы не более ``batch_size`` клиентов. Гистограммы клиентов без
+    событий за период очищаются.
+
+    Returns:
+        dict: Количество обновленных и очищенных гистограмм
+    """
+    from messaging.models import MessageEvent
+
+    now = now or timezone.now()
+    min_events = get_min_events()
+    rows = (
+        MessageEvent.objects.filter(
+            event_type__in=ENGAGEMENT_EVENTS,
+            occurred_at__gte=now - timedelta(days=get_lookback_days()),
+            message__client__isnull=False,
+        )
+        .annotate(weekday=ExtractIsoWeekDay('occurred_at'), hour=ExtractHour('occurred_at'))
+        .values('message__client_id', 'weekday', 'hour')
+        .annotate(count=Count('pk'))
+        .order_by('message__client_id')
+    )
+
+    updated = 0
+    histograms = {}
+    for row in rows.iterator(chunk_size=10000):
+        client_id = row['message__client_id']
+        if client_id not in histograms and len(histograms) >= batch_size:
+            _save_histograms(histograms, now, min_events)
+            updated += len(histograms)
+            histograms = {}
+        counts = histograms.setdefault(client_id, [0] * HOURS_PER_WEEK)
+        counts[(row['weekday'] - 1) * 24 + row['hour']] += row['count']
+    if histograms:
+        _save_histograms(histograms, now, min_events)
+        updated += len(histograms)
+
+    cleared = ClientEngagement.objects.filter(send_histogram_updated_at__lt=now).update(
+        send_histogram=None, best_send_hour=None, send_histogram_updated_at=None
+    )
+    return {'updated': updated, 'cleared': cleared}
+
+
+class SendTimeOptimizer:
+    """
+    Назначение времени отправки сообщениям пачки fan-out.
+
+    Часы горизонта вычисляются один раз на запуск; ``schedule`` читает
+    гистограммы клиентов пачки одним запросом.
+    """
+
+    def __init__(self, start, end, min_events=None):
+        self.start = start
+        self.end = end
+        self.min_events = get_min_events() if min_events is None else min_events
+        # Час недели -> начало этого часа в горизонте
+        self.slots = {}
+        slot = timezone.localtime(start).replace(minute=0, second=0, microsecond=0).astimezone(dt_timezone.utc)
+        while slot < end and len(self.slots) < HOURS_PER_WEEK:
+            self.slots.setdefault(hour_of_week(slot), slot)
+            slot += timedelta(hours=1)
+        self.scheduled = 0
+
+    @classmethod
+    def for_campaign(cls, campaign, now=None):
+        """Оптимизатор для кампании или ``None``, если оптимизация выключена."""
+        if not campaign.optimize_send_time:
+            return None
+        now = now or timezone.now()
+        start = max(now, campaign.scheduled_start or now)
+        end = start + timedelta(hours=get_horizon_hours())
+        if campaign.scheduled_end is not None and campaign.scheduled_end > start:
+            end = min(end, campaign.scheduled_end)
+        return cls(start, end)
+
+    def send_at(self, client_id, histogram):
+        """Время отправки клиенту или ``None`` для отправки сразу."""
+        hour = best_hour(histogram, self.slots, self.min_events)
+        if hour is None:
+            return None
+        send_at = self.slots[hour] + timedelta(minutes=client_id % 60)
+        return min(max(send_at, self.start), self.end)
+
+    def schedule(self, messages):
+        """Назначает ``scheduled_at`` несохраненным сообщениям."""
+        client_ids = {message.client_id for message in messages if message.client_id}
+        if not client_ids or not self.slots:
+            return
+        histograms = dict(
+            ClientEngagement.objects.filter(client_id__in=client_ids, send_histogram__isnull=False)
+            .order_by('client_id', '-pk')
+            .values_list('client_id', 'send_histogram')
+        )
+        times = {}
+        for message in messages:
+            if message.client_id not in histograms:
+                continue
+            if message.client_id not in times:
+                times[message.client_id] = self.send_at(
+                    message.client_id, unpack_histogram(histograms[message.client_id])
+                )
+            if times[message.client_id] is not None:
+                message.scheduled_at = times[message.client_id]
+                self.scheduled += 1
@@ -1,11 +1,11 @@
 from rest_framework import serializers
+from core.serializers import DynamicFieldsModelSerializer
 from .models import MessageAnalytics, ClientEngagement, ReportData
-from clients.serializers import ClientSerializer
-from campaigns.serializers import CampaignSerializer
+from .sendtime import unpack_histogram
 
 
-class MessageAnalyticsSerializer(serializers.ModelSerializer):
-    campaign = CampaignSerializer(read_only=True)
+class MessageAnalyticsSerializer(DynamicFieldsModelSerializer):
+    campaign = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = MessageAnalytics
@@ -18,10 +18,14 @@ class MessageAnalyticsSerializer(serializers.ModelSerializer):
             'updated_at'
         ]
         read_only_fields = ['updated_at', 'delivery_rate', 'open_rate', 'click_rate']
+        expandable_fields = {
+            'campaign': ('campaigns.serializers.CampaignSerializer', {}),
+        }
 
 
-class ClientEngagementSerializer(serializers.ModelSerializer):
-    client = ClientSerializer(read_only=True)
+class ClientEngagementSerializer(DynamicFieldsModelSerializer):
+    client = serializers.PrimaryKeyRelatedField(read_only=True)
+    send_histogram = serializers.SerializerMethodField()
 
     class Meta:
         model = ClientEngagement
@@ -31,14 +35,25 @@ class ClientEngagementSerializer(serializers.ModelSerializer):
             'whatsapp_sent_count', 'whatsapp_delivered_count', 'whatsapp_read_count',
             'last_email_sent', 'last_email_opened', 'last_email_clicked',
             'last_whatsapp_sent', 'last_whatsapp_delivered', 'last_whatsapp_read',
-            'engagement_score', 'created_at', 'updated_at'
+            'engagement_score', 'send_histogram', 'best_send_hour', 'send_histogram_updated_at',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'engagement_score', 'best_send_hour', 'send_histogram_updated_at', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['engagement_score', 'created_at', 'updated_at']
+        expandable_fields = {
+            'client': ('clients.serializers.ClientSerializer', {}),
+        }
+
+    def get_send_histogram(self, obj):
+        """Активность по 168 часам недели, начиная с понедельника 00:00."""
+        histogram = unpack_histogram(obj.send_histogram)
+        return list(histogram) if histogram is not None else None
 
 
-class ReportDataSerializer(serializers.ModelSerializer):
-    campaign = CampaignSerializer(read_only=True)
-    client = ClientSerializer(read_only=True)
+class ReportDataSerializer(DynamicFieldsModelSerializer):
+    campaign = serializers.PrimaryKeyRelatedField(read_only=True)
+    client = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = ReportData
@@ -49,4 +64,8 @@ class ReportDataSerializer(serializers.ModelSerializer):
             'report_data',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['created_at', 'updated_at']
+        expandable_fields = {
+            'campaign': ('campaigns.serializers.CampaignSerializer', {}),
+            'client': ('clients.serializers.ClientSerializer', {}),
+        }
\ No newline at end of file
@@ -0,0 +1,17 @@
+from celery import shared_task
+
+from core.bulk import run_selection
+from .models import MessageAnalytics
+from .sendtime import build_histograms
+
+
+@shared_task(bind=True)
+def recalculate_analytics_rates(self, selection):
+    """Пересчитывает показатели записей аналитики (действие администратора)."""
+    return run_selection(selection, MessageAnalytics.bulk_recalculate_rates, task=self)
+
+
+@shared_task
+def build_send_time_histograms():
+    """Пересчитывает гистограммы активности клиентов по часам недели."""
+    return build_histograms()
@@ -1,5 +1,6 @@
 from rest_framework import viewsets, permissions, filters
 from django_filters.rest_framework import DjangoFilterBackend
+from core.queries import QueryPlanningMixin
 from .models import MessageAnalytics, ClientEngagement, ReportData
 from .serializers import (
     MessageAnalyticsSerializer,
@@ -10,7 +11,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 
-class MessageAnalyticsViewSet(viewsets.ReadOnlyModelViewSet):
+class MessageAnalyticsViewSet(QueryPlanningMixin, viewsets.ReadOnlyModelViewSet):
     """
     API для просмотра аналитики сообщений
     """
@@ -42,7 +43,7 @@ class MessageAnalyticsViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(summary)
 
 
-class ClientEngagementViewSet(viewsets.ReadOnlyModelViewSet):
+class ClientEngagementViewSet(QueryPlanningMixin, viewsets.ReadOnlyModelViewSet):
     """
     API для просмотра вовлеченности клиентов
     """
@@ -69,7 +70,7 @@ class ClientEngagementViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
 
-class ReportDataViewSet(viewsets.ModelViewSet):
+class ReportDataViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     """
     API для работы с отчетами
     """
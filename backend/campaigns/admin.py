@@ -1,5 +1,12 @@
-from django.contrib import admin
-from .models import Campaign, CampaignSchedule
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from core.bulk import run_admin_action
+from . import counters
+from .models import Campaign, CampaignSchedule, CampaignFanout
+from .tasks import update_campaign_statistics
 
 
 class CampaignScheduleInline(admin.TabularInline):
@@ -10,13 +17,14 @@ class CampaignScheduleInline(admin.TabularInline):
 @admin.register(Campaign)
 class CampaignAdmin(admin.ModelAdmin):
     list_display = ('name', 'type', 'status', 'is_scheduled', 'scheduled_start', 'sent_count', 'created_at')
-    list_filter = ('type', 'status', 'frequency', 'is_scheduled', 'created_at')
+    list_filter = ('type', 'status', 'frequency', 'pacing', 'is_scheduled', 'created_at')
     search_fields = ('name', 'description')
     date_hierarchy = 'created_at'
     filter_horizontal = ('clients',)
     inlines = [CampaignScheduleInline]
     readonly_fields = (
-    'total_recipients', 'sent_count', 'delivered_count', 'read_count', 'error_count', 'started_at', 'completed_at')
+    'total_recipients', 'sent_count', 'delivered_count', 'read_count', 'error_count', 'started_at', 'completed_at',
+    'next_fire_at', 'last_fired_at')
     fieldsets = (
         ('Основная информация', {
             'fields': ('name', 'description', 'type', 'status')
@@ -28,10 +36,11 @@ class CampaignAdmin(admin.ModelAdmin):
             'fields': ('email_template', 'whatsapp_template')
         }),
         ('Расписание', {
-            'fields': ('is_scheduled', 'scheduled_start', 'scheduled_end', 'frequency', 'custom_schedule')
+            'fields': ('is_scheduled', 'scheduled_start', 'scheduled_end', 'pacing', 'optimize_send_time', 'frequency',
+                       'custom_schedule', 'next_fire_at', 'last_fired_at')
         }),
         ('Ограничения', {
-            'fields': ('max_messages_per_day',),
+            'fields': ('max_messages_per_day', 'ignore_frequency_cap'),
             'classes': ('collapse',)
         }),
         ('Статистика', {
@@ -46,9 +55,12 @@ class CampaignAdmin(admin.ModelAdmin):
     actions = ['update_statistics', 'duplicate_campaign', 'start_campaign', 'pause_campaign', 'complete_campaign']
 
     def update_statistics(self, request, queryset):
-        for campaign in queryset:
-            campaign.update_statistics()
-        self.message_user(request, f"Статистика для {queryset.count()} кампаний обновлена.")
+        # Объем пересчета определяется числом сообщений, а не кампаний
+        messages_count = queryset.aggregate(total=Sum('total_recipients'))['total'] or 0
+        run_admin_action(
+            self, request, queryset, counters.reconcile, update_campaign_statistics,
+            "Статистика для {count} кампаний обновлена.", size=messages_count
+        )
 
     update_statistics.short_description = "Обновить статистику выбранных кампаний"
 
@@ -60,6 +72,7 @@ class CampaignAdmin(admin.ModelAdmin):
             campaign.status = 'draft'
             campaign.started_at = None
             campaign.completed_at = None
+            campaign.last_fired_at = None
             campaign.total_recipients = 0
             campaign.sent_count = 0
             campaign.delivered_count = 0
@@ -82,37 +95,58 @@ class CampaignAdmin(admin.ModelAdmin):
     duplicate_campaign.short_description = "Дублировать выбранные кампании"
 
     def start_campaign(self, request, queryset):
-        from django.utils import timezone
-        for campaign in queryset:
-            campaign.status = 'active'
-            campaign.started_at = timezone.now()
-            campaign.save(update_fields=['status', 'started_at'])
-        self.message_user(request, f"{queryset.count()} кампаний запущено.")
+        now = timezone.now()
+        # Кампании выбираются до обновления: фильтр списка может быть по статусу
+        campaigns = list(queryset.select_related('email_template', 'whatsapp_template'))
+        launched = 0
+        for campaign in campaigns:
+            try:
+                # Статус меняется вместе с запуском: при ошибке кампания
+                # остается в прежнем статусе
+                with transaction.atomic():
+                    campaign.status, campaign.started_at = 'active', now
+                    campaign.save(update_fields=['status', 'started_at', 'updated_at'])
+                    campaign.launch()
+            except ValidationError as exc:
+                self.message_user(request, f"{campaign.name}: {exc.messages[0]}", level=messages.WARNING)
+                continue
+            launched += 1
+        self.message_user(request, f"{launched} кампаний запущено.")
 
     start_campaign.short_description = "Запустить выбранные кампании"
 
     def pause_campaign(self, request, queryset):
-        for campaign in queryset:
-            campaign.status = 'paused'
-            campaign.save(update_fields=['status'])
-        self.message_user(request, f"{queryset.count()} кампаний приостановлено.")
+        count = queryset.update(status='paused', updated_at=timezone.now())
+        self.message_user(request, f"{count} кампаний приостановлено.")
 
     pause_campaign.short_description = "Приостановить выбранные кампании"
 
     def complete_campaign(self, request, queryset):
-        from django.utils import timezone
-        for campaign in queryset:
-            campaign.status = 'completed'
-            campaign.completed_at = timezone.now()
-            campaign.save(update_fields=['status', 'completed_at'])
-        self.message_user(request, f"{queryset.count()} кампаний завершено.")
+        now = timezone.now()
+        count = queryset.update(status='completed', completed_at=now, updated_at=now)
+        self.message_user(request, f"{count} кампаний завершено.")
 
     complete_campaign.short_description = "Завершить выбранные кампании"
 
 
 @admin.register(CampaignSchedule)
 class CampaignScheduleAdmin(admin.ModelAdmin):
-    list_display = ('campaign', 'schedule_type', 'scheduled_time', 'time_of_day', 'is_active')
+    list_display = ('campaign', 'schedule_type', 'scheduled_time', 'time_of_day', 'is_active', 'next_fire_at')
     list_filter = ('schedule_type', 'is_active', 'created_at')
     search_fields = ('campaign__name',)
-    date_hierarchy = 'created_at'
\ No newline at end of file
+    date_hierarchy = 'created_at'
+
+
+@admin.register(CampaignFanout)
+class CampaignFanoutAdmin(admin.ModelAdmin):
+    list_display = (
+        'campaign', 'parent', 'status', 'processed_count', 'created_count', 'suppressed_count', 'capped_count',
+        'paced', 'released_count', 'updated_at', 'completed_at'
+    )
+    list_filter = ('status', 'created_at')
+    search_fields = ('campaign__name',)
+    readonly_fields = (
+        'campaign', 'parent', 'range_start', 'range_end', 'status', 'status_details', 'last_client_id',
+        'processed_count', 'created_count', 'suppressed_count', 'capped_count',
+        'paced', 'released_count', 'completed_at'
+    )
\ No newline at end of file
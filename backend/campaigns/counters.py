@@ -0,0 +1,124 @@
+"""
+Счетчики статистики кампаний.
+
+Счетчики ``Campaign`` отражают текущее распределение статусов сообщений
+кампании (как и ``Campaign.update_statistics``), но поддерживаются
+инкрементально: каждый переход статуса превращается в атомарные
+``UPDATE ... SET x = x + delta`` без пересчета по таблице сообщений.
+Для исправления расхождений используется ``reconcile``, который считает все
+счетчики за один проход условной агрегацией.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Greatest
+
+from .models import Campaign
+
+# Статус сообщения -> поле счетчика кампании
+STATUS_COUNTER_FIELDS = {
+    'sent': 'sent_count',
+    'delivered': 'delivered_count',
+    'read': 'read_count',
+    'failed': 'error_count',
+}
+
+COUNTER_FIELDS = ['total_recipients'] + list(STATUS_COUNTER_FIELDS.values())
+
+
+def transition_deltas(old_status, new_status, count=1):
+    """
+    Возвращает изменения счетчиков для перехода статуса.
+
+    ``old_status=None`` означает создание сообщения, ``new_status=None`` —
+    удаление.
+    """
+    deltas = defaultdict(int)
+    if old_status is None:
+        deltas['total_recipients'] += count
+    if new_status is None:
+        deltas['total_recipients'] -= count
+    if old_status != new_status:
+        if old_status in STATUS_COUNTER_FIELDS:
+            deltas[STATUS_COUNTER_FIELDS[old_status]] -= count
+        if new_status in STATUS_COUNTER_FIELDS:
+            deltas[STATUS_COUNTER_FIELDS[new_status]] += count
+    return {field: delta for field, delta in deltas.items() if delta}
+
+
+def apply_deltas(campaign_deltas):
+    """
+    Применяет изменения счетчиков: один UPDATE на кампанию.
+
+    Args:
+        campaign_deltas (dict): {campaign_id: {поле: изменение}}
+    """
+    for campaign_id, deltas in campaign_deltas.items():
+        updates = {
+            field: Greatest(F(field) + delta, Value(0))
+            for field, delta in deltas.items() if delta
+        }
+        if campaign_id and updates:
+            Campaign.objects.filter(pk=campaign_id).update(**updates)
+
+
+def record_transitions(transitions):
+    """
+    Агрегирует и применяет пачку переходов статусов.
+
+    Args:
+        transitions: Итерируемое из (campaign_id, old_status, new_status, count)
+    """
+    campaign_deltas = defaultdict(lambda: defaultdict(int))
+    for campaign_id, old_status, new_status, count in transitions:
+        if not campaign_id:
+            continue
+        for field, delta in transition_deltas(old_status, new_status, count).items():
+            campaign_deltas[campaign_id][field] += delta
+    apply_deltas(campaign_deltas)
+
+
+def record_transition(campaign_id, old_status, new_status, count=1):
+    """Применяет один переход статуса."""
+    record_transitions([(campaign_id, old_status, new_status, count)])
+
+
+def statistics_aggregates():
+    """Выражения условной агрегации для всех счетчиков кампании."""
+    aggregates = {'total_recipients': Count('pk')}
+    for status, field in STATUS_COUNTER_FIELDS.items():
+        aggregates[field] = Count('pk', filter=Q(status=status))
+    return aggregates
+
+
+def reconcile(campaign_ids):
+    """
+    Пересчитывает счетчики кампаний по сообщениям за один проход.
+
+    Все кампании обрабатываются одним запросом с группировкой по кампании
+    и одним ``bulk_update``.
+
+    Returns:
+        int: Количество обновленных кампаний
+    """
+    from messaging.models import Message
+
+    campaign_ids = list(campaign_ids)
+    if not campaign_ids:
+        return 0
+
+    rows = (
+        Message.objects.filter(campaign_id__in=campaign_ids)
+        .order_by()
+        .values('campaign_id')
+        .annotate(**statistics_aggregates())
+    )
+    stats = {row.pop('campaign_id'): row for row in rows}
+
+    campaigns = list(Campaign.objects.filter(pk__in=campaign_ids).only('pk', *COUNTER_FIELDS))
+    for campaign in campaigns:
+        values = stats.get(campaign.pk, {})
+        for field in COUNTER_FIELDS:
+            setattr(campaign, field, values.get(field, 0))
+    Campaign.objects.bulk_update(campaigns, COUNTER_FIELDS)
+    return len(campaigns)
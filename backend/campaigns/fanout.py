@@ -0,0 +1,534 @@
+"""
+Создание сообщений кампании (fan-out).
+
+Получатели обходятся по возрастанию ``id`` пачками фиксированного размера
+(keyset-пагинация), для каждой пачки рендерятся шаблоны и сообщения
+записываются одним ``bulk_create``. Вставка сообщений и продвижение
+контрольной точки ``CampaignFanout`` выполняются в одной транзакции, поэтому
+после падения, паузы или ошибки обработка продолжается с последней
+зафиксированной пачки; ключи идемпотентности сообщений
+(``messaging.idempotency``) исключают дубликаты при повторе пачки.
+
+Запуски больше ``CAMPAIGN_FANOUT_SHARD_SIZE`` получателей делятся на части
+по диапазонам ``id`` клиентов (дочерние ``CampaignFanout``), которые
+обрабатываются параллельно задачами ``run_campaign_fanout`` на разных
+воркерах. Каждая часть ведет свою контрольную точку и прибавляет счетчики
+к запуску и кампании вместе с пачкой; после остановки части запуск
+пересчитывает счетчики по частям и завершается, когда завершены все части;
+вместе с запуском завершается и кампания, если расписание больше
+не запустит ее (``complete_campaign``).
+
+Получатели с заблокированными адресами (``messaging.suppression``) и
+клиенты, достигшие частотного лимита (``messaging.frequency``),
+пропускаются. Для кампаний с распределением отправки сообщения создаются
+черновиками (``campaigns.pacing``), с оптимизацией времени отправки —
+получают ``scheduled_at`` по активности клиента (``analytics.sendtime``).
+"""
+import math
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Min, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from analytics.sendtime import SendTimeOptimizer
+from clients.models import Client
+from messaging.frequency import FrequencyCap
+from messaging.idempotency import campaign_message_key, create_messages
+from messaging.suppression import SuppressionFilter
+from templates.rendering import BatchRenderer
+from .models import Campaign, CampaignFanout
+from .pacing import is_paced
+
+# Статусы кампании, при которых создание сообщений останавливается
+STOP_STATUSES = ('paused', 'cancelled')
+
+
+def get_chunk_size():
+    return getattr(settings, 'CAMPAIGN_FANOUT_CHUNK_SIZE', 1000)
+
+
+def get_channels(campaign):
+    """Возвращает список пар (тип сообщения, шаблон) для кампании."""
+    channels = []
+    if campaign.type in ('email', 'mixed') and campaign.email_template_id:
+        channels.append(('email', campaign.email_template))
+    if campaign.type in ('whatsapp', 'mixed') and campaign.whatsapp_template_id:
+        channels.append(('whatsapp', campaign.whatsapp_template))
+    return channels
+
+
+# Переменные контекста получателя -> поля клиента, нужные для их вычисления
+CONTEXT_CLIENT_FIELDS = {
+    'first_name': ('first_name',),
+    'last_name': ('last_name',),
+    'full_name': ('first_name', 'last_name'),
+    'email': ('email',),
+    'phone': ('phone',),
+    'whatsapp': ('whatsapp',),
+    'company': ('company',),
+    'position': ('position',),
+    'campaign_name': (),
+}
+
+# Методы клиента, доступные в шаблоне как client.<метод>
+CLIENT_METHOD_FIELDS = {
+    'get_full_name': ('first_name', 'last_name'),
+}
+
+# Поля, которые нужны всегда: адреса получателя
+ADDRESS_FIELDS = ('id', 'email', 'phone', 'whatsapp')
+
+
+def get_client_fields(templates):
+    """
+    Возвращает поля клиента, необходимые для рендеринга шаблонов.
+
+    Использует ``MessageTemplate.used_variables``, вычисленные при сохранении
+    шаблона.
+
+    Returns:
+        list | None: Список полей для ``.only()`` или ``None``, если шаблону
+        нужен весь объект клиента
+    """
+    concrete = {field.attname for field in Client._meta.concrete_fields}
+    fields = set(ADDRESS_FIELDS)
+    for template in templates:
+        if template.used_variables is None:
+            return None
+        for path in template.used_variables:
+            root, _, attribute = path.partition('.')
+            if root == 'client':
+                if attribute in concrete:
+                    fields.add(attribute)
+                elif attribute in CLIENT_METHOD_FIELDS:
+                    fields.update(CLIENT_METHOD_FIELDS[attribute])
+                else:
+                    return None
+            elif root in CONTEXT_CLIENT_FIELDS:
+                fields.update(CONTEXT_CLIENT_FIELDS[root])
+    return sorted(fields)
+
+
+def get_context_names(templates):
+    """Возвращает корневые имена переменных, используемых шаблонами."""
+    names = set()
+    for template in templates:
+        if template.used_variables is None:
+            return None
+        names.update(path.partition('.')[0] for path in template.used_variables)
+    return names
+
+
+def build_client_context(client, campaign, names=None):
+    """
+    Формирует контекст шаблона для одного получателя.
+
+    Args:
+        names (set): Имена переменных, которые нужно вычислить; ``None`` —
+            все. Отложенные поля клиента без этого ограничения вызвали бы
+            отдельный запрос на каждого получателя.
+    """
+    context = {'client': client, 'campaign_name': campaign.name}
+    for name in CONTEXT_CLIENT_FIELDS:
+        if name in context or (names is not None and name not in names):
+            continue
+        if name == 'full_name':
+            context[name] = client.get_full_name()
+        else:
+            context[name] = getattr(client, name)
+    return context
+
+
+def get_recipient_address(client, message_type):
+    """Возвращает пару (to_email, to_number) клиента для типа сообщения."""
+    if message_type == 'email':
+        return client.email, None
+    return None, client.whatsapp or client.phone
+
+
+def build_messages(campaign, channels, clients, renderers=None, suppressions=None, frequency=None,
+                   status='queued'):
+    """
+    Рендерит шаблоны и создает несохраненные сообщения для пачки клиентов.
+
+    Args:
+        renderers (dict): {тип сообщения: BatchRenderer} для рендеринга в пуле
+            процессов; без них рендеринг идет в текущем процессе
+        suppressions (SuppressionFilter): Список блокировки; заблокированные
+            адреса пропускаются до рендеринга
+        frequency (FrequencyCap): Частотные лимиты; клиенты, достигшие
+            лимита канала, пропускаются, если кампания их не игнорирует
+        status (str): Статус новых сообщений; ``draft`` — при распределении
+            отправки по окну (``campaigns.pacing``)
+    """
+    from messaging.models import Message, email_domain
+
+    renderers = renderers or {}
+    names = get_context_names(template for _, template in channels)
+    messages = []
+    for message_type, template in channels:
+        recipients = []
+        for client in clients:
+            to_email, to_number = get_recipient_address(client, message_type)
+            if to_email or to_number:
+                recipients.append((client, to_email, to_number))
+        if suppressions is not None:
+            recipients = suppressions.exclude(
+                message_type, recipients, lambda recipient: recipient[1] or recipient[2]
+            )
+        if frequency is not None and not campaign.ignore_frequency_cap:
+            recipients = frequency.exclude(message_type, recipients, lambda recipient: recipient[0].pk)
+
+        contexts = (build_client_context(client, campaign, names) for client, _, _ in recipients)
+        if message_type in renderers:
+            rendered_items = renderers[message_type].render_many(contexts)
+        else:
+            rendered_items = template.render_many(contexts, processes=1)
+
+        for (client, to_email, to_number), rendered in zip(recipients, rendered_items):
+            messages.append(Message(
+                type=message_type,
+                direction='outgoing',
+                client=client,
+                from_email=settings.DEFAULT_FROM_EMAIL if message_type == 'email' else None,
+                from_number=settings.WHATSAPP_FROM_NUMBER if message_type == 'whatsapp' else None,
+                to_email=to_email,
+                to_number=to_number,
+                recipient_domain=email_domain(to_email),
+                subject=rendered.get('subject'),
+                body=rendered['body'],
+                status=status,
+                lane='campaign',
+                campaign=campaign,
+                template=template,
+            ))
+    return messages
+
+
+def get_shard_size():
+    return getattr(settings, 'CAMPAIGN_FANOUT_SHARD_SIZE', 50000)
+
+
+def get_max_shards():
+    return getattr(settings, 'CAMPAIGN_FANOUT_MAX_SHARDS', 16)
+
+
+def launch_campaign(campaign):
+    """
+    Запускает создание сообщений кампании.
+
+    Если у кампании есть незавершенная контрольная точка (после паузы,
+    падения или ошибки), обработка возобновляется с нее, иначе создается
+    новая. Поиск и создание контрольной точки выполняются под блокировкой
+    строки кампании.
+
+    Returns:
+        CampaignFanout: Контрольная точка запуска
+    """
+    from .tasks import run_campaign_fanout
+
+    if not get_channels(campaign):
+        raise ValidationError("У кампании нет шаблонов для выбранного типа рассылки")
+
+    with transaction.atomic():
+        # Блокировка кампании не дает параллельным запускам создать два
+        # запуска fan-out и продублировать сообщения
+        locked = Campaign.objects.select_for_update().only('pk', 'last_fired_at').get(pk=campaign.pk)
+        if campaign.is_scheduled and campaign.frequency == 'once' and locked.last_fired_at is None:
+            # Ручной запуск однократной кампании заменяет срабатывание расписания
+            campaign.last_fired_at, campaign.next_fire_at = timezone.now(), None
+            Campaign.objects.filter(pk=campaign.pk).update(
+                last_fired_at=campaign.last_fired_at, next_fire_at=None
+            )
+
+        fanout = (
+            campaign.fanouts.filter(parent__isnull=True)
+            .exclude(status='completed')
+            .order_by('-pk')
+            .first()
+        )
+        if fanout is None:
+            fanout = CampaignFanout.objects.create(campaign=campaign)
+        elif fanout.status == 'failed':
+            fanout.status = 'paused'
+            CampaignFanout.objects.filter(pk=fanout.pk).update(
+                status='paused', status_details=None, updated_at=timezone.now()
+            )
+        transaction.on_commit(lambda: run_campaign_fanout.delay(fanout.pk))
+    return fanout
+
+
+def plan_shards(fanout, recipients):
+    """
+    Делит получателей запуска на диапазоны ``id`` клиентов.
+
+    Количество частей — по ``CAMPAIGN_FANOUT_SHARD_SIZE`` получателей, но
+    не больше ``CAMPAIGN_FANOUT_MAX_SHARDS``; границы — квантили ``id``
+    получателей, поэтому части получают поровну получателей и при
+    разреженном сегменте. Последний диапазон открыт сверху.
+
+    Returns:
+        list: Созданные части или пустой список, если делить не нужно
+    """
+    stats = recipients.order_by().aggregate(total=Count('pk'), first=Min('pk'))
+    count = min(get_max_shards(), math.ceil(stats['total'] / get_shard_size()))
+    if count < 2:
+        return []
+
+    # Границы частей — id получателей с номерами total * k / count; номера
+    # вычисляются одним упорядоченным проходом по первичному ключу в базе
+    rows = [index * stats['total'] // count for index in range(1, count)]
+    boundaries = [stats['first'] - 1] + list(
+        recipients.order_by()
+        .annotate(row_number=Window(RowNumber(), order_by=F('pk').asc()))
+        .filter(row_number__in=rows)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    boundaries.append(None)
+
+    shards = []
+    for range_start, range_end in zip(boundaries, boundaries[1:]):
+        shards.append(CampaignFanout(
+            campaign_id=fanout.campaign_id,
+            parent=fanout,
+            range_start=range_start,
+            range_end=range_end,
+            last_client_id=range_start,
+        ))
+    return CampaignFanout.objects.bulk_create(shards)
+
+
+def dispatch_shards(fanout):
+    """Ставит в очередь незавершенные части запуска, сбрасывая ошибки."""
+    from .tasks import run_campaign_fanout
+
+    shards = fanout.shards.exclude(status='completed')
+    shards.filter(status='failed').update(status='paused', status_details=None, updated_at=timezone.now())
+    shard_ids = list(shards.values_list('pk', flat=True))
+    CampaignFanout.objects.filter(pk=fanout.pk).update(
+        status='running', status_details=None, updated_at=timezone.now()
+    )
+    transaction.on_commit(lambda: [run_campaign_fanout.delay(shard_id) for shard_id in shard_ids])
+    return shard_ids
+
+
+def complete_campaign(campaign_id, now):
+    """
+    Завершает активную кампанию после создания всех сообщений.
+
+    Кампании с предстоящими срабатываниями расписания (``next_fire_at``)
+    остаются активными.
+    """
+    Campaign.objects.filter(pk=campaign_id, status='active', next_fire_at__isnull=True).update(
+        status='completed', completed_at=now, updated_at=now
+    )
+
+
+def update_coordinator(fanout_id):
+    """
+    Сводит состояние частей в координирующий запуск.
+
+    Счетчики запуска пересчитываются суммой по частям; запуск и кампания
+    (``complete_campaign``) завершаются в одной транзакции, когда завершены
+    все части. Запуск считается ошибочным, если какая-то часть упала, а
+    остальные уже остановились.
+    """
+    with transaction.atomic():
+        fanout = CampaignFanout.objects.select_for_update().get(pk=fanout_id)
+        shards = fanout.shards.all()
+        statuses = set(shards.values_list('status', flat=True))
+        totals = shards.aggregate(
+            processed=Sum('processed_count'), created=Sum('created_count'),
+            suppressed=Sum('suppressed_count'), capped=Sum('capped_count'),
+        )
+        now = timezone.now()
+        changes = {
+            'processed_count': totals['processed'] or 0,
+            'created_count': totals['created'] or 0,
+            'suppressed_count': totals['suppressed'] or 0,
+            'capped_count': totals['capped'] or 0,
+            'updated_at': now,
+        }
+        if statuses <= {'completed'}:
+            changes.update(status='completed', completed_at=now)
+            if fanout.status != 'completed':
+                complete_campaign(fanout.campaign_id, now)
+        elif statuses & {'pending', 'running'}:
+            changes['status'] = 'running'
+        elif 'failed' in statuses:
+            changes.update(
+                status='failed',
+                status_details='; '.join(
+                    filter(None, shards.filter(status='failed').values_list('status_details', flat=True))
+                ),
+            )
+        else:
+            changes['status'] = 'paused'
+        CampaignFanout.objects.filter(pk=fanout.pk).update(**changes)
+
+
+def run_fanout(fanout_id, chunk_size=None):
+    """
+    Выполняет создание сообщений по контрольной точке.
+
+    Память процесса ограничена размером пачки: в каждый момент загружены
+    только id и строки клиентов текущей пачки. Большие запуски делятся на
+    части (``plan_shards``), которые обрабатываются параллельно отдельными
+    задачами; сам запуск в этом случае только координирует их.
+
+    Returns:
+        CampaignFanout: Контрольная точка после обработки
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    fanout = CampaignFanout.objects.select_related(
+        'campaign__email_template', 'campaign__whatsapp_template', 'parent'
+    ).get(pk=fanout_id)
+    if fanout.is_finished:
+        return fanout
+
+    campaign = fanout.campaign
+    channels = get_channels(campaign)
+    recipients = campaign.get_recipients().order_by('pk')
+    # Запуск целиком: для части — координирующий запуск
+    run = fanout.parent or fanout
+    # Решение о распределении и делении принимается один раз на запуск
+    if fanout.status == 'pending' and fanout.parent_id is None:
+        with transaction.atomic():
+            locked = CampaignFanout.objects.select_for_update().get(pk=fanout.pk)
+            fanout.paced = locked.paced
+            if locked.status == 'pending':
+                fanout.paced = is_paced(campaign)
+                plan_shards(fanout, recipients)
+                CampaignFanout.objects.filter(pk=fanout.pk).update(
+                    status='running', paced=fanout.paced, updated_at=timezone.now()
+                )
+    if fanout.parent_id is None and fanout.shards.exists():
+        dispatch_shards(fanout)
+        fanout.refresh_from_db()
+        return fanout
+
+    suppressions = SuppressionFilter.load()
+    frequency = FrequencyCap.from_settings()
+    send_time = SendTimeOptimizer.for_campaign(campaign)
+    CampaignFanout.objects.filter(pk=fanout.pk).update(status='running', updated_at=timezone.now())
+
+    processes = getattr(settings, 'MESSAGE_RENDER_PROCESSES', None)
+    try:
+        with ExitStack() as stack:
+            renderers = {
+                message_type: stack.enter_context(BatchRenderer(template, processes=processes))
+                for message_type, template in channels
+            }
+            _run_chunks(
+                fanout, campaign, channels, recipients, chunk_size, renderers, suppressions, frequency,
+                message_status='draft' if run.paced else 'queued', send_time=send_time
+            )
+    finally:
+        if fanout.parent_id is not None:
+            update_coordinator(fanout.parent_id)
+
+    fanout.refresh_from_db()
+    return fanout
+
+
+def _run_chunks(fanout, campaign, channels, recipients, chunk_size, renderers,
+                suppressions=None, frequency=None, message_status='queued', send_time=None):
+    """Обрабатывает пачки получателей, начиная с контрольной точки."""
+    if fanout.range_end is not None:
+        recipients = recipients.filter(pk__lte=fanout.range_end)
+    # Счетчики части дублируются в координирующий запуск
+    fanout_ids = [fanout.pk] + ([fanout.parent_id] if fanout.parent_id else [])
+    try:
+        while True:
+            status = Campaign.objects.filter(pk=campaign.pk).values_list('status', flat=True).first()
+            if status is None or status in STOP_STATUSES:
+                CampaignFanout.objects.filter(pk=fanout.pk).update(status='paused', updated_at=timezone.now())
+                break
+
+            client_ids = list(
+                recipients.filter(pk__gt=fanout.last_client_id).values_list('pk', flat=True)[:chunk_size]
+            )
+            if not client_ids:
+                now = timezone.now()
+                with transaction.atomic():
+                    CampaignFanout.objects.filter(pk=fanout.pk).update(
+                        status='completed', completed_at=now, updated_at=now
+                    )
+                    if fanout.parent_id is None:
+                        # Части завершают кампанию через координирующий запуск
+                        complete_campaign(campaign.pk, now)
+                break
+
+            with transaction.atomic():
+                # Блокируем контрольную точку: если другой воркер уже обработал
+                # эту пачку, начинаем со свежей позиции
+                locked = CampaignFanout.objects.select_for_update().get(pk=fanout.pk)
+                if locked.last_client_id != fanout.last_client_id or locked.is_finished:
+                    fanout = locked
+                    if locked.is_finished:
+                        break
+                    continue
+
+                excluded = suppressions.excluded if suppressions is not None else 0
+                capped = frequency.excluded if frequency is not None else 0
+                created = process_chunk(
+                    campaign, channels, client_ids, renderers, suppressions, frequency, message_status,
+                    send_time, fanout.parent_id or fanout.pk
+                )
+                suppressed = suppressions.excluded - excluded if suppressions is not None else 0
+                capped = frequency.excluded - capped if frequency is not None else 0
+
+                CampaignFanout.objects.filter(pk=fanout.pk).update(last_client_id=client_ids[-1])
+                CampaignFanout.objects.filter(pk__in=fanout_ids).update(
+                    processed_count=F('processed_count') + len(client_ids),
+                    created_count=F('created_count') + created,
+                    suppressed_count=F('suppressed_count') + suppressed,
+                    capped_count=F('capped_count') + capped,
+                    updated_at=timezone.now(),
+                )
+                Campaign.objects.filter(pk=campaign.pk).update(
+                    total_recipients=F('total_recipients') + created
+                )
+
+            fanout.last_client_id = client_ids[-1]
+    except Exception as exc:
+        CampaignFanout.objects.filter(pk=fanout.pk).update(
+            status='failed', status_details=str(exc), updated_at=timezone.now()
+        )
+        raise
+
+
+def process_chunk(campaign, channels, client_ids, renderers=None, suppressions=None, frequency=None,
+                  status='queued', send_time=None, fanout_id=None):
+    """
+    Обрабатывает одну пачку получателей.
+
+    Args:
+        send_time (SendTimeOptimizer): Назначает сообщениям время отправки
+            по активности клиентов
+        fanout_id (int): Запуск кампании для ключей идемпотентности;
+            сообщения, уже созданные этим запуском, пропускаются
+
+    Returns:
+        int: Количество созданных сообщений
+    """
+    clients = Client.objects.filter(pk__in=client_ids).order_by('pk')
+    fields = get_client_fields(template for _, template in channels)
+    if fields is not None:
+        # Загружаем только столбцы, которые используют шаблоны
+        clients = clients.only(*fields)
+    messages = build_messages(campaign, channels, clients, renderers, suppressions, frequency, status)
+    if send_time is not None:
+        send_time.schedule(messages)
+    if fanout_id is not None:
+        for message in messages:
+            message.idempotency_key = campaign_message_key(fanout_id, message.type, message.client_id)
+    messages = create_messages(messages)
+    if frequency is not None:
+        frequency.record(messages)
+    return len(messages)
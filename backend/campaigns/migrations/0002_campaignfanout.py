@@ -0,0 +1,34 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignFanout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('running', 'Выполняется'), ('paused', 'Приостановлена'), ('completed', 'Завершена'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('status_details', models.TextField(blank=True, null=True, verbose_name='Детали статуса')),
+                ('last_client_id', models.BigIntegerField(default=0, verbose_name='Последний обработанный клиент')),
+                ('processed_count', models.PositiveIntegerField(default=0, verbose_name='Обработано получателей')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='Создано сообщений')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fanouts', to='campaigns.campaign', verbose_name='Кампания')),
+            ],
+            options={
+                'verbose_name': 'Создание сообщений кампании',
+                'verbose_name_plural': 'Создание сообщений кампаний',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
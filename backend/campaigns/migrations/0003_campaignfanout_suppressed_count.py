@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0002_campaignfanout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaignfanout',
+            name='suppressed_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Пропущено заблокированных'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0003_campaignfanout_suppressed_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='ignore_frequency_cap',
+            field=models.BooleanField(default=False, verbose_name='Без частотных лимитов'),
+        ),
+        migrations.AddField(
+            model_name='campaignfanout',
+            name='capped_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Пропущено по частотному лимиту'),
+        ),
+    ]
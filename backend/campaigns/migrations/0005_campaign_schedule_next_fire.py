@@ -0,0 +1,152 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:37
+
+import calendar
+from datetime import datetime, time, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.dateparse import parse_time
+
+# Вычисление следующего срабатывания на момент миграции (копия
+# campaigns.scheduling, чтобы последующие изменения модуля не меняли миграцию)
+PERIOD_DAYS = {'daily': 1, 'weekly': 7}
+
+
+def next_weekly(days_of_week, time_of_day, after):
+    if time_of_day is None:
+        return None
+    weekdays = {day for day in (days_of_week or []) if isinstance(day, int) and 0 <= day <= 6}
+    weekdays = weekdays or set(range(7))
+    start = timezone.localtime(after).date()
+    for offset in range(8):
+        day = start + timedelta(days=offset)
+        if day.weekday() not in weekdays:
+            continue
+        candidate = timezone.make_aware(datetime.combine(day, time_of_day))
+        if candidate > after:
+            return candidate
+    return None
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    year = value.year + month // 12
+    month = month % 12 + 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def next_periodic(start, frequency, after):
+    if start > after:
+        return start
+    start, after = timezone.localtime(start), timezone.localtime(after)
+    if frequency == 'monthly':
+        step = 12 * (after.year - start.year) + after.month - start.month
+        candidate = add_months(start, step)
+        while candidate <= after:
+            step += 1
+            candidate = add_months(start, step)
+        return candidate
+    period = timedelta(days=PERIOD_DAYS[frequency])
+    step = (after - start) // period
+    candidate = start + step * period
+    while candidate <= after:
+        step += 1
+        candidate = start + step * period
+    return candidate
+
+
+def schedule_next_fire(schedule, now):
+    if schedule.schedule_type == 'fixed':
+        return schedule.scheduled_time
+    return next_weekly(schedule.days_of_week, schedule.time_of_day, now)
+
+
+def campaign_next_fire(campaign, now):
+    start = campaign.scheduled_start
+    if start is None:
+        return None
+    if campaign.frequency == 'once':
+        return start
+    if campaign.frequency == 'custom':
+        custom = campaign.custom_schedule if isinstance(campaign.custom_schedule, dict) else {}
+        time_of_day = custom.get('time_of_day')
+        if isinstance(time_of_day, str):
+            time_of_day = parse_time(time_of_day)
+        if not isinstance(time_of_day, time):
+            return None
+        after = max(now, start - timedelta(microseconds=1))
+        next_fire = next_weekly(custom.get('days_of_week'), time_of_day, after)
+    elif campaign.frequency in PERIOD_DAYS or campaign.frequency == 'monthly':
+        next_fire = next_periodic(start, campaign.frequency, now)
+    else:
+        return None
+    if next_fire is not None and campaign.scheduled_end is not None and next_fire > campaign.scheduled_end:
+        return None
+    return next_fire
+
+
+def fill_next_fire(apps, schema_editor):
+    """
+    Вычисляет следующее срабатывание существующих расписаний.
+
+    Однократные срабатывания, время которых уже прошло, считаются
+    состоявшимися (``last_fired_at``), чтобы первый запуск планировщика
+    после обновления не повторил рассылку.
+    """
+    Campaign = apps.get_model('campaigns', 'Campaign')
+    CampaignSchedule = apps.get_model('campaigns', 'CampaignSchedule')
+    now = timezone.now()
+
+    for model, queryset, next_fire in (
+        (CampaignSchedule, CampaignSchedule.objects.filter(is_active=True), schedule_next_fire),
+        (Campaign, Campaign.objects.filter(is_scheduled=True), campaign_next_fire),
+    ):
+        batch = []
+        for item in queryset.iterator(chunk_size=1000):
+            item.next_fire_at = next_fire(item, now)
+            if item.next_fire_at is not None and item.next_fire_at <= now:
+                item.last_fired_at, item.next_fire_at = item.next_fire_at, None
+            batch.append(item)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ['next_fire_at', 'last_fired_at'])
+                batch = []
+        model.objects.bulk_update(batch, ['next_fire_at', 'last_fired_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0004_frequency_cap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='last_fired_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последний запуск'),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='next_fire_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Следующий запуск'),
+        ),
+        migrations.AddField(
+            model_name='campaignschedule',
+            name='last_fired_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последний запуск'),
+        ),
+        migrations.AddField(
+            model_name='campaignschedule',
+            name='next_fire_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Следующий запуск'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(condition=models.Q(('next_fire_at__isnull', False)), fields=['next_fire_at'], name='campaign_next_fire_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaignschedule',
+            index=models.Index(condition=models.Q(('next_fire_at__isnull', False)), fields=['next_fire_at'], name='schedule_next_fire_idx'),
+        ),
+        migrations.RunPython(fill_next_fire, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0005_campaign_schedule_next_fire'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='pacing',
+            field=models.CharField(choices=[('none', 'Без распределения'), ('even', 'Равномерно'), ('front_loaded', 'Больше в начале'), ('back_loaded', 'Больше в конце')], default='none', max_length=20, verbose_name='Распределение отправки'),
+        ),
+        migrations.AddField(
+            model_name='campaignfanout',
+            name='paced',
+            field=models.BooleanField(default=False, verbose_name='С распределением'),
+        ),
+        migrations.AddField(
+            model_name='campaignfanout',
+            name='released_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Выпущено в отправку'),
+        ),
+    ]
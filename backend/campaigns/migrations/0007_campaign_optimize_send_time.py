@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0006_campaign_pacing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='optimize_send_time',
+            field=models.BooleanField(default=False, verbose_name='Оптимальное время отправки'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0007_campaign_optimize_send_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaignfanout',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='campaigns.campaignfanout', verbose_name='Запуск'),
+        ),
+        migrations.AddField(
+            model_name='campaignfanout',
+            name='range_end',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Конец диапазона клиентов'),
+        ),
+        migrations.AddField(
+            model_name='campaignfanout',
+            name='range_start',
+            field=models.BigIntegerField(default=0, verbose_name='Начало диапазона клиентов'),
+        ),
+    ]
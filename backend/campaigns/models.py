@@ -83,8 +83,21 @@ class Campaign(models.Model):
     )
     status = models.CharField(_("Статус"), max_length=10, choices=STATUS_CHOICES, default='draft')
 
+    # Распределение отправки по окну scheduled_start — scheduled_end (campaigns.pacing)
+    PACING_CHOICES = (
+        ('none', _('Без распределения')),
+        ('even', _('Равномерно')),
+        ('front_loaded', _('Больше в начале')),
+        ('back_loaded', _('Больше в конце')),
+    )
+    pacing = models.CharField(_("Распределение отправки"), max_length=20, choices=PACING_CHOICES, default='none')
+    # Отправка каждому клиенту в его самый активный час (analytics.sendtime)
+    optimize_send_time = models.BooleanField(_("Оптимальное время отправки"), default=False)
+
     # Ограничения
     max_messages_per_day = models.PositiveIntegerField(_("Макс. сообщений в день"), blank=True, null=True)
+    # Не применять частотные лимиты клиентов (messaging.frequency)
+    ignore_frequency_cap = models.BooleanField(_("Без частотных лимитов"), default=False)
 
     # Статистика
     total_recipients = models.PositiveIntegerField(_("Всего получателей"), default=0)
@@ -99,14 +112,38 @@ class Campaign(models.Model):
     started_at = models.DateTimeField(_("Дата начала"), blank=True, null=True)
     completed_at = models.DateTimeField(_("Дата завершения"), blank=True, null=True)
 
+    # Расписание кампании (campaigns.scheduling): следующее и последнее срабатывание
+    next_fire_at = models.DateTimeField(_("Следующий запуск"), blank=True, null=True, editable=False)
+    last_fired_at = models.DateTimeField(_("Последний запуск"), blank=True, null=True, editable=False)
+
+    # Поля, от которых зависит следующее срабатывание
+    SCHEDULE_FIELDS = {'is_scheduled', 'scheduled_start', 'scheduled_end', 'frequency', 'custom_schedule'}
+
     class Meta:
         verbose_name = _("Кампания")
         verbose_name_plural = _("Кампании")
         ordering = ['-created_at']
+        indexes = [
+            # Выборка наступивших срабатываний планировщиком
+            models.Index(
+                fields=['next_fire_at'], name='campaign_next_fire_idx',
+                condition=models.Q(next_fire_at__isnull=False)
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        from .scheduling import campaign_next_fire
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.SCHEDULE_FIELDS & set(update_fields):
+            self.next_fire_at = campaign_next_fire(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'next_fire_at'}
+        super().save(*args, **kwargs)
+
     @property
     def is_active(self):
         return self.status == 'active'
@@ -116,23 +153,44 @@ class Campaign(models.Model):
         return self.status == 'completed'
 
     def update_statistics(self):
-        """Обновляет статистику кампании на основе связанных сообщений."""
-        from messaging.models import Message
-
-        # Получаем все сообщения этой кампании
-        messages = Message.objects.filter(campaign=self)
-
-        # Обновляем счетчики
-        self.total_recipients = messages.count()
-        self.sent_count = messages.filter(status='sent').count()
-        self.delivered_count = messages.filter(status='delivered').count()
-        self.read_count = messages.filter(status='read').count()
-        self.error_count = messages.filter(status='failed').count()
+        """
+        Обновляет статистику кампании на основе связанных сообщений.
 
-        self.save(update_fields=[
-            'total_recipients', 'sent_count', 'delivered_count',
-            'read_count', 'error_count'
-        ])
+        Все счетчики считаются за один проход условной агрегацией. В обычной
+        работе счетчики поддерживаются инкрементально (см. ``counters``),
+        этот метод нужен для исправления расхождений.
+        """
+        from messaging.models import Message
+        from .counters import COUNTER_FIELDS, statistics_aggregates
+
+        stats = Message.objects.filter(campaign=self).aggregate(**statistics_aggregates())
+        for field in COUNTER_FIELDS:
+            setattr(self, field, stats[field])
+
+        self.save(update_fields=COUNTER_FIELDS)
+
+    def get_recipients(self):
+        """
+        Возвращает queryset получателей кампании.
+
+        Объединяет участников группы клиентов и индивидуально выбранных
+        клиентов через подзапросы по таблицам связей, без дубликатов.
+        """
+        recipients = models.Q(
+            pk__in=Campaign.clients.through.objects.filter(campaign_id=self.pk).values('client_id')
+        )
+        if self.client_group_id:
+            recipients |= models.Q(
+                pk__in=ClientGroup.clients.through.objects.filter(
+                    clientgroup_id=self.client_group_id
+                ).values('client_id')
+            )
+        return Client.objects.filter(recipients)
+
+    def launch(self):
+        """Запускает (или возобновляет) создание сообщений кампании."""
+        from .fanout import launch_campaign
+        return launch_campaign(self)
 
 
 class CampaignSchedule(models.Model):
@@ -162,18 +220,106 @@ class CampaignSchedule(models.Model):
     # Статус
     is_active = models.BooleanField(_("Активно"), default=True)
 
+    # Следующее и последнее срабатывание (campaigns.scheduling)
+    next_fire_at = models.DateTimeField(_("Следующий запуск"), blank=True, null=True, editable=False)
+    last_fired_at = models.DateTimeField(_("Последний запуск"), blank=True, null=True, editable=False)
+
     # Временные метки
     created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
     updated_at = models.DateTimeField(_("Дата обновления"), auto_now=True)
 
+    # Поля, от которых зависит следующее срабатывание
+    SCHEDULE_FIELDS = {'schedule_type', 'scheduled_time', 'days_of_week', 'time_of_day', 'is_active'}
+
     class Meta:
         verbose_name = _("Расписание кампании")
         verbose_name_plural = _("Расписания кампаний")
         ordering = ['scheduled_time', 'time_of_day']
+        indexes = [
+            # Выборка наступивших срабатываний планировщиком
+            models.Index(
+                fields=['next_fire_at'], name='schedule_next_fire_idx',
+                condition=models.Q(next_fire_at__isnull=False)
+            ),
+        ]
 
     def __str__(self):
         if self.schedule_type == 'fixed':
             return f"{self.campaign.name} - {self.scheduled_time}"
         else:
             days = ','.join(str(day) for day in self.days_of_week) if self.days_of_week else 'все'
-            return f"{self.campaign.name} - {days} в {self.time_of_day}"
\ No newline at end of file
+            return f"{self.campaign.name} - {days} в {self.time_of_day}"
+
+    def save(self, *args, **kwargs):
+        from .scheduling import schedule_next_fire
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.SCHEDULE_FIELDS & set(update_fields):
+            self.next_fire_at = schedule_next_fire(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'next_fire_at'}
+        super().save(*args, **kwargs)
+
+
+class CampaignFanout(models.Model):
+    """Контрольная точка создания сообщений кампании по получателям."""
+
+    campaign = models.ForeignKey(
+        Campaign,
+        on_delete=models.CASCADE,
+        related_name='fanouts',
+        verbose_name=_("Кампания")
+    )
+
+    STATUS_CHOICES = (
+        ('pending', _('Ожидает')),
+        ('running', _('Выполняется')),
+        ('paused', _('Приостановлена')),
+        ('completed', _('Завершена')),
+        ('failed', _('Ошибка')),
+    )
+    status = models.CharField(_("Статус"), max_length=10, choices=STATUS_CHOICES, default='pending')
+    status_details = models.TextField(_("Детали статуса"), blank=True, null=True)
+
+    # Часть запуска (campaigns.fanout): обрабатывает клиентов с id в диапазоне
+    # (range_start, range_end]; у координирующего запуска parent пустой
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='shards',
+        verbose_name=_("Запуск"),
+        blank=True, null=True
+    )
+    range_start = models.BigIntegerField(_("Начало диапазона клиентов"), default=0)
+    range_end = models.BigIntegerField(_("Конец диапазона клиентов"), blank=True, null=True)
+
+    # Прогресс: последний обработанный id клиента (ключ для keyset-обхода)
+    last_client_id = models.BigIntegerField(_("Последний обработанный клиент"), default=0)
+    processed_count = models.PositiveIntegerField(_("Обработано получателей"), default=0)
+    created_count = models.PositiveIntegerField(_("Создано сообщений"), default=0)
+    # Получатели, пропущенные из-за блокировки адреса (messaging.suppression)
+    suppressed_count = models.PositiveIntegerField(_("Пропущено заблокированных"), default=0)
+    # Получатели, пропущенные из-за частотного лимита (messaging.frequency)
+    capped_count = models.PositiveIntegerField(_("Пропущено по частотному лимиту"), default=0)
+
+    # Распределение по окну (campaigns.pacing): сообщения создаются черновиками
+    # и выпускаются в очередь частями
+    paced = models.BooleanField(_("С распределением"), default=False)
+    released_count = models.PositiveIntegerField(_("Выпущено в отправку"), default=0)
+
+    # Временные метки
+    created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("Дата обновления"), auto_now=True)
+    completed_at = models.DateTimeField(_("Дата завершения"), blank=True, null=True)
+
+    class Meta:
+        verbose_name = _("Создание сообщений кампании")
+        verbose_name_plural = _("Создание сообщений кампаний")
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.campaign.name} - {self.get_status_display()}"
+
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
\ No newline at end of file
@@ -0,0 +1,163 @@
+"""
+Распределение отправки кампании по окну ``scheduled_start`` — ``scheduled_end``.
+
+Для кампаний с ``pacing`` fan-out создает сообщения в статусе ``draft``,
+и воркеры отправки их не видят. Задача ``release_paced_messages``
+периодически (``CAMPAIGN_PACING_INTERVAL``) переводит очередную часть
+черновиков в ``queued`` так, чтобы доля выпущенных сообщений следовала
+выбранной кривой:
+
+* ``even`` — равномерно;
+* ``front_loaded`` — больше в начале окна, ``1 - (1 - t)^2``;
+* ``back_loaded`` — больше в конце окна, ``t^2``.
+
+Выпуск подстраивается под фактическую скорость отправки: если выпущенных
+писем, время отправки которых наступило, но которые еще не отправлены,
+больше, чем ожидается за ``CAMPAIGN_PACING_MAX_BACKLOG_SLICES`` интервалов,
+очередная часть уменьшается. Очередь считается одним запросом по индексу
+``message_campaign_queue_idx``; сообщения каналов без воркера отправки
+(``SENT_CHANNELS``) и отложенные ``scheduled_at`` (``analytics.sendtime``)
+в нее не входят.
+После ``scheduled_end`` (или если распределение отключили во время
+запуска) выпускается весь остаток. Приостановленные и отмененные кампании
+не выпускаются.
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Campaign, CampaignFanout
+
+PACING_CURVES = {
+    'even': lambda progress: progress,
+    'front_loaded': lambda progress: 1 - (1 - progress) ** 2,
+    'back_loaded': lambda progress: progress ** 2,
+}
+
+# Статусы кампании, при которых выпуск сообщений приостанавливается
+HOLD_STATUSES = ('paused', 'cancelled')
+
+# Каналы, сообщения которых отправляют воркеры (messaging.sending)
+SENT_CHANNELS = ('email',)
+
+
+def get_interval():
+    return getattr(settings, 'CAMPAIGN_PACING_INTERVAL', 60)
+
+
+def is_paced(campaign, now=None):
+    """Проверяет, распределяется ли запуск кампании по окну."""
+    now = now or timezone.now()
+    start, end = campaign.scheduled_start, campaign.scheduled_end
+    return (
+        campaign.pacing in PACING_CURVES
+        and start is not None and end is not None
+        and end > start and end > now
+    )
+
+
+def window_share(campaign, at):
+    """Доля сообщений, которая должна быть выпущена к моменту ``at``."""
+    start, end = campaign.scheduled_start, campaign.scheduled_end
+    progress = min(1.0, max(0.0, (at - start) / (end - start)))
+    return PACING_CURVES[campaign.pacing](progress)
+
+
+def send_backlog(campaign, now):
+    """Выпущенные письма кампании, время отправки которых наступило, но еще не отправленные."""
+    from messaging.models import Message
+
+    return (
+        Message.objects.filter(
+            campaign_id=campaign.pk, type__in=SENT_CHANNELS, status__in=('queued', 'sending')
+        )
+        .filter(Q(scheduled_at__isnull=True) | Q(scheduled_at__lte=now))
+        .count()
+    )
+
+
+def release_quota(campaign, fanout, now, interval=None):
+    """
+    Количество черновиков, которое нужно выпустить сейчас.
+
+    Выпуск идет с опережением на один интервал, чтобы воркерам хватало
+    сообщений до следующего запуска.
+    """
+    remaining = fanout.created_count - fanout.released_count
+    if not is_paced(campaign, now):
+        # Окно закончилось или распределение отключено: выпускаем остаток
+        return remaining
+
+    interval = timedelta(seconds=interval or get_interval())
+    share = window_share(campaign, now + interval)
+    target = min(fanout.created_count, math.ceil(fanout.created_count * share))
+    due = max(0, target - fanout.released_count)
+
+    # Ожидаемый объем одного интервала по кривой
+    slice_size = fanout.created_count * (share - window_share(campaign, now))
+    max_backlog = max(
+        getattr(settings, 'CAMPAIGN_PACING_MIN_BACKLOG', 100),
+        math.ceil(slice_size * getattr(settings, 'CAMPAIGN_PACING_MAX_BACKLOG_SLICES', 3))
+    )
+    return max(0, min(due, max_backlog - send_backlog(campaign, now)))
+
+
+def release_messages(campaign_id, limit, batch_size=5000):
+    """Переводит до ``limit`` черновиков кампании в очередь отправки пачками."""
+    from messaging.models import Message
+
+    released = 0
+    while released < limit:
+        message_ids = list(
+            Message.objects.filter(campaign_id=campaign_id, status='draft')
+            .order_by('pk')
+            .values_list('pk', flat=True)[:min(batch_size, limit - released)]
+        )
+        if not message_ids:
+            break
+        released += Message.objects.filter(pk__in=message_ids, status='draft').update(status='queued')
+    return released
+
+
+def release_fanout(fanout_id, now=None):
+    """
+    Выпускает очередную часть сообщений одного запуска.
+
+    Returns:
+        int: Количество выпущенных сообщений
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        fanout = (
+            CampaignFanout.objects.select_for_update(skip_locked=True)
+            .filter(pk=fanout_id)
+            .first()
+        )
+        if fanout is None:
+            return 0
+        campaign = Campaign.objects.get(pk=fanout.campaign_id)
+        if campaign.status in HOLD_STATUSES:
+            return 0
+        released = release_messages(campaign.pk, release_quota(campaign, fanout, now))
+        if released:
+            CampaignFanout.objects.filter(pk=fanout.pk).update(
+                released_count=F('released_count') + released, updated_at=timezone.now()
+            )
+    return released
+
+
+def release_paced(now=None):
+    """
+    Выпускает сообщения всех запусков с распределением по окну.
+
+    Returns:
+        int: Количество выпущенных сообщений
+    """
+    fanouts = CampaignFanout.objects.filter(
+        paced=True, released_count__lt=F('created_count')
+    ).values_list('pk', flat=True)
+    return sum(release_fanout(fanout_id, now) for fanout_id in fanouts)
@@ -0,0 +1,215 @@
+"""
+Расписания запуска кампаний.
+
+Время следующего срабатывания вычисляется заранее и хранится в
+``next_fire_at`` (частичный индекс только по заполненным значениям) для
+двух источников:
+
+* ``CampaignSchedule``: ``fixed`` — однократно в ``scheduled_time``,
+  ``recurring`` — в ``time_of_day`` по дням ``days_of_week`` (0 — понедельник,
+  пустой список — каждый день);
+* ``Campaign`` с ``is_scheduled``: ``once`` — в ``scheduled_start``,
+  ``daily``/``weekly``/``monthly`` — от ``scheduled_start`` с шагом в день,
+  неделю или месяц, ``custom`` — по ``custom_schedule`` вида
+  ``{"days_of_week": [0, 2], "time_of_day": "10:00"}``, не раньше
+  ``scheduled_start``. После ``scheduled_end`` кампания не срабатывает.
+
+Время суток и дни недели считаются в ``TIME_ZONE``.
+
+Срабатывают только кампании в статусах ``scheduled`` и ``active``.
+Однократная кампания, запущенная вручную до ``scheduled_start``, считается
+сработавшей (``launch_campaign`` заполняет ``last_fired_at``).
+
+Задача ``fire_due_schedules`` выбирает только наступившие строки по индексу
+(``SELECT ... FOR UPDATE SKIP LOCKED``), запускает их кампании и сразу
+переносит ``next_fire_at`` на следующее срабатывание. Пропущенные
+срабатывания (например, при простое планировщика) не наверстываются:
+следующее время считается от текущего момента.
+"""
+import calendar
+import logging
+from datetime import datetime, time, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_time
+
+logger = logging.getLogger(__name__)
+
+# Статусы кампании, в которых срабатывание расписания запускает рассылку:
+# черновики не отправляются, пока их не запланируют явно
+FIRE_STATUSES = ('scheduled', 'active')
+
+PERIOD_DAYS = {
+    'daily': 1,
+    'weekly': 7,
+}
+
+
+def _weekdays(days_of_week):
+    days = {day for day in (days_of_week or []) if isinstance(day, int) and 0 <= day <= 6}
+    return days or set(range(7))
+
+
+def next_weekly(days_of_week, time_of_day, after):
+    """Ближайшее время ``time_of_day`` в один из дней ``days_of_week`` позже ``after``."""
+    if time_of_day is None:
+        return None
+    weekdays = _weekdays(days_of_week)
+    start = timezone.localtime(after).date()
+    for offset in range(8):
+        day = start + timedelta(days=offset)
+        if day.weekday() not in weekdays:
+            continue
+        candidate = timezone.make_aware(datetime.combine(day, time_of_day))
+        if candidate > after:
+            return candidate
+    return None
+
+
+def add_months(value, months):
+    """Сдвигает дату на ``months`` месяцев, ограничивая день концом месяца."""
+    month = value.month - 1 + months
+    year = value.year + month // 12
+    month = month % 12 + 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def next_periodic(start, frequency, after):
+    """Ближайшее срабатывание ``start + k * период`` позже ``after``."""
+    if start > after:
+        return start
+    start, after = timezone.localtime(start), timezone.localtime(after)
+    if frequency == 'monthly':
+        step = 12 * (after.year - start.year) + after.month - start.month
+        candidate = add_months(start, step)
+        while candidate <= after:
+            step += 1
+            candidate = add_months(start, step)
+        return candidate
+
+    period = timedelta(days=PERIOD_DAYS[frequency])
+    step = (after - start) // period
+    candidate = start + step * period
+    while candidate <= after:
+        step += 1
+        candidate = start + step * period
+    return candidate
+
+
+def schedule_next_fire(schedule, now=None):
+    """Вычисляет следующее срабатывание ``CampaignSchedule``."""
+    if not schedule.is_active:
+        return None
+    if schedule.schedule_type == 'fixed':
+        if schedule.scheduled_time is None:
+            return None
+        if schedule.last_fired_at is not None and schedule.scheduled_time <= schedule.last_fired_at:
+            return None
+        return schedule.scheduled_time
+    after = max(filter(None, (now or timezone.now(), schedule.last_fired_at)))
+    return next_weekly(schedule.days_of_week, schedule.time_of_day, after)
+
+
+def campaign_next_fire(campaign, now=None):
+    """Вычисляет следующее срабатывание расписания самой кампании."""
+    start = campaign.scheduled_start
+    if not campaign.is_scheduled or start is None:
+        return None
+    if campaign.frequency == 'once':
+        return start if campaign.last_fired_at is None else None
+
+    after = max(filter(None, (now or timezone.now(), campaign.last_fired_at)))
+    if campaign.frequency == 'custom':
+        custom = campaign.custom_schedule if isinstance(campaign.custom_schedule, dict) else {}
+        time_of_day = custom.get('time_of_day')
+        if isinstance(time_of_day, str):
+            time_of_day = parse_time(time_of_day)
+        if not isinstance(time_of_day, time):
+            return None
+        # Срабатывание ровно в scheduled_start тоже подходит
+        after = max(after, start - timedelta(microseconds=1))
+        next_fire = next_weekly(custom.get('days_of_week'), time_of_day, after)
+    elif campaign.frequency in PERIOD_DAYS or campaign.frequency == 'monthly':
+        next_fire = next_periodic(start, campaign.frequency, after)
+    else:
+        return None
+
+    if next_fire is not None and campaign.scheduled_end is not None and next_fire > campaign.scheduled_end:
+        return None
+    return next_fire
+
+
+def fire_campaigns(campaigns, now):
+    """
+    Запускает рассылку кампаний по срабатыванию расписания.
+
+    Returns:
+        int: Количество запущенных кампаний
+    """
+    from .models import Campaign
+
+    launched = 0
+    for campaign in campaigns:
+        if campaign.status not in FIRE_STATUSES:
+            continue
+        try:
+            # Статус меняется вместе с запуском: при ошибке кампания
+            # остается запланированной
+            with transaction.atomic():
+                Campaign.objects.filter(pk=campaign.pk, status='scheduled').update(
+                    status='active', started_at=now, updated_at=now
+                )
+                campaign.launch()
+        except ValidationError as exc:
+            logger.warning('Кампания %s не запущена по расписанию: %s', campaign.pk, exc.messages[0])
+            continue
+        launched += 1
+    return launched
+
+
+def _fire_due(queryset, next_fire, batch_size, now, campaign_of):
+    """Срабатывает пачка наступивших строк: перенос ``next_fire_at`` и запуск кампаний."""
+    with transaction.atomic():
+        due = list(
+            queryset.select_for_update(skip_locked=True, of=('self',))
+            .filter(next_fire_at__lte=now)
+            .order_by('next_fire_at')[:batch_size]
+        )
+        for item in due:
+            item.last_fired_at = now
+            item.next_fire_at = next_fire(item, now)
+        queryset.model.objects.bulk_update(due, ['last_fired_at', 'next_fire_at'])
+
+        campaigns = {}
+        for item in due:
+            campaign = campaign_of(item)
+            campaigns[campaign.pk] = campaign
+        launched = fire_campaigns(campaigns.values(), now)
+    return len(due), launched
+
+
+def fire_due_schedules(batch_size=500, now=None):
+    """
+    Обрабатывает наступившие срабатывания расписаний.
+
+    Returns:
+        dict: Количество сработавших расписаний и запущенных кампаний
+    """
+    from .models import Campaign, CampaignSchedule
+
+    now = now or timezone.now()
+    schedules, launched = _fire_due(
+        CampaignSchedule.objects.select_related('campaign__email_template', 'campaign__whatsapp_template'),
+        schedule_next_fire, batch_size, now, lambda schedule: schedule.campaign
+    )
+    campaigns, campaign_launched = _fire_due(
+        Campaign.objects.select_related('email_template', 'whatsapp_template'),
+        campaign_next_fire, batch_size, now, lambda campaign: campaign
+    )
+    return {
+        'schedules': schedules,
+        'campaigns': campaigns,
+        'launched': launched + campaign_launched,
+    }
@@ -1,25 +1,28 @@
 from rest_framework import serializers
+from core.serializers import DynamicFieldsModelSerializer
 from .models import Campaign, CampaignSchedule
-from clients.serializers import ClientSerializer, ClientGroupSerializer
-from templates.serializers import MessageTemplateSerializer
 
 
-class CampaignScheduleSerializer(serializers.ModelSerializer):
+class CampaignScheduleSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = CampaignSchedule
         fields = [
             'id', 'campaign', 'schedule_type', 'scheduled_time',
             'days_of_week', 'time_of_day', 'is_active',
+            'next_fire_at', 'last_fired_at',
             'created_at', 'updated_at'
         ]
+        expandable_fields = {
+            'campaign': ('campaigns.serializers.CampaignSerializer', {}),
+        }
 
 
-class CampaignSerializer(serializers.ModelSerializer):
-    client_group = ClientGroupSerializer(read_only=True)
-    clients = ClientSerializer(many=True, read_only=True)
-    email_template = MessageTemplateSerializer(read_only=True)
-    whatsapp_template = MessageTemplateSerializer(read_only=True)
-    schedules = CampaignScheduleSerializer(many=True, read_only=True)
+class CampaignSerializer(DynamicFieldsModelSerializer):
+    client_group = serializers.PrimaryKeyRelatedField(read_only=True)
+    clients = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    email_template = serializers.PrimaryKeyRelatedField(read_only=True)
+    whatsapp_template = serializers.PrimaryKeyRelatedField(read_only=True)
+    schedules = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
 
     class Meta:
         model = Campaign
@@ -28,10 +31,11 @@ class CampaignSerializer(serializers.ModelSerializer):
             'client_group', 'clients',
             'email_template', 'whatsapp_template',
             'is_scheduled', 'scheduled_start', 'scheduled_end',
-            'frequency', 'custom_schedule', 'status',
-            'max_messages_per_day', 'total_recipients',
+            'frequency', 'custom_schedule', 'pacing', 'optimize_send_time', 'status',
+            'max_messages_per_day', 'ignore_frequency_cap', 'total_recipients',
             'sent_count', 'delivered_count', 'read_count', 'error_count',
             'created_at', 'updated_at', 'started_at', 'completed_at',
+            'next_fire_at', 'last_fired_at',
             'schedules'
         ]
         read_only_fields = [
@@ -39,4 +43,11 @@ class CampaignSerializer(serializers.ModelSerializer):
             'started_at', 'completed_at',
             'total_recipients', 'sent_count',
             'delivered_count', 'read_count', 'error_count'
-        ]
\ No newline at end of file
+        ]
+        expandable_fields = {
+            'client_group': ('clients.serializers.ClientGroupSerializer', {}),
+            'clients': ('clients.serializers.ClientSerializer', {'many': True}),
+            'email_template': ('templates.serializers.MessageTemplateSerializer', {}),
+            'whatsapp_template': ('templates.serializers.MessageTemplateSerializer', {}),
+            'schedules': ('campaigns.serializers.CampaignScheduleSerializer', {'many': True}),
+        }
\ No newline at end of file
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django.db.models import Q
+from django.utils import timezone
+
+from core.bulk import run_selection
+
+from . import counters
+from .fanout import run_fanout
+from .models import Campaign
+from .pacing import release_paced
+from .scheduling import fire_due_schedules
+
+
+@shared_task(acks_late=True)
+def run_campaign_fanout(fanout_id):
+    """
+    Создает сообщения кампании по контрольной точке.
+
+    ``acks_late`` гарантирует повторную доставку задачи, если воркер упал:
+    обработка продолжится с последней зафиксированной пачки.
+    """
+    from messaging.lanes import enqueue_lane
+
+    fanout = run_fanout(fanout_id)
+    if fanout.created_count:
+        enqueue_lane('campaign')
+    return {
+        'status': fanout.status,
+        'processed': fanout.processed_count,
+        'created': fanout.created_count,
+    }
+
+
+@shared_task
+def reconcile_campaign_statistics(campaign_ids=None):
+    """
+    Сверяет счетчики кампаний с фактическими статусами сообщений.
+
+    По умолчанию проверяются активные и приостановленные кампании, а также
+    кампании, измененные за последние сутки.
+    """
+    if campaign_ids is None:
+        since = timezone.now() - timedelta(days=1)
+        campaign_ids = Campaign.objects.filter(
+            Q(status__in=('active', 'paused')) | Q(updated_at__gte=since)
+        ).values_list('pk', flat=True)
+    return counters.reconcile(campaign_ids)
+
+
+@shared_task(bind=True)
+def update_campaign_statistics(self, selection):
+    """Пересчитывает счетчики выбранных кампаний (действие администратора)."""
+    return run_selection(selection, counters.reconcile, task=self)
+
+
+@shared_task
+def fire_campaign_schedules(batch_size=500):
+    """Запускает кампании по наступившим срабатываниям расписаний."""
+    totals = {'schedules': 0, 'campaigns': 0, 'launched': 0}
+    while True:
+        counts = fire_due_schedules(batch_size=batch_size)
+        for key, count in counts.items():
+            totals[key] += count
+        if counts['schedules'] < batch_size and counts['campaigns'] < batch_size:
+            break
+    return totals
+
+
+@shared_task
+def release_paced_messages():
+    """Выпускает в отправку очередную часть сообщений кампаний с распределением."""
+    from messaging.lanes import enqueue_lane
+
+    released = release_paced()
+    if released:
+        enqueue_lane('campaign')
+    return released
@@ -1,3 +1,269 @@
-from django.test import TestCase
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.contrib.admin import helpers
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from clients.models import Client
+from messaging.models import Message
+from templates.models import MessageTemplate
+from .fanout import run_fanout
+from .scheduling import campaign_next_fire, fire_due_schedules, next_weekly, schedule_next_fire
+from .models import Campaign, CampaignFanout, CampaignSchedule
+from .pacing import is_paced, release_fanout, send_backlog, window_share
+
+
+@override_settings(
+    CAMPAIGN_FANOUT_SHARD_SIZE=10, CAMPAIGN_FANOUT_MAX_SHARDS=3, CAMPAIGN_FANOUT_CHUNK_SIZE=4,
+    MESSAGE_FREQUENCY_CAPS={}
+)
+class FanoutShardTests(TestCase):
+    """Деление запуска кампании на части по диапазонам id клиентов."""
+
+    def setUp(self):
+        template = MessageTemplate.objects.create(
+            name='Акция', type='email', subject='Здравствуйте', body='{{ first_name }}, скидка'
+        )
+        clients = Client.objects.bulk_create(
+            Client(first_name='Иван', last_name='Петров', email=f'client{i}@example.com') for i in range(90)
+        )
+        self.campaign = Campaign.objects.create(
+            name='Акция', type='email', email_template=template, status='active'
+        )
+        # Разреженный сегмент: плотное начало и редкий хвост
+        self.campaign.clients.set(clients[:20] + clients[20::7])
+        self.fanout = CampaignFanout.objects.create(campaign=self.campaign)
+
+    def test_shards_split_recipients_evenly(self):
+        run_fanout(self.fanout.pk)
+
+        shards = list(self.fanout.shards.order_by('range_start'))
+        recipients = self.campaign.get_recipients()
+        sizes = []
+        for shard in shards:
+            selected = recipients.filter(pk__gt=shard.range_start)
+            if shard.range_end is not None:
+                selected = selected.filter(pk__lte=shard.range_end)
+            sizes.append(selected.count())
+        self.assertEqual(sizes, [10, 10, 10])
+        self.assertIsNone(shards[-1].range_end)
+
+    def test_last_shard_completes_campaign(self):
+        run_fanout(self.fanout.pk)
+        shards = list(self.fanout.shards.order_by('range_start'))
+
+        for shard in shards[:-1]:
+            run_fanout(shard.pk)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, 'active')
+
+        run_fanout(shards[-1].pk)
+
+        self.fanout.refresh_from_db()
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.fanout.status, 'completed')
+        self.assertEqual(self.fanout.created_count, 30)
+        self.assertEqual(self.campaign.status, 'completed')
+        self.assertIsNotNone(self.campaign.completed_at)
+        self.assertEqual(self.campaign.total_recipients, 30)
+        self.assertEqual(Message.objects.filter(campaign=self.campaign).count(), 30)
+
+
+class StartCampaignActionTests(TestCase):
+    """Действие администратора «Запустить выбранные кампании»."""
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', password='secret'))
+        template = MessageTemplate.objects.create(name='Акция', type='email', subject='Тема', body='Текст')
+        self.ready = Campaign.objects.create(name='Готовая', type='email', email_template=template)
+        self.broken = Campaign.objects.create(name='Без шаблона', type='email')
+
+    def test_failed_launch_keeps_status(self):
+        response = self.client.post('/admin/campaigns/campaign/', {
+            'action': 'start_campaign',
+            helpers.ACTION_CHECKBOX_NAME: [self.ready.pk, self.broken.pk],
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.ready.refresh_from_db()
+        self.broken.refresh_from_db()
+        self.assertEqual(self.ready.status, 'active')
+        self.assertEqual(self.ready.fanouts.count(), 1)
+        self.assertEqual(self.broken.status, 'draft')
+        self.assertIsNone(self.broken.started_at)
+        self.assertFalse(self.broken.fanouts.exists())
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+@override_settings(TIME_ZONE='Europe/Berlin')
+class NextFireTests(TestCase):
+    """Вычисление следующего срабатывания расписаний."""
+
+    def campaign(self, **kwargs):
+        fields = {'name': 'Акция', 'type': 'email', 'is_scheduled': True}
+        fields.update(kwargs)
+        return Campaign(**fields)
+
+    def test_weekly_keeps_local_time_across_dst(self):
+        # 29 марта 2026 года Берлин переходит на летнее время (UTC+1 -> UTC+2)
+        after = utc(2026, 3, 28, 9, 0)
+
+        self.assertEqual(next_weekly([], time(10, 0), after), utc(2026, 3, 29, 8, 0))
+        # Воскресенье 29.03 не входит в дни недели: следующий понедельник
+        self.assertEqual(next_weekly([0], time(10, 0), after), utc(2026, 3, 30, 8, 0))
+
+    def test_daily_campaign_keeps_local_time_across_dst(self):
+        campaign = self.campaign(frequency='daily', scheduled_start=utc(2026, 3, 27, 9, 0))
+
+        self.assertEqual(campaign_next_fire(campaign, now=utc(2026, 3, 29, 12, 0)), utc(2026, 3, 30, 8, 0))
+
+    def test_monthly_clamps_to_month_end(self):
+        campaign = self.campaign(frequency='monthly', scheduled_start=utc(2026, 1, 31, 9, 0))
+
+        self.assertEqual(campaign_next_fire(campaign, now=utc(2026, 2, 1, 0, 0)), utc(2026, 2, 28, 9, 0))
+        self.assertEqual(campaign_next_fire(campaign, now=utc(2026, 3, 1, 0, 0)), utc(2026, 3, 31, 8, 0))
+
+    def test_boundaries(self):
+        start = utc(2026, 5, 1, 8, 0)
+        once = self.campaign(frequency='once', scheduled_start=start)
+        self.assertEqual(campaign_next_fire(once, now=start + timedelta(days=1)), start)
+        once.last_fired_at = start
+        self.assertIsNone(campaign_next_fire(once))
+
+        custom = self.campaign(
+            frequency='custom', scheduled_start=start,
+            custom_schedule={'days_of_week': [4], 'time_of_day': '10:00'}
+        )
+        # Срабатывание ровно в scheduled_start (пятница, 10:00 по Берлину)
+        self.assertEqual(campaign_next_fire(custom, now=start - timedelta(days=3)), start)
+
+        weekly = self.campaign(
+            frequency='weekly', scheduled_start=start, scheduled_end=start + timedelta(days=10)
+        )
+        self.assertEqual(campaign_next_fire(weekly, now=start), start + timedelta(days=7))
+        self.assertIsNone(campaign_next_fire(weekly, now=start + timedelta(days=7)))
+
+        fixed = CampaignSchedule(schedule_type='fixed', scheduled_time=start, last_fired_at=start)
+        self.assertIsNone(schedule_next_fire(fixed))
+
+
+class FireDueSchedulesTests(TestCase):
+    """Запуск кампаний по наступившим срабатываниям расписания."""
+
+    def create_campaign(self, **kwargs):
+        fields = {
+            'name': 'Акция', 'type': 'email', 'status': 'scheduled', 'is_scheduled': True,
+            'frequency': 'once', 'scheduled_start': timezone.now() + timedelta(hours=1),
+        }
+        fields.update(kwargs)
+        return Campaign.objects.create(**fields)
+
+    def test_failed_launch_keeps_campaign_scheduled(self):
+        template = MessageTemplate.objects.create(name='Акция', type='email', subject='Тема', body='Текст')
+        ready = self.create_campaign(email_template=template)
+        broken = self.create_campaign()
+
+        with self.assertLogs('campaigns.scheduling', level='WARNING'):
+            result = fire_due_schedules(now=timezone.now() + timedelta(hours=2))
+
+        self.assertEqual(result['launched'], 1)
+        ready.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual(ready.status, 'active')
+        self.assertEqual(broken.status, 'scheduled')
+        self.assertIsNone(broken.started_at)
+
+    def test_fires_due_schedules_once_and_advances(self):
+        template = MessageTemplate.objects.create(name='Акция', type='email', subject='Тема', body='Текст')
+        campaign = Campaign.objects.create(name='Акция', type='email', email_template=template, status='active')
+        now = timezone.now()
+        due = CampaignSchedule.objects.create(
+            campaign=campaign, schedule_type='recurring', days_of_week=[], time_of_day=time(10, 0)
+        )
+        later = CampaignSchedule.objects.create(
+            campaign=campaign, schedule_type='fixed', scheduled_time=now + timedelta(days=30)
+        )
+        fire_at = due.next_fire_at
+
+        result = fire_due_schedules(now=fire_at)
+
+        self.assertEqual(result, {'schedules': 1, 'campaigns': 0, 'launched': 1})
+        due.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual(due.last_fired_at, fire_at)
+        self.assertEqual(due.next_fire_at, fire_at + timedelta(days=1))
+        self.assertEqual(later.next_fire_at, later.scheduled_time)
+        self.assertIsNone(later.last_fired_at)
+        # Повторный тик в то же время ничего не запускает
+        self.assertEqual(fire_due_schedules(now=fire_at)['schedules'], 0)
+
+
+@override_settings(CAMPAIGN_PACING_INTERVAL=60, CAMPAIGN_PACING_MAX_BACKLOG_SLICES=3, CAMPAIGN_PACING_MIN_BACKLOG=10)
+class PacingTests(TestCase):
+    """Распределение отправки кампании по окну."""
+
+    def setUp(self):
+        self.start = timezone.now().replace(microsecond=0)
+        self.campaign = Campaign.objects.create(
+            name='Акция', type='email', status='active', pacing='even',
+            scheduled_start=self.start, scheduled_end=self.start + timedelta(hours=1)
+        )
+        Message.objects.bulk_create(
+            Message(
+                type='email', direction='outgoing', to_email=f'client{i}@example.com',
+                body='Текст', status='draft', campaign=self.campaign
+            )
+            for i in range(400)
+        )
+        self.fanout = CampaignFanout.objects.create(
+            campaign=self.campaign, status='completed', paced=True, created_count=400
+        )
+
+    def test_curves(self):
+        middle = self.start + timedelta(minutes=30)
+        expected = {'even': 0.5, 'front_loaded': 0.75, 'back_loaded': 0.25}
+        for pacing, share in expected.items():
+            self.campaign.pacing = pacing
+            with self.subTest(pacing=pacing):
+                self.assertAlmostEqual(window_share(self.campaign, middle), share)
+                self.assertEqual(window_share(self.campaign, self.start - timedelta(minutes=1)), 0)
+                self.assertEqual(window_share(self.campaign, self.start + timedelta(hours=2)), 1)
+
+        self.assertTrue(is_paced(self.campaign, self.start))
+        self.assertFalse(is_paced(self.campaign, self.start + timedelta(hours=1)))
+        self.campaign.pacing = 'none'
+        self.assertFalse(is_paced(self.campaign, self.start))
+
+    def test_release_follows_send_rate(self):
+        now = self.start + timedelta(minutes=15)
+
+        # Ожидаемый объем интервала — 400 / 60 ≈ 6.7 письма, предел очереди — 3 интервала
+        self.assertEqual(release_fanout(self.fanout.pk, now), 20)
+        # Выпущенные письма не отправлены: новая часть не выпускается
+        self.assertEqual(release_fanout(self.fanout.pk, now), 0)
+
+        Message.objects.filter(campaign=self.campaign, status='queued').update(status='sent')
+        self.assertEqual(release_fanout(self.fanout.pk, now), 20)
+
+        # После окончания окна выпускается весь остаток
+        self.assertEqual(release_fanout(self.fanout.pk, self.start + timedelta(hours=1)), 360)
+        self.fanout.refresh_from_db()
+        self.assertEqual(self.fanout.released_count, 400)
+
+    def test_paused_campaign_is_not_released(self):
+        Campaign.objects.filter(pk=self.campaign.pk).update(status='paused')
+
+        self.assertEqual(release_fanout(self.fanout.pk, self.start + timedelta(minutes=15)), 0)
+
+    def test_backlog_counts_only_due_email(self):
+        now = self.start + timedelta(minutes=15)
+        messages = list(Message.objects.filter(campaign=self.campaign)[:3])
+        Message.objects.filter(pk=messages[0].pk).update(status='queued')
+        Message.objects.filter(pk=messages[1].pk).update(status='queued', scheduled_at=now + timedelta(hours=1))
+        Message.objects.filter(pk=messages[2].pk).update(status='queued', type='whatsapp')
+
+        self.assertEqual(send_backlog(self.campaign, now), 1)
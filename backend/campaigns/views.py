@@ -1,10 +1,16 @@
-from rest_framework import viewsets, permissions, filters
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from core.queries import QueryPlanningMixin
 from .models import Campaign, CampaignSchedule
 from .serializers import CampaignSerializer, CampaignScheduleSerializer
 
 
-class CampaignViewSet(viewsets.ModelViewSet):
+class CampaignViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     """
     API для работы с кампаниями
     """
@@ -16,7 +22,7 @@ class CampaignViewSet(viewsets.ModelViewSet):
         filters.SearchFilter,
         filters.OrderingFilter
     ]
-    filterset_fields = ['type', 'status', 'frequency', 'is_scheduled']
+    filterset_fields = ['type', 'status', 'frequency', 'pacing', 'is_scheduled']
     search_fields = ['name', 'description']
     ordering_fields = ['created_at', 'started_at', 'completed_at']
 
@@ -28,8 +34,30 @@ class CampaignViewSet(viewsets.ModelViewSet):
         # Здесь можно добавить дополнительную логику при создании кампании
         return campaign
 
+    @action(detail=True, methods=['post'])
+    def launch(self, request, pk=None):
+        """
+        Запуск кампании: создание сообщений для всех получателей
+        """
+        campaign = self.get_object()
+        try:
+            # Статус меняется до постановки задачи: иначе воркер может увидеть
+            # прежний статус 'paused' и сразу остановить создание сообщений
+            with transaction.atomic():
+                campaign.status = 'active'
+                campaign.started_at = campaign.started_at or timezone.now()
+                campaign.save(update_fields=['status', 'started_at'])
+                fanout = campaign.launch()
+        except ValidationError as exc:
+            return Response({'detail': exc.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {'fanout': fanout.pk, 'status': fanout.status},
+            status=status.HTTP_202_ACCEPTED
+        )
+
 
-class CampaignScheduleViewSet(viewsets.ModelViewSet):
+class CampaignScheduleViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     """
     API для работы с расписанием кампаний
     """
@@ -43,4 +43,14 @@ class ClientGroupAdmin(admin.ModelAdmin):
             'fields': ('is_dynamic', 'filter_criteria'),
             'classes': ('collapse',)
         })
-    )
\ No newline at end of file
+    )
+    actions = ['refresh_membership']
+
+    def refresh_membership(self, request, queryset):
+        from .tasks import refresh_dynamic_group
+        group_ids = list(queryset.filter(is_dynamic=True).values_list('pk', flat=True))
+        for group_id in group_ids:
+            refresh_dynamic_group.delay(group_id)
+        self.message_user(request, f"Пересчет состава запущен для {len(group_ids)} динамических групп.")
+
+    refresh_membership.short_description = "Пересчитать состав динамических групп"
\ No newline at end of file
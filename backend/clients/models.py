@@ -43,6 +43,10 @@ class Client(models.Model):
         verbose_name = _("Клиент")
         verbose_name_plural = _("Клиенты")
         ordering = ['-created_at']
+        indexes = [
+            # Для keyset-пагинации по (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='client_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -90,4 +94,20 @@ class ClientGroup(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+    def clean(self):
+        """Проверяет корректность критериев фильтрации динамической группы."""
+        from .segments import compile_criteria
+        if self.is_dynamic:
+            compile_criteria(self.filter_criteria)
+
+    def get_matching_clients(self):
+        """Возвращает queryset клиентов, удовлетворяющих критериям группы."""
+        from .segments import matching_clients
+        return matching_clients(self)
+
+    def refresh_membership(self):
+        """Пересчитывает материализованный состав динамической группы."""
+        from .segments import refresh_group
+        return refresh_group(self)
\ No newline at end of file
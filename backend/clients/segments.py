@@ -0,0 +1,229 @@
+"""
+Движок динамических групп клиентов.
+
+Критерии фильтрации ``ClientGroup.filter_criteria`` компилируются в один
+``Q``-объект, а результат материализуется в ту же таблицу связей
+``ClientGroup.clients``, что и у статических групп. Благодаря этому чтение
+состава динамической группы стоит ровно столько же, сколько чтение
+статической, и кампании не пересчитывают фильтр при каждом запуске.
+
+Формат критериев::
+
+    {
+        "status": "active",
+        "source__in": ["site", "ads"],
+        "created_at__gte": "2024-01-01T00:00:00Z",
+        "tags__name": "vip",
+        "any": [{"company__icontains": "ооо"}, {"position__isnull": false}],
+        "not": {"status": "inactive"}
+    }
+
+Ключи верхнего уровня объединяются через AND, ``any`` — список условий,
+объединяемых через OR, ``all`` — список условий через AND, ``not`` —
+отрицание вложенного условия.
+"""
+import operator
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Client, ClientGroup
+
+# Поля клиента, по которым разрешено фильтровать
+ALLOWED_FIELDS = {
+    'id', 'first_name', 'last_name', 'email', 'phone', 'whatsapp',
+    'company', 'position', 'address', 'status', 'source',
+    'created_at', 'updated_at', 'last_contacted', 'notes',
+    'tags', 'tags__id', 'tags__name',
+}
+
+ALLOWED_LOOKUPS = {
+    'exact', 'iexact', 'in', 'contains', 'icontains',
+    'startswith', 'istartswith', 'endswith', 'iendswith',
+    'gt', 'gte', 'lt', 'lte', 'isnull',
+}
+
+LOGICAL_KEYS = {'any', 'all', 'not'}
+
+# Размер пачки при массовой вставке связей
+MEMBERSHIP_BATCH_SIZE = 5000
+
+
+def _split_lookup(key):
+    """Разделяет ключ критерия на путь к полю и lookup."""
+    parts = key.split('__')
+    if parts[-1] in ALLOWED_LOOKUPS and len(parts) > 1:
+        return '__'.join(parts[:-1]), parts[-1]
+    return key, 'exact'
+
+
+def compile_criteria(criteria):
+    """
+    Компилирует критерии фильтрации в ``Q``-объект.
+
+    Args:
+        criteria (dict): Критерии в формате, описанном в модуле
+
+    Returns:
+        Q: Условие для ``Client.objects.filter()``
+
+    Raises:
+        ValidationError: Если критерии содержат неизвестные поля или lookup
+    """
+    if not criteria:
+        return Q()
+    if not isinstance(criteria, dict):
+        raise ValidationError(_error("Критерии фильтрации должны быть объектом"))
+
+    q = Q()
+    for key, value in criteria.items():
+        if key == 'any':
+            q &= _compile_list(value, key, operator.or_)
+        elif key == 'all':
+            q &= _compile_list(value, key, operator.and_)
+        elif key == 'not':
+            q &= ~compile_criteria(value)
+        else:
+            field, lookup = _split_lookup(key)
+            if field not in ALLOWED_FIELDS:
+                raise ValidationError(_error(f"Неизвестное поле в критериях: {field}"))
+            if lookup == 'in' and not isinstance(value, (list, tuple)):
+                raise ValidationError(_error(f"Значение для {key} должно быть списком"))
+            q &= Q(**{f'{field}__{lookup}': value})
+    return q
+
+
+def _compile_list(value, key, combine):
+    if not isinstance(value, (list, tuple)):
+        raise ValidationError(_error(f"Значение для {key} должно быть списком"))
+    return reduce(combine, (compile_criteria(item) for item in value), Q())
+
+
+def _error(message):
+    return {'filter_criteria': message}
+
+
+def _uses_multivalued(criteria):
+    """Проверяет, затрагивают ли критерии связь many-to-many (теги)."""
+    if isinstance(criteria, dict):
+        return any(
+            _uses_multivalued(value) if key in LOGICAL_KEYS else key.startswith('tags')
+            for key, value in criteria.items()
+        )
+    if isinstance(criteria, (list, tuple)):
+        return any(_uses_multivalued(item) for item in criteria)
+    return False
+
+
+def matching_clients(group):
+    """Возвращает queryset клиентов, удовлетворяющих критериям группы."""
+    queryset = Client.objects.filter(compile_criteria(group.filter_criteria))
+    if _uses_multivalued(group.filter_criteria):
+        queryset = queryset.distinct()
+    return queryset
+
+
+def refresh_group(group, batch_size=MEMBERSHIP_BATCH_SIZE):
+    """
+    Полностью пересчитывает состав динамической группы.
+
+    Лишние связи удаляются одним DELETE, недостающие вставляются пачками
+    через ``bulk_create``. Существующие связи не трогаются.
+
+    Returns:
+        tuple: (добавлено, удалено)
+    """
+    if not group.is_dynamic:
+        return 0, 0
+
+    through = ClientGroup.clients.through
+    members = through.objects.filter(clientgroup_id=group.pk)
+    matching = matching_clients(group)
+
+    with transaction.atomic():
+        removed, _ = members.exclude(
+            client_id__in=matching.order_by().values('pk')
+        ).delete()
+
+        missing = matching.exclude(
+            pk__in=members.values('client_id')
+        ).values_list('pk', flat=True)
+
+        # Обходим недостающих клиентов по ключу, чтобы не держать курсор
+        # открытым во время вставки
+        added = 0
+        last_id = 0
+        while True:
+            batch = list(missing.filter(pk__gt=last_id).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            through.objects.bulk_create(
+                [through(clientgroup_id=group.pk, client_id=client_id) for client_id in batch],
+                ignore_conflicts=True
+            )
+            added += len(batch)
+            last_id = batch[-1]
+
+    return added, removed
+
+
+def refresh_clients(client_ids):
+    """
+    Перепроверяет членство конкретных клиентов во всех динамических группах.
+
+    Все критерии проверяются одним запросом: для каждой группы строится
+    аннотация ``Exists`` по строке клиента, поэтому стоимость не зависит
+    от размера групп.
+    """
+    client_ids = list(client_ids)
+    if not client_ids:
+        return
+
+    groups = list(ClientGroup.objects.filter(is_dynamic=True).only('id', 'filter_criteria'))
+    if not groups:
+        return
+
+    annotations = {}
+    for group in groups:
+        try:
+            condition = Client.objects.filter(pk=OuterRef('pk')).filter(
+                compile_criteria(group.filter_criteria)
+            )
+        except ValidationError:
+            continue
+        annotations[f'group_{group.pk}'] = Exists(condition)
+    if not annotations:
+        return
+
+    rows = Client.objects.filter(pk__in=client_ids).annotate(**annotations).values('pk', *annotations)
+    should_be = {
+        (int(alias[len('group_'):]), row['pk'])
+        for row in rows
+        for alias in annotations
+        if row[alias]
+    }
+
+    through = ClientGroup.clients.through
+    group_ids = [int(alias[len('group_'):]) for alias in annotations]
+    current = set(
+        through.objects.filter(
+            clientgroup_id__in=group_ids, client_id__in=client_ids
+        ).values_list('clientgroup_id', 'client_id')
+    )
+
+    to_add = should_be - current
+    to_remove = current - should_be
+
+    with transaction.atomic():
+        if to_remove:
+            condition = Q()
+            for group_id, client_id in to_remove:
+                condition |= Q(clientgroup_id=group_id, client_id=client_id)
+            through.objects.filter(condition).delete()
+        if to_add:
+            through.objects.bulk_create(
+                [through(clientgroup_id=group_id, client_id=client_id) for group_id, client_id in to_add],
+                ignore_conflicts=True
+            )
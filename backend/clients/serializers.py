@@ -1,22 +1,32 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
+from core.serializers import DynamicFieldsModelSerializer
 from .models import Client, ClientTag, ClientGroup
+from .segments import compile_criteria
 
 
-class ClientTagSerializer(serializers.ModelSerializer):
+class ClientTagSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = ClientTag
         fields = ['id', 'name', 'color', 'description']
 
 
-class ClientGroupSerializer(serializers.ModelSerializer):
+class ClientGroupSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = ClientGroup
         fields = ['id', 'name', 'description', 'is_dynamic', 'filter_criteria']
 
+    def validate_filter_criteria(self, value):
+        try:
+            compile_criteria(value)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
+        return value
 
-class ClientSerializer(serializers.ModelSerializer):
-    tags = ClientTagSerializer(many=True, read_only=True)
-    groups = ClientGroupSerializer(many=True, read_only=True)
+
+class ClientSerializer(DynamicFieldsModelSerializer):
+    tags = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    groups = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
 
     class Meta:
         model = Client
@@ -26,4 +36,8 @@ class ClientSerializer(serializers.ModelSerializer):
             'source', 'created_at', 'updated_at', 'last_contacted',
             'notes', 'groups'
         ]
-        read_only_fields = ['created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['created_at', 'updated_at']
+        expandable_fields = {
+            'tags': ('clients.serializers.ClientTagSerializer', {'many': True}),
+            'groups': ('clients.serializers.ClientGroupSerializer', {'many': True}),
+        }
\ No newline at end of file
@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import post_save, m2m_changed
+from django.dispatch import receiver
+
+from .models import Client, ClientGroup
+from .segments import refresh_clients
+
+
+@receiver(post_save, sender=Client)
+def recheck_client_groups(sender, instance, raw=False, **kwargs):
+    """
+    Перепроверяет членство сохраненного клиента в динамических группах.
+
+    При удалении клиента связи удаляются каскадно, отдельная обработка
+    не требуется.
+    """
+    if raw:
+        return
+    refresh_clients([instance.pk])
+
+
+@receiver(m2m_changed, sender=Client.tags.through)
+def recheck_client_groups_on_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    """Перепроверяет членство клиентов после изменения их тегов."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_clients([instance.pk])
+    elif pk_set:
+        refresh_clients(pk_set)
+
+
+@receiver(post_save, sender=ClientGroup)
+def schedule_group_refresh(sender, instance, raw=False, **kwargs):
+    """Ставит в очередь полный пересчет состава динамической группы."""
+    if raw or not instance.is_dynamic:
+        return
+    from .tasks import refresh_dynamic_group
+    transaction.on_commit(lambda: refresh_dynamic_group.delay(instance.pk))
@@ -0,0 +1,26 @@
+from celery import shared_task
+
+from .models import ClientGroup
+
+
+@shared_task
+def refresh_dynamic_group(group_id):
+    """Пересчитывает состав одной динамической группы."""
+    group = ClientGroup.objects.filter(pk=group_id, is_dynamic=True).first()
+    if group is None:
+        return {'added': 0, 'removed': 0}
+    added, removed = group.refresh_membership()
+    return {'added': added, 'removed': removed}
+
+
+@shared_task
+def refresh_dynamic_groups():
+    """
+    Периодически пересчитывает все динамические группы.
+
+    Нужен для изменений, которые обходят сигналы (``QuerySet.update()``,
+    ``bulk_create()``, импорт данных).
+    """
+    group_ids = ClientGroup.objects.filter(is_dynamic=True).values_list('pk', flat=True)
+    for group_id in group_ids:
+        refresh_dynamic_group.delay(group_id)
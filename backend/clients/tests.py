@@ -1,3 +1,94 @@
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Client, ClientGroup, ClientTag
+from .segments import compile_criteria, matching_clients, refresh_group
+
+
+class CompileCriteriaTests(TestCase):
+    """Компиляция критериев динамической группы."""
+
+    def setUp(self):
+        self.active = Client.objects.create(
+            first_name='Иван', last_name='Петров', email='ivan@example.com', status='active', company='Romashka LLC'
+        )
+        self.lead = Client.objects.create(
+            first_name='Анна', last_name='Смирнова', email='anna@example.com', status='lead', source='ads'
+        )
+        self.inactive = Client.objects.create(
+            first_name='Петр', last_name='Иванов', email='petr@example.com', status='inactive'
+        )
+
+    def filter(self, criteria):
+        return set(Client.objects.filter(compile_criteria(criteria)).values_list('pk', flat=True))
+
+    def test_logical_keys(self):
+        criteria = {
+            'any': [{'company__icontains': 'ROMASHKA'}, {'source': 'ads'}],
+            'not': {'status': 'inactive'},
+        }
+
+        self.assertEqual(self.filter(criteria), {self.active.pk, self.lead.pk})
+        self.assertEqual(self.filter({}), {self.active.pk, self.lead.pk, self.inactive.pk})
+
+    def test_rejects_unknown_fields_and_lookups(self):
+        for criteria in (
+            {'groups__name': 'vip'},
+            {'status__regex': '.*'},
+            {'status__in': 'active'},
+            {'any': {'status': 'active'}},
+            ['status'],
+        ):
+            with self.subTest(criteria=criteria), self.assertRaises(ValidationError):
+                compile_criteria(criteria)
+
+
+class DynamicGroupMembershipTests(TestCase):
+    """Материализация и инкрементальное обновление состава динамической группы."""
+
+    def setUp(self):
+        self.vip = ClientTag.objects.create(name='vip')
+        self.partner = ClientTag.objects.create(name='partner')
+        self.client_a = Client.objects.create(first_name='Иван', last_name='Петров', email='a@example.com')
+        self.client_b = Client.objects.create(first_name='Анна', last_name='Смирнова', email='b@example.com')
+        self.group = ClientGroup.objects.create(
+            name='VIP', is_dynamic=True,
+            filter_criteria={'status': 'active', 'tags__name__in': ['vip', 'partner']}
+        )
+
+    def members(self):
+        return set(self.group.clients.values_list('pk', flat=True))
+
+    def test_refresh_adds_matching_and_removes_stale_members(self):
+        self.client_a.tags.add(self.vip, self.partner)
+        # Состав расходится с критериями: связь клиента A потеряна, B лишний
+        self.group.clients.set([self.client_b])
+
+        self.assertEqual(refresh_group(self.group), (1, 1))
+        self.assertEqual(self.members(), {self.client_a.pk})
+        # Клиент с двумя подходящими тегами попадает в выборку один раз
+        self.assertEqual(list(matching_clients(self.group).values_list('pk', flat=True)), [self.client_a.pk])
+        self.assertEqual(refresh_group(self.group), (0, 0))
+
+    def test_client_changes_recheck_only_affected_client(self):
+        self.client_a.tags.add(self.vip)
+        self.assertEqual(self.members(), {self.client_a.pk})
+
+        self.client_a.status = 'inactive'
+        self.client_a.save()
+        self.assertEqual(self.members(), set())
+
+        self.client_a.status = 'active'
+        self.client_a.save()
+        self.vip.clients.add(self.client_b)
+        self.assertEqual(self.members(), {self.client_a.pk, self.client_b.pk})
+
+        self.client_a.tags.clear()
+        self.assertEqual(self.members(), {self.client_b.pk})
+
+    def test_static_group_is_not_refreshed(self):
+        static = ClientGroup.objects.create(name='Вручную', filter_criteria={'status': 'active'})
+        static.clients.add(self.client_b)
+
+        self.assertEqual(refresh_group(static), (0, 0))
+        self.assertEqual(set(static.clients.values_list('pk', flat=True)), {self.client_b.pk})
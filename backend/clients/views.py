@@ -1,15 +1,19 @@
 from rest_framework import viewsets, permissions, filters
 from django_filters.rest_framework import DjangoFilterBackend
+from core.pagination import KeysetOrLimitOffsetPagination
+from core.queries import QueryPlanningMixin
 from .models import Client, ClientTag, ClientGroup
 from .serializers import ClientSerializer, ClientTagSerializer, ClientGroupSerializer
 
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     """
     API для работы с клиентами
     """
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
+    pagination_class = KeysetOrLimitOffsetPagination
+    keyset_ordering = '-created_at'
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [
         DjangoFilterBackend,
@@ -21,7 +25,7 @@ class ClientViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'last_contacted']
 
 
-class ClientTagViewSet(viewsets.ModelViewSet):
+class ClientTagViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     """
     API для работы с тегами клиентов
     """
@@ -31,7 +35,7 @@ class ClientTagViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'description']
 
 
-class ClientGroupViewSet(viewsets.ModelViewSet):
+class ClientGroupViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     """
     API для работы с группами клиентов
     """
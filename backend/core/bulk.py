@@ -0,0 +1,166 @@
+"""
+Массовые действия над выбранными записями.
+
+Действия выполняются set-based запросами по пачкам ``id``
+(``ADMIN_BULK_ACTION_CHUNK_SIZE``). Небольшие выборки обрабатываются прямо
+в запросе администратора, выборки больше ``ADMIN_BULK_ACTION_THRESHOLD``
+передаются фоновой задаче Celery. Задаче передается не список ``id``, а
+описание выборки (``describe_selection``): модель, параметры фильтров
+списка администратора, пользователь и отмеченные ``id``, если выбраны не
+все записи. Задача заново строит queryset через ``ModelAdmin`` (те же
+фильтры и поиск, что и в списке), проходит его пачками по возрастанию
+``id`` и после каждой пачки сохраняет прогресс (состояние ``PROGRESS`` с
+``done`` и ``total``). Прогресс доступен через ``task_status`` и API
+``/api/tasks/<task_id>/``.
+"""
+from celery.result import AsyncResult
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.auth import get_user_model
+from django.http import HttpRequest, QueryDict
+from django.urls import reverse
+
+
+def get_threshold():
+    return getattr(settings, 'ADMIN_BULK_ACTION_THRESHOLD', 10000)
+
+
+def get_chunk_size():
+    return getattr(settings, 'ADMIN_BULK_ACTION_CHUNK_SIZE', 1000)
+
+
+def _run_chunks(chunks, func, total, task=None, **kwargs):
+    done = 0
+    for chunk in chunks:
+        func(chunk, **kwargs)
+        done += len(chunk)
+        if task is not None and task.request.id:
+            task.update_state(state='PROGRESS', meta={'done': done, 'total': total})
+    return {'done': done, 'total': total}
+
+
+def run_in_chunks(pks, func, task=None, chunk_size=None, **kwargs):
+    """
+    Применяет ``func(chunk, **kwargs)`` к списку ``id`` пачками.
+
+    Args:
+        task: Выполняющаяся задача Celery (``bind=True``) для записи
+            прогресса; ``None`` при выполнении в запросе
+
+    Returns:
+        dict: Количество обработанных и всего ``id``
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    chunks = (pks[start:start + chunk_size] for start in range(0, len(pks), chunk_size))
+    return _run_chunks(chunks, func, len(pks), task=task, **kwargs)
+
+
+def describe_selection(request, queryset, total):
+    """
+    Сериализуемое описание выборки действия администратора.
+
+    Returns:
+        dict: Модель, параметры списка, пользователь, отмеченные ``id``
+        (``None``, если выбраны все записи списка) и количество записей
+    """
+    select_across = request.POST.get('select_across') == '1'
+    return {
+        'model': queryset.model._meta.label_lower,
+        'filters': request.GET.urlencode(),
+        'user': request.user.pk,
+        'pks': None if select_across else request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+        'total': total,
+    }
+
+
+def restore_selection(selection):
+    """Строит queryset выборки по описанию ``describe_selection``."""
+    model = apps.get_model(selection['model'])
+    request = HttpRequest()
+    request.method = 'GET'
+    request.GET = QueryDict(selection['filters'])
+    request.user = get_user_model().objects.get(pk=selection['user'])
+    modeladmin = admin.site._registry[model]
+    queryset = modeladmin.get_changelist_instance(request).get_queryset(request)
+    if selection['pks'] is not None:
+        queryset = queryset.filter(pk__in=selection['pks'])
+    return queryset
+
+
+def iter_selection(queryset, chunk_size=None):
+    """
+    Пачки ``id`` выборки по возрастанию.
+
+    Каждая пачка читается отдельным запросом от последнего ``id``
+    предыдущей, поэтому записи, вышедшие из выборки после обработки
+    (например, при смене статуса), не сдвигают следующие пачки.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last = None
+    while True:
+        chunk = list((pks if last is None else pks.filter(pk__gt=last))[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1]
+
+
+def run_selection(selection, func, task=None, chunk_size=None, **kwargs):
+    """
+    Применяет ``func(chunk, **kwargs)`` к выборке ``describe_selection`` пачками.
+
+    Returns:
+        dict: Количество обработанных и всего ``id``
+    """
+    chunks = iter_selection(restore_selection(selection), chunk_size)
+    return _run_chunks(chunks, func, selection['total'], task=task, **kwargs)
+
+
+def run_admin_action(modeladmin, request, queryset, func, task, message, size=None, **kwargs):
+    """
+    Выполняет массовое действие администратора в запросе или в фоне.
+
+    Args:
+        func: Функция ``func(chunk, **kwargs)`` для выполнения в запросе
+        task: Задача Celery ``task(selection, **kwargs)`` для больших
+            выборок; ``selection`` — результат ``describe_selection``
+        message (str): Сообщение об успехе с подстановкой ``{count}``
+        size (int): Объем работы для сравнения с порогом; по умолчанию —
+            количество выбранных записей
+
+    Returns:
+        AsyncResult | None: Запущенная задача или ``None``
+    """
+    count = queryset.count()
+    size = count if size is None else size
+    if size <= get_threshold():
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+        run_in_chunks(pks, func, **kwargs)
+        modeladmin.message_user(request, message.format(count=len(pks)))
+        return None
+
+    result = task.delay(describe_selection(request, queryset, count), **kwargs)
+    modeladmin.message_user(
+        request,
+        f"Выбрано {count} записей: действие выполняется в фоне (задача {result.id}). "
+        f"Ход выполнения: {reverse('task-status', args=[result.id])}"
+    )
+    return result
+
+
+def task_status(task_id):
+    """Возвращает состояние и прогресс фоновой задачи."""
+    result = AsyncResult(task_id)
+    status = {'id': task_id, 'state': result.state}
+    if result.state == 'PROGRESS':
+        status.update(result.info or {})
+    elif result.successful():
+        status['result'] = result.result
+    elif result.failed():
+        status['error'] = str(result.result)
+    return status
@@ -0,0 +1,221 @@
+"""
+Пагинация для списков с большим количеством записей.
+
+``LimitOffsetPagination`` выполняет ``OFFSET n`` (сканирование всех
+пропущенных строк) и ``COUNT(*)`` на каждый запрос. Для больших таблиц
+(сообщения, события, клиенты) используется ``KeysetPagination``: следующая
+страница выбирается условием по полю сортировки и ``id`` от последней
+записи предыдущей страницы, что использует индекс и не зависит от глубины.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+FALSE_VALUES = ('0', 'false', 'no', 'off')
+
+
+class OptionalCountLimitOffsetPagination(pagination.LimitOffsetPagination):
+    """
+    Limit/offset пагинация с возможностью не считать общее количество.
+
+    С параметром ``?count=false`` вместо ``COUNT(*)`` выбирается на одну
+    запись больше лимита, чтобы определить наличие следующей страницы;
+    поле ``count`` в ответе будет ``null``.
+    """
+
+    count_query_param = 'count'
+
+    def count_requested(self, request):
+        value = request.query_params.get(self.count_query_param, '')
+        return value.lower() not in FALSE_VALUES
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.count_requested(request):
+            return super().paginate_queryset(queryset, request, view)
+
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count = None
+        self.offset = self.get_offset(request)
+        self.request = request
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit
+        return results[:self.limit]
+
+    def get_next_link(self):
+        if self.count is not None:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Keyset (cursor) пагинация по полю сортировки и ``id``.
+
+    Поле сортировки задается атрибутом представления ``keyset_ordering``
+    (например, ``'-created_at'``), ``id`` добавляется для однозначного
+    порядка записей с одинаковым значением поля. Параметр ``ordering``
+    в этом режиме не применяется. Поддерживается переход только вперед.
+    """
+
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def __init__(self, page_size=None, max_page_size=None):
+        from rest_framework.settings import api_settings
+        self.page_size = page_size or api_settings.PAGE_SIZE
+        self.max_page_size = max_page_size
+
+    def get_page_size(self, request):
+        try:
+            return pagination._positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, queryset, view):
+        ordering = getattr(view, 'keyset_ordering', None) or queryset.model._meta.ordering[0]
+        descending = ordering.startswith('-')
+        return ordering.lstrip('-'), descending
+
+    def encode_cursor(self, value, pk):
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        payload = json.dumps({'v': value, 'id': pk}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            return field.to_python(payload['v']), int(payload['id'])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_page_size(request)
+        name, descending = self.get_ordering(queryset, view)
+        field = queryset.model._meta.get_field(name)
+
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{name}', f'{prefix}pk')
+
+        cursor = self.decode_cursor(request, field)
+        if cursor is not None:
+            value, pk = cursor
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{name}__{lookup}': value}) | Q(**{name: value, f'pk__{lookup}': pk})
+            )
+
+        results = list(queryset[:self.limit + 1])
+        page = results[:self.limit]
+        self.next_cursor = None
+        if len(results) > self.limit:
+            last = page[-1]
+            self.next_cursor = self.encode_cursor(getattr(last, field.attname), last.pk)
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.limit)
+        url = remove_query_param(url, 'pagination')
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
+
+
+class KeysetOrLimitOffsetPagination(OptionalCountLimitOffsetPagination):
+    """
+    Limit/offset пагинация с опциональным keyset-режимом.
+
+    Keyset-режим включается параметром ``?pagination=cursor`` (первая
+    страница) или ``?cursor=...`` (ссылка ``next`` из предыдущего ответа).
+    Без них поведение совпадает с обычной limit/offset пагинацией, включая
+    ``?count=false``.
+    """
+
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.keyset = None
+
+    def use_keyset(self, request):
+        return (
+            KeysetPagination.cursor_query_param in request.query_params or
+            request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.keyset = KeysetPagination(page_size=self.default_limit, max_page_size=self.max_limit)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.keyset is not None or self.count is None:
+            return {'previous_url': None, 'next_url': self.get_next_link(), 'page_links': []}
+        return super().get_html_context()
+
+    def get_next_link(self):
+        if self.keyset is not None:
+            return self.keyset.get_next_link()
+        return super().get_next_link()
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        return parameters + [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': "'cursor' — включить keyset-пагинацию",
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': KeysetPagination.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': "Курсор следующей страницы",
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': "'false' — не считать общее количество",
+                'schema': {'type': 'string'},
+            },
+        ]
@@ -0,0 +1,166 @@
+"""
+Планирование запросов для API и бюджет количества запросов.
+
+``QueryPlanningMixin`` обходит дерево полей сериализатора текущего запроса
+(с учетом ``?fields=`` и ``?expand=``) и добавляет к queryset нужные
+``select_related`` и ``prefetch_related``, чтобы вложенные объекты и списки
+первичных ключей не приводили к N+1 запросам.
+
+Количество SQL-запросов каждого запроса к API возвращается в заголовке
+``X-Query-Count``; при превышении бюджета (``query_budget`` представления
+или ``API_QUERY_BUDGET``) пишется предупреждение, а с
+``API_QUERY_BUDGET_STRICT = True`` выбрасывается ``QueryBudgetExceeded``,
+что удобно для тестов.
+"""
+import logging
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Запрос к API выполнил больше SQL-запросов, чем разрешено бюджетом."""
+
+
+class QueryCounter:
+    """
+    Контекстный менеджер, считающий SQL-запросы во всех подключениях.
+
+    Пример::
+
+        with QueryCounter() as counter:
+            client.get('/api/messaging/messages/')
+        assert counter.count <= 5
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._wrappers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        for connection in connections.all():
+            wrapper = connection.execute_wrapper(self)
+            wrapper.__enter__()
+            self._wrappers.append(wrapper)
+        return self
+
+    def __exit__(self, *exc_info):
+        while self._wrappers:
+            self._wrappers.pop().__exit__(*exc_info)
+
+
+def _serializer_fields(serializer):
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return None, {}
+    return serializer.Meta.model, serializer.fields
+
+
+def collect_relations(serializer, prefix='', prefetch=False):
+    """
+    Собирает пути для ``select_related`` и ``prefetch_related``.
+
+    Args:
+        serializer: Сериализатор (или ListSerializer)
+        prefix (str): Путь до модели сериализатора от корневой модели
+        prefetch (bool): Находится ли сериализатор внутри prefetch-связи
+
+    Returns:
+        tuple: (set путей select_related, set путей prefetch_related)
+    """
+    select, prefetch_paths = set(), set()
+    model, fields = _serializer_fields(serializer)
+    if model is None:
+        return select, prefetch_paths
+
+    for field in fields.values():
+        source = field.source
+        if source == '*' or '.' in source or field.write_only:
+            continue
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            continue
+        if not model_field.is_relation:
+            continue
+
+        path = f'{prefix}{source}'
+        nested = isinstance(field, serializers.BaseSerializer)
+        many = model_field.many_to_many or model_field.one_to_many
+
+        if many:
+            prefetch_paths.add(path)
+        elif nested:
+            (prefetch_paths if prefetch else select).add(path)
+        else:
+            # Первичный ключ прямой связи берется из столбца *_id
+            continue
+
+        if nested:
+            nested_select, nested_prefetch = collect_relations(
+                field, prefix=f'{path}__', prefetch=prefetch or many
+            )
+            select |= nested_select
+            prefetch_paths |= nested_prefetch
+
+    return select, prefetch_paths
+
+
+def plan_queryset(queryset, serializer):
+    """Добавляет к queryset связи, которые понадобятся сериализатору."""
+    select, prefetch = collect_relations(serializer)
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        # Пути внутри select_related-связей prefetch обходит через кеш объектов
+        queryset = queryset.prefetch_related(*sorted(prefetch))
+    return queryset
+
+
+class QueryPlanningMixin:
+    """
+    Миксин для ViewSet: планирование связей и бюджет SQL-запросов.
+
+    Атрибуты:
+        query_budget (int | None): Максимум SQL-запросов на запрос к API;
+            по умолчанию берется ``API_QUERY_BUDGET`` из настроек
+    """
+
+    query_budget = None
+    query_count_header = 'X-Query-Count'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(self, 'swagger_fake_view', False):
+            return queryset
+        return plan_queryset(queryset, self.get_serializer())
+
+    def get_query_budget(self):
+        if self.query_budget is not None:
+            return self.query_budget
+        return getattr(settings, 'API_QUERY_BUDGET', None)
+
+    def dispatch(self, request, *args, **kwargs):
+        with QueryCounter() as counter:
+            response = super().dispatch(request, *args, **kwargs)
+
+        response[self.query_count_header] = str(counter.count)
+        budget = self.get_query_budget()
+        if budget is not None and counter.count > budget:
+            message = (
+                f'{request.method} {request.path}: {counter.count} SQL-запросов '
+                f'при бюджете {budget}'
+            )
+            if getattr(settings, 'API_QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
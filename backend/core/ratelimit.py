@@ -0,0 +1,328 @@
+"""
+Ограничение скорости и параллельности, общее для всех воркеров.
+
+``TokenBucket`` — корзина токенов, ``AdaptiveRate`` — скорость, которая
+уменьшается при ошибках и растет при успехах (AIMD), ``ConcurrencyLimiter`` —
+ограничение числа одновременных держателей слота с истечением аренды.
+
+Состояние корзин хранится в Redis и изменяется Lua-скриптом атомарно, время
+берется с сервера Redis (``TIME``), поэтому часы воркеров не влияют на
+результат. Для тестов и разработки есть бэкенд в памяти процесса
+(``RATE_LIMIT_BACKEND = 'local'``).
+
+Токены запрашиваются пачкой: ``acquire(n)`` возвращает, сколько из ``n``
+единиц разрешено сейчас (от 0 до ``n``); неиспользованные токены
+возвращаются через ``refund(n)``.
+"""
+import logging
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return granted
+"""
+
+REFUND_TOKENS_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+if tokens == nil then
+    return 0
+end
+tokens = math.min(tonumber(ARGV[1]), tokens + tonumber(ARGV[2]))
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens))
+return 1
+"""
+
+ADJUST_RATE_SCRIPT = """
+local rate = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+rate = rate * tonumber(ARGV[2]) + tonumber(ARGV[3])
+rate = math.max(tonumber(ARGV[4]), math.min(tonumber(ARGV[5]), rate))
+redis.call('SET', KEYS[1], tostring(rate), 'EX', ARGV[6])
+return tostring(rate)
+"""
+
+ACQUIRE_SLOT_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+    redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2])) + 60)
+    return 1
+end
+return 0
+"""
+
+# Время хранения адаптивной скорости без изменений, секунд
+RATE_TTL = 24 * 60 * 60
+
+
+class LocalBucketBackend:
+    """Корзины в памяти процесса (для тестов и одного процесса)."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._rates = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, rate, capacity, requested):
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+            granted = min(requested, int(math.floor(tokens)))
+            self._buckets[key] = (tokens - granted, now)
+        return granted
+
+    def refund(self, key, capacity, count):
+        with self._lock:
+            if key in self._buckets:
+                tokens, ts = self._buckets[key]
+                self._buckets[key] = (min(capacity, tokens + count), ts)
+
+    def get_rate(self, key, default):
+        with self._lock:
+            return self._rates.get(key, default)
+
+    def adjust_rate(self, key, default, factor, increment, minimum, maximum):
+        with self._lock:
+            rate = self._rates.get(key, default) * factor + increment
+            rate = max(minimum, min(maximum, rate))
+            self._rates[key] = rate
+        return rate
+
+    def acquire_slot(self, key, limit, ttl, token):
+        now = time.monotonic()
+        with self._lock:
+            holders = {
+                holder: expires
+                for holder, expires in self._slots.get(key, {}).items() if expires > now
+            }
+            self._slots[key] = holders
+            if len(holders) >= limit:
+                return False
+            holders[token] = now + ttl
+        return True
+
+    def release_slot(self, key, token):
+        with self._lock:
+            self._slots.get(key, {}).pop(token, None)
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self._rates.clear()
+            self._slots.clear()
+
+
+class RedisBucketBackend:
+    """Корзины в Redis, общие для всех процессов и серверов."""
+
+    key_prefix = 'ratelimit:'
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.refund_script = self.client.register_script(REFUND_TOKENS_SCRIPT)
+        self.adjust_script = self.client.register_script(ADJUST_RATE_SCRIPT)
+        self.slot_script = self.client.register_script(ACQUIRE_SLOT_SCRIPT)
+
+    def acquire(self, key, rate, capacity, requested):
+        try:
+            return int(self.script(keys=[self.key_prefix + key], args=[rate, capacity, requested]))
+        except Exception:
+            # Без Redis лимит проверить нельзя: не разрешаем отправку,
+            # сообщения остаются в очереди до восстановления
+            logger.exception('Ограничитель скорости недоступен (%s)', key)
+            return 0
+
+    def refund(self, key, capacity, count):
+        try:
+            self.refund_script(keys=[self.key_prefix + key], args=[capacity, count])
+        except Exception:
+            # Невозвращенные токены восстановятся пополнением корзины
+            logger.exception('Ограничитель скорости недоступен (%s)', key)
+
+    def get_rate(self, key, default):
+        try:
+            value = self.client.get(self.key_prefix + key)
+        except Exception:
+            logger.exception('Ограничитель скорости недоступен (%s)', key)
+            return default
+        return float(value) if value is not None else default
+
+    def adjust_rate(self, key, default, factor, increment, minimum, maximum):
+        try:
+            return float(self.adjust_script(
+                keys=[self.key_prefix + key],
+                args=[default, factor, increment, minimum, maximum, RATE_TTL]
+            ))
+        except Exception:
+            logger.exception('Ограничитель скорости недоступен (%s)', key)
+            return default
+
+    def acquire_slot(self, key, limit, ttl, token):
+        try:
+            return bool(self.slot_script(keys=[self.key_prefix + key], args=[limit, ttl, token]))
+        except Exception:
+            logger.exception('Ограничитель параллельности недоступен (%s)', key)
+            return False
+
+    def release_slot(self, key, token):
+        try:
+            self.client.zrem(self.key_prefix + key, token)
+        except Exception:
+            # Слот освободится сам по истечении аренды
+            logger.exception('Ограничитель параллельности недоступен (%s)', key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Возвращает бэкенд корзин согласно ``RATE_LIMIT_BACKEND``."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if getattr(settings, 'RATE_LIMIT_BACKEND', 'local') == 'redis':
+                    _backend = RedisBucketBackend(settings.RATE_LIMIT_REDIS_URL)
+                else:
+                    _backend = LocalBucketBackend()
+    return _backend
+
+
+class TokenBucket:
+    """
+    Корзина токенов.
+
+    Args:
+        key (str): Имя корзины
+        rate (float): Пополнение, токенов в секунду
+        capacity (float): Максимальный запас токенов (допустимый всплеск)
+    """
+
+    def __init__(self, key, rate, capacity, backend=None):
+        self.key = key
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.backend = backend or get_backend()
+
+    @classmethod
+    def per_day(cls, key, limit, burst_seconds=None, backend=None):
+        """
+        Корзина для дневного лимита, равномерно распределенного по суткам.
+
+        Запас равен пополнению за ``burst_seconds``, поэтому отправка не
+        выбирает весь дневной лимит сразу после полуночи.
+        """
+        if burst_seconds is None:
+            burst_seconds = getattr(settings, 'RATE_LIMIT_BURST_SECONDS', 60)
+        rate = limit / 86400.0
+        return cls(key, rate, rate * burst_seconds, backend=backend)
+
+    def acquire(self, requested):
+        """
+        Запрашивает токены пачкой.
+
+        Returns:
+            int: Количество выданных токенов (от 0 до ``requested``)
+        """
+        if requested <= 0 or self.rate <= 0:
+            return 0
+        return self.backend.acquire(self.key, self.rate, self.capacity, requested)
+
+    def refund(self, count):
+        """Возвращает выданные, но не использованные токены (не больше запаса)."""
+        if count > 0:
+            self.backend.refund(self.key, self.capacity, count)
+
+
+class AdaptiveRate:
+    """
+    Скорость, подстраивающаяся под ответы получателя (AIMD).
+
+    При ошибках скорость умножается на ``decrease_factor``, при успехах
+    растет на ``increase_step``; значение ограничено ``minimum`` и
+    ``maximum``.
+    """
+
+    def __init__(self, key, initial, minimum, maximum, decrease_factor=0.5,
+                 increase_step=None, backend=None):
+        self.key = key
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step if increase_step is not None else initial * 0.1
+        self.backend = backend or get_backend()
+
+    def current(self):
+        return self.backend.get_rate(self.key, self.initial)
+
+    def decrease(self):
+        return self.backend.adjust_rate(
+            self.key, self.initial, self.decrease_factor, 0, self.minimum, self.maximum
+        )
+
+    def increase(self):
+        return self.backend.adjust_rate(
+            self.key, self.initial, 1, self.increase_step, self.minimum, self.maximum
+        )
+
+
+class ConcurrencyLimiter:
+    """
+    Не больше ``limit`` одновременных держателей слота.
+
+    Слот арендуется на ``ttl`` секунд и освобождается сам, если держатель
+    упал, не вызвав ``release``.
+    """
+
+    def __init__(self, key, limit, ttl, backend=None):
+        self.key = key
+        self.limit = limit
+        self.ttl = ttl
+        self.backend = backend or get_backend()
+
+    def acquire(self):
+        """
+        Занимает слот.
+
+        Returns:
+            str | None: Токен слота для ``release`` или ``None``, если слотов нет
+        """
+        token = uuid.uuid4().hex
+        if self.backend.acquire_slot(self.key, self.limit, self.ttl, token):
+            return token
+        return None
+
+    def release(self, token):
+        self.backend.release_slot(self.key, token)
+
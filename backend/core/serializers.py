@@ -0,0 +1,107 @@
+"""
+Сериализаторы с выборочными полями и раскрытием вложенных объектов.
+
+По умолчанию связанные объекты сериализуются первичными ключами. Клиент API
+может запросить только нужные поля и раскрыть нужные связи::
+
+    ?fields=id,status,campaign.name
+    ?expand=campaign,campaign.email_template
+
+Раскрываемые связи объявляются в ``Meta.expandable_fields`` как
+``{'поле': ('путь.к.Сериализатору', {аргументы})}``; путь задается строкой,
+чтобы сериализаторы разных приложений не импортировали друг друга.
+"""
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+
+
+def _split_paths(paths):
+    """
+    Разбирает список путей через точку в словарь по первому сегменту.
+
+    ``['id', 'campaign.name', 'campaign.clients.email']`` ->
+    ``{'id': [], 'campaign': ['name', 'clients.email']}``
+    """
+    result = {}
+    for path in paths:
+        path = path.strip()
+        if not path:
+            continue
+        head, _, tail = path.partition('.')
+        nested = result.setdefault(head, [])
+        if tail:
+            nested.append(tail)
+    return result
+
+
+def _query_list(request, name):
+    if request is None:
+        return None
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return [item for item in value.split(',') if item.strip()]
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer с поддержкой ``?fields=`` и ``?expand=``.
+
+    Корневой сериализатор читает параметры из запроса, вложенные получают
+    свою часть путей через аргументы ``fields`` и ``expand``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._requested_fields = kwargs.pop('fields', None)
+        self._requested_expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+
+    @property
+    def is_root_serializer(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_requested(self):
+        """
+        Возвращает запрошенные поля и раскрытия для этого уровня.
+
+        Returns:
+            tuple: (dict | None, dict) — поля (``None`` — все) и раскрытия
+        """
+        fields, expand = self._requested_fields, self._requested_expand
+        if fields is None and expand is None and self.is_root_serializer:
+            request = self.context.get('request')
+            fields = _query_list(request, 'fields')
+            expand = _query_list(request, 'expand')
+        return (
+            _split_paths(fields) if fields is not None else None,
+            _split_paths(expand or [])
+        )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, expand = self.get_requested()
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+
+        for name, nested_expand in expand.items():
+            if name not in expandable or name not in fields:
+                continue
+            if requested is not None and name not in requested:
+                continue
+            serializer_path, options = expandable[name]
+            serializer_class = import_string(serializer_path)
+            nested_fields = requested.get(name) if requested is not None else None
+            fields[name] = serializer_class(
+                read_only=True,
+                fields=nested_fields or None,
+                expand=nested_expand,
+                **options
+            )
+
+        if requested is not None:
+            for name in list(fields):
+                if name not in requested:
+                    fields.pop(name)
+        return fields
@@ -80,6 +80,10 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20
 }
 
+# Бюджет SQL-запросов на один запрос к API (см. core.queries)
+API_QUERY_BUDGET = int(os.environ.get('API_QUERY_BUDGET', 20))
+API_QUERY_BUDGET_STRICT = os.environ.get('API_QUERY_BUDGET_STRICT', 'False') == 'True'
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -149,6 +153,91 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Рассылки
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@example.com')
+WHATSAPP_FROM_NUMBER = os.environ.get('WHATSAPP_FROM_NUMBER')
+
+# Секрет вебхуков провайдеров (заголовок X-Webhook-Token) и размер пачки событий
+MESSAGING_WEBHOOK_TOKEN = os.environ.get('MESSAGING_WEBHOOK_TOKEN')
+MESSAGING_WEBHOOK_MAX_BATCH = 1000
+
+# Трекинг открытий и кликов: внешний адрес сервиса и сброс буфера событий
+MESSAGING_TRACKING_BASE_URL = os.environ.get('MESSAGING_TRACKING_BASE_URL', 'http://localhost:8000')
+MESSAGING_TRACKING_BATCH_SIZE = 500
+MESSAGING_TRACKING_FLUSH_INTERVAL = 1.0
+
+# SMTP-сервер исходящей почты
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False') == 'True'
+EMAIL_TIMEOUT = 30
+
+# Отправка email: писем на одно SMTP-подключение, простой подключения (сек),
+# размер пачки, лимит писем в секунду на воркер (None — без лимита)
+EMAIL_MAX_MESSAGES_PER_CONNECTION = 500
+EMAIL_CONNECTION_IDLE_TIMEOUT = 30
+EMAIL_SEND_BATCH_SIZE = 100
+EMAIL_MAX_PER_SECOND = None
+EMAIL_SENDING_CLAIM_TIMEOUT = 10 * 60
+
+# Ограничения по доменам получателей (messaging.domains): писем в секунду,
+# пределы адаптивной скорости, воркеров на домен, всплеск в секундах скорости
+EMAIL_DOMAIN_RATE = 10.0
+EMAIL_DOMAIN_MIN_RATE = 0.1
+EMAIL_DOMAIN_MAX_RATE = 100.0
+EMAIL_DOMAIN_CONCURRENCY = 2
+EMAIL_DOMAIN_BURST_SECONDS = 10
+EMAIL_DOMAIN_LIMITS = {}
+
+# Повторы после временных ошибок (messaging.retry): число попыток до
+# dead-letter, начальная и максимальная задержка в секундах; ошибки писем
+# старше окна (в секундах) не разбираются
+MESSAGE_RETRY_MAX_ATTEMPTS = 5
+MESSAGE_RETRY_BASE_DELAY = 60
+MESSAGE_RETRY_MAX_DELAY = 6 * 60 * 60
+MESSAGE_RETRY_WINDOW = 3 * 24 * 60 * 60
+
+# Частотные лимиты (messaging.frequency): не больше limit сообщений канала
+# одному клиенту за days последних дней по всем кампаниям
+MESSAGE_FREQUENCY_CAPS = {
+    'email': {'limit': 5, 'days': 7},
+    'whatsapp': {'limit': 3, 'days': 7},
+}
+
+# Распределение отправки кампаний по окну (campaigns.pacing): интервал
+# выпуска в секундах, допустимая очередь в интервалах и минимальная очередь
+CAMPAIGN_PACING_INTERVAL = 60
+CAMPAIGN_PACING_MAX_BACKLOG_SLICES = 3
+CAMPAIGN_PACING_MIN_BACKLOG = 100
+
+# Оптимальное время отправки (analytics.sendtime): период событий для
+# гистограмм в днях, минимум событий клиента и горизонт переноса в часах
+SEND_TIME_LOOKBACK_DAYS = 90
+SEND_TIME_MIN_EVENTS = 3
+SEND_TIME_HORIZON_HOURS = 24
+
+# Размер пачки получателей при создании сообщений кампании
+CAMPAIGN_FANOUT_CHUNK_SIZE = 1000
+# Параллельное создание (campaigns.fanout): получателей на одну часть запуска
+# и максимальное количество частей
+CAMPAIGN_FANOUT_SHARD_SIZE = 50000
+CAMPAIGN_FANOUT_MAX_SHARDS = 16
+
+# Быстрый рендеринг шаблонов из простых подстановок {{ variable }} без Context
+MESSAGE_TEMPLATE_FAST_PATH = True
+
+# Количество процессов для рендеринга шаблонов при рассылке (None — без пула).
+# В воркерах Celery с пулом prefork пул процессов недоступен, рендеринг
+# выполняется в процессе воркера
+MESSAGE_RENDER_PROCESSES = None
+
+# Массовые действия администратора (core.bulk): выборки больше порога
+# выполняются в фоновой задаче; размер пачки одного UPDATE
+ADMIN_BULK_ACTION_THRESHOLD = 10000
+ADMIN_BULK_ACTION_CHUNK_SIZE = 1000
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
@@ -157,9 +246,63 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Ограничение скорости (core.ratelimit): 'redis' — общее для всех воркеров,
+# 'local' — в памяти процесса (тесты)
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'redis')
+RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', CELERY_BROKER_URL)
+# Допустимый всплеск дневного лимита: пополнение за столько секунд
+RATE_LIMIT_BURST_SECONDS = 60
+
+# Линии отправки: очередь Celery для каждой линии (messaging.lanes).
+# Каждую очередь слушают свои воркеры (см. docker-compose.yml)
+EMAIL_LANE_QUEUES = {
+    'transactional': 'transactional',
+    'campaign': 'campaigns',
+    'retry': 'retry',
+}
+CELERY_TASK_ROUTES = {
+    'campaigns.tasks.run_campaign_fanout': {'queue': 'campaigns'},
+}
+
 # Celery Beat settings
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# Периодические задачи (синхронизируются планировщиком в базу данных)
+CELERY_BEAT_SCHEDULE = {
+    'refresh-dynamic-groups': {
+        'task': 'clients.tasks.refresh_dynamic_groups',
+        'schedule': 60 * 60,
+    },
+    'fire-campaign-schedules': {
+        'task': 'campaigns.tasks.fire_campaign_schedules',
+        'schedule': 60,
+    },
+    'release-paced-messages': {
+        'task': 'campaigns.tasks.release_paced_messages',
+        'schedule': CAMPAIGN_PACING_INTERVAL,
+    },
+    'dispatch-email-lanes': {
+        'task': 'messaging.tasks.dispatch_email_lanes',
+        'schedule': 60,
+    },
+    'retry-failed-messages': {
+        'task': 'messaging.tasks.retry_failed_messages',
+        'schedule': 5 * 60,
+    },
+    'prune-send-history': {
+        'task': 'messaging.tasks.prune_send_history',
+        'schedule': 24 * 60 * 60,
+    },
+    'build-send-time-histograms': {
+        'task': 'analytics.tasks.build_send_time_histograms',
+        'schedule': 24 * 60 * 60,
+    },
+    'reconcile-campaign-statistics': {
+        'task': 'campaigns.tasks.reconcile_campaign_statistics',
+        'schedule': 15 * 60,
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
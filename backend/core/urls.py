@@ -5,6 +5,7 @@ from django.conf.urls.static import static
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from .views import TaskStatusView
 
 # Настройка Swagger документации API
 schema_view = get_schema_view(
@@ -32,6 +33,7 @@ urlpatterns = [
     path('api/campaigns/', include('campaigns.urls')),
     path('api/templates/', include('templates.urls')),
     path('api/analytics/', include('analytics.urls')),
+    path('api/tasks/<str:task_id>/', TaskStatusView.as_view(), name='task-status'),
 ]
 
 # Добавляем URL маршруты для обработки медиа-файлов в режиме разработки
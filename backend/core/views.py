@@ -0,0 +1,15 @@
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .bulk import task_status
+
+
+class TaskStatusView(APIView):
+    """
+    Состояние и прогресс фоновой задачи (массовые действия администратора)
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, task_id):
+        return Response(task_status(task_id))
@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import Message, MessageAttachment, MessageEvent
+from core.bulk import run_admin_action
+from .models import (
+    ClientSendHistory, Message, MessageAttachment, MessageDeadLetter, MessageEvent, Suppression
+)
+from .retry import requeue_dead_letters
+from .tasks import bulk_set_message_status
 
 
 class MessageAttachmentInline(admin.TabularInline):
@@ -21,10 +26,10 @@ class MessageAdmin(admin.ModelAdmin):
     search_fields = ('subject', 'body', 'from_email', 'to_email', 'from_number', 'to_number')
     date_hierarchy = 'created_at'
     inlines = [MessageAttachmentInline, MessageEventInline]
-    readonly_fields = ('sent_at', 'delivered_at', 'read_at')
+    readonly_fields = ('sent_at', 'delivered_at', 'read_at', 'idempotency_key')
     fieldsets = (
         ('Основная информация', {
-            'fields': ('type', 'direction', 'client', 'campaign', 'template')
+            'fields': ('type', 'direction', 'client', 'campaign', 'template', 'idempotency_key')
         }),
         ('Содержимое', {
             'fields': ('subject', 'body', 'has_attachments')
@@ -42,22 +47,25 @@ class MessageAdmin(admin.ModelAdmin):
     )
     actions = ['mark_as_sent', 'mark_as_delivered', 'mark_as_read']
 
+    def _set_status(self, request, queryset, status, timestamp_field, message):
+        run_admin_action(
+            self, request, queryset, Message.bulk_set_status, bulk_set_message_status, message,
+            status=status, timestamp_field=timestamp_field
+        )
+
     def mark_as_sent(self, request, queryset):
-        for message in queryset:
-            message.mark_as_sent()
-        self.message_user(request, f"{queryset.count()} сообщений отмечены как отправленные.")
+        self._set_status(request, queryset, 'sent', 'sent_at',
+                         "{count} сообщений отмечены как отправленные.")
     mark_as_sent.short_description = "Отметить выбранные сообщения как отправленные"
 
     def mark_as_delivered(self, request, queryset):
-        for message in queryset:
-            message.mark_as_delivered()
-        self.message_user(request, f"{queryset.count()} сообщений отмечены как доставленные.")
+        self._set_status(request, queryset, 'delivered', 'delivered_at',
+                         "{count} сообщений отмечены как доставленные.")
     mark_as_delivered.short_description = "Отметить выбранные сообщения как доставленные"
 
     def mark_as_read(self, request, queryset):
-        for message in queryset:
-            message.mark_as_read()
-        self.message_user(request, f"{queryset.count()} сообщений отмечены как прочитанные.")
+        self._set_status(request, queryset, 'read', 'read_at',
+                         "{count} сообщений отмечены как прочитанные.")
     mark_as_read.short_description = "Отметить выбранные сообщения как прочитанные"
 
 
@@ -73,4 +81,35 @@ class MessageEventAdmin(admin.ModelAdmin):
     list_display = ('event_type', 'message', 'occurred_at', 'ip_address')
     list_filter = ('event_type', 'occurred_at')
     search_fields = ('message__subject', 'ip_address', 'user_agent')
-    readonly_fields = ('message', 'event_type', 'occurred_at', 'ip_address', 'user_agent', 'url', 'metadata')
\ No newline at end of file
+    readonly_fields = ('message', 'event_type', 'occurred_at', 'ip_address', 'user_agent', 'url', 'metadata')
+
+
+@admin.register(MessageDeadLetter)
+class MessageDeadLetterAdmin(admin.ModelAdmin):
+    list_display = ('message', 'reason', 'attempts', 'created_at')
+    list_filter = ('reason', 'created_at')
+    search_fields = ('message__to_email', 'error')
+    readonly_fields = ('message', 'reason', 'error', 'attempts', 'created_at')
+    list_select_related = ('message',)
+    actions = ['requeue']
+
+    def requeue(self, request, queryset):
+        count = requeue_dead_letters(queryset)
+        self.message_user(request, f"{count} сообщений возвращены в очередь отправки.")
+    requeue.short_description = "Вернуть выбранные сообщения в очередь отправки"
+
+
+@admin.register(Suppression)
+class SuppressionAdmin(admin.ModelAdmin):
+    list_display = ('address', 'channel', 'reason', 'created_at')
+    list_filter = ('channel', 'reason', 'created_at')
+    search_fields = ('address',)
+    raw_id_fields = ('message',)
+
+
+@admin.register(ClientSendHistory)
+class ClientSendHistoryAdmin(admin.ModelAdmin):
+    list_display = ('client', 'channel', 'day', 'count')
+    list_filter = ('channel', 'day')
+    search_fields = ('client__email', 'client__phone')
+    raw_id_fields = ('client',)
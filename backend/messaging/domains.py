@@ -0,0 +1,124 @@
+"""
+Ограничение отправки по доменам получателей.
+
+Почтовые провайдеры ограничивают прием по домену, поэтому у каждого домена
+есть своя скорость (token bucket) и ограничение числа воркеров, одновременно
+отправляющих на него письма. Скорость подстраивается по результатам
+отправки: при временных отказах (4xx) она уменьшается вдвое, после успешной
+пачки без отказов — растет на 10% от начальной.
+
+Значения по умолчанию задаются настройками ``EMAIL_DOMAIN_RATE``,
+``EMAIL_DOMAIN_MIN_RATE``, ``EMAIL_DOMAIN_MAX_RATE``,
+``EMAIL_DOMAIN_CONCURRENCY``; для отдельных доменов их можно переопределить
+в ``EMAIL_DOMAIN_LIMITS = {'gmail.com': {'rate': 20, 'concurrency': 4}}``.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+
+from core.ratelimit import AdaptiveRate, ConcurrencyLimiter, TokenBucket
+from .transport import DEFERRED, SENT
+
+
+def get_domain_limits(domain):
+    """Возвращает настройки ограничений для домена."""
+    limits = {
+        'rate': getattr(settings, 'EMAIL_DOMAIN_RATE', 10.0),
+        'min_rate': getattr(settings, 'EMAIL_DOMAIN_MIN_RATE', 0.1),
+        'max_rate': getattr(settings, 'EMAIL_DOMAIN_MAX_RATE', 100.0),
+        'concurrency': getattr(settings, 'EMAIL_DOMAIN_CONCURRENCY', 2),
+        'burst_seconds': getattr(settings, 'EMAIL_DOMAIN_BURST_SECONDS', 10),
+    }
+    limits.update(getattr(settings, 'EMAIL_DOMAIN_LIMITS', {}).get(domain, {}))
+    return limits
+
+
+class DomainPacer:
+    """Скорость и параллельность отправки на один домен."""
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.limits = get_domain_limits(domain)
+        self.rate = AdaptiveRate(
+            f'domain:{domain}:rate',
+            initial=self.limits['rate'],
+            minimum=self.limits['min_rate'],
+            maximum=self.limits['max_rate'],
+        )
+        self.slots = ConcurrencyLimiter(
+            f'domain:{domain}:slots',
+            limit=self.limits['concurrency'],
+            ttl=getattr(settings, 'EMAIL_SENDING_CLAIM_TIMEOUT', 600),
+        )
+
+    def bucket(self):
+        rate = self.rate.current()
+        return TokenBucket(f'domain:{self.domain}', rate, rate * self.limits['burst_seconds'])
+
+
+def admit_domains(candidates, blocked, slots):
+    """
+    Отбирает кандидатов с учетом скорости и параллельности по доменам.
+
+    Для каждого домена пачки занимается слот (один на пачку) и
+    запрашиваются токены на все его сообщения сразу. Домены без слота или
+    без достаточного количества токенов добавляются в ``blocked``.
+
+    Args:
+        candidates (list): Кортежи (id, id кампании, домен) в порядке очереди
+        blocked (set): Заблокированные в этом захвате домены
+        slots (dict): {домен: (DomainPacer, токен слота)}, занятые слоты
+
+    Returns:
+        list: Допущенные кандидаты
+    """
+    by_domain = defaultdict(list)
+    for candidate in candidates:
+        by_domain[candidate[2]].append(candidate)
+
+    admitted = []
+    for domain, rows in by_domain.items():
+        if domain is None:
+            admitted.extend(rows)
+            continue
+        if domain not in slots:
+            pacer = DomainPacer(domain)
+            token = pacer.slots.acquire()
+            if token is None:
+                blocked.add(domain)
+                continue
+            slots[domain] = (pacer, token)
+        pacer = slots[domain][0]
+        granted = pacer.bucket().acquire(len(rows))
+        if granted < len(rows):
+            blocked.add(domain)
+        admitted.extend(rows[:granted])
+    return admitted
+
+
+def release_slots(slots):
+    """Освобождает слоты доменов, занятые при захвате пачки."""
+    for pacer, token in slots.values():
+        pacer.slots.release(token)
+    slots.clear()
+
+
+def adjust_rates(results):
+    """
+    Подстраивает скорость доменов по результатам отправки пачки.
+
+    Args:
+        results (dict): {результат: [(message, ошибка), ...]}
+    """
+    stats = defaultdict(lambda: {SENT: 0, DEFERRED: 0})
+    for result in (SENT, DEFERRED):
+        for message, _error in results.get(result, []):
+            if message.recipient_domain:
+                stats[message.recipient_domain][result] += 1
+
+    for domain, counts in stats.items():
+        pacer = DomainPacer(domain)
+        if counts[DEFERRED]:
+            pacer.rate.decrease()
+        elif counts[SENT]:
+            pacer.rate.increase()
@@ -0,0 +1,148 @@
+"""
+Пакетный прием событий сообщений от провайдеров.
+
+Вебхук проверяет пачку и ставит ее в очередь; задача ``ingest_events``
+создает все ``MessageEvent`` одним ``bulk_create`` и применяет переходы
+статусов сообщений через ``bulk_update`` под блокировкой строк, а счетчики
+кампаний обновляет одним UPDATE на кампанию. Отказы и жалобы добавляют
+адреса получателей в список блокировки (``messaging.suppression``).
+"""
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from campaigns.counters import record_transitions
+from .models import Message, MessageEvent
+from .suppression import suppress_from_events
+
+# Событие -> (новый статус, поле времени)
+EVENT_TRANSITIONS = {
+    'delivery': ('delivered', 'delivered_at'),
+    'open': ('read', 'read_at'),
+    'click': ('read', 'read_at'),
+    'read': ('read', 'read_at'),
+    'bounce': ('failed', None),
+}
+
+# Порядок статусов: переход возможен только вперед
+STATUS_RANK = {
+    'draft': 0,
+    'queued': 1,
+    'sending': 2,
+    'sent': 3,
+    'delivered': 4,
+    'read': 5,
+}
+
+# Статусы, из которых отказ переводит сообщение в ошибку
+BOUNCE_FROM_STATUSES = ('queued', 'sending', 'sent')
+
+EVENT_FIELDS = ('ip_address', 'user_agent', 'url', 'metadata')
+
+
+def _target_status(current, target):
+    if target == 'failed':
+        return current in BOUNCE_FROM_STATUSES
+    if current not in STATUS_RANK:
+        return False
+    return STATUS_RANK[target] > STATUS_RANK[current]
+
+
+def plan_transitions(messages, events):
+    """
+    Вычисляет итоговые изменения сообщений для пачки событий.
+
+    Args:
+        messages (dict): {id: Message} с текущими значениями
+        events: Итерируемое из MessageEvent в порядке времени
+
+    Returns:
+        list: (message, old_status) для измененных сообщений
+    """
+    changed = {}
+    for event in events:
+        transition = EVENT_TRANSITIONS.get(event.event_type)
+        message = messages.get(event.message_id)
+        if transition is None or message is None:
+            continue
+        status, timestamp_field = transition
+        if not _target_status(message.status, status):
+            continue
+        changed.setdefault(message.pk, (message, message.status))
+        message.status = status
+        if timestamp_field and getattr(message, timestamp_field) is None:
+            setattr(message, timestamp_field, event.occurred_at)
+        if status == 'failed':
+            message.status_details = (event.metadata or {}).get('reason') or 'bounce'
+    return list(changed.values())
+
+
+def build_events(payload):
+    """Создает несохраненные MessageEvent из данных вебхука."""
+    url_max_length = MessageEvent._meta.get_field('url').max_length
+    events = []
+    for item in payload:
+        occurred_at = item.get('occurred_at')
+        if isinstance(occurred_at, str):
+            occurred_at = parse_datetime(occurred_at)
+        event = MessageEvent(
+            message_id=item['message_id'],
+            event_type=item['event_type'],
+            **{field: item.get(field) for field in EVENT_FIELDS}
+        )
+        if event.url:
+            event.url = event.url[:url_max_length]
+        if occurred_at is not None:
+            event.occurred_at = occurred_at
+        events.append(event)
+    return events
+
+
+def ingest_events(payload, batch_size=1000):
+    """
+    Сохраняет пачку событий и применяет переходы статусов сообщений.
+
+    События для несуществующих сообщений отбрасываются.
+
+    Args:
+        payload (list): Словари с ключами ``message_id``, ``event_type``,
+            ``occurred_at`` и необязательными ``ip_address``, ``user_agent``,
+            ``url``, ``metadata``
+
+    Returns:
+        dict: Количество созданных событий, обновленных сообщений,
+        заблокированных адресов и отброшенных событий
+    """
+    events = sorted(build_events(payload), key=lambda event: event.occurred_at)
+    message_ids = {event.message_id for event in events}
+
+    with transaction.atomic():
+        messages = {
+            message.pk: message
+            for message in Message.objects.select_for_update()
+            .filter(pk__in=message_ids)
+            .only(
+                'pk', 'campaign_id', 'type', 'to_email', 'to_number',
+                'status', 'status_details', 'delivered_at', 'read_at'
+            )
+        }
+        known = [event for event in events if event.message_id in messages]
+        MessageEvent.objects.bulk_create(known, batch_size=batch_size)
+
+        changed = plan_transitions(messages, known)
+        Message.objects.bulk_update(
+            [message for message, _old in changed],
+            ['status', 'status_details', 'delivered_at', 'read_at'],
+            batch_size=batch_size
+        )
+        record_transitions(
+            (message.campaign_id, old_status, message.status, 1)
+            for message, old_status in changed
+        )
+        suppressed = suppress_from_events(known, messages)
+
+    return {
+        'created': len(known),
+        'updated': len(changed),
+        'suppressed': suppressed,
+        'dropped': len(events) - len(known),
+    }
@@ -0,0 +1,114 @@
+"""
+Частотные лимиты сообщений клиенту по всем кампаниям.
+
+Политика задается настройкой ``MESSAGE_FREQUENCY_CAPS``: не больше
+``limit`` сообщений канала за ``days`` последних дней (включая текущий),
+например ``{'email': {'limit': 5, 'days': 7}}``. Каналы без лимита не
+ограничиваются.
+
+Fan-out не обращается к таблице сообщений: число сообщений клиенту
+хранится в ``ClientSendHistory`` по дням, и каждая пачка получателей
+проверяется одним запросом с группировкой по клиенту. Созданные сообщения
+учитываются двумя запросами на пачку: вставкой недостающих строк дня и
+``UPDATE ... SET count = count + 1``.
+
+Проверка и учет выполняются в разных запросах, поэтому одновременные
+запуски кампаний могут превысить лимит на величину своих пачек.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import ClientSendHistory
+
+
+def get_caps():
+    """Возвращает лимиты по каналам: {канал: (limit, days)}."""
+    return {
+        channel: (cap['limit'], cap.get('days', 1))
+        for channel, cap in getattr(settings, 'MESSAGE_FREQUENCY_CAPS', {}).items()
+        if cap.get('limit') is not None
+    }
+
+
+def capped_clients(channel, client_ids, limit, days, today=None):
+    """Возвращает id клиентов, которые уже получили ``limit`` сообщений за окно."""
+    today = today or timezone.localdate()
+    return set(
+        ClientSendHistory.objects.filter(
+            client_id__in=client_ids, channel=channel, day__gt=today - timedelta(days=days)
+        )
+        .order_by()
+        .values('client_id')
+        .annotate(total=Sum('count'))
+        .filter(total__gte=limit)
+        .values_list('client_id', flat=True)
+    )
+
+
+def record_sends(channel, client_ids, today=None):
+    """Учитывает по одному сообщению канала для каждого клиента за текущий день."""
+    if not client_ids:
+        return
+    today = today or timezone.localdate()
+    ClientSendHistory.objects.bulk_create(
+        [ClientSendHistory(client_id=client_id, channel=channel, day=today) for client_id in client_ids],
+        ignore_conflicts=True
+    )
+    ClientSendHistory.objects.filter(
+        client_id__in=client_ids, channel=channel, day=today
+    ).update(count=F('count') + 1)
+
+
+def prune_history(today=None):
+    """Удаляет историю старше самого длинного окна лимитов."""
+    today = today or timezone.localdate()
+    days = max((days for _limit, days in get_caps().values()), default=0)
+    return ClientSendHistory.objects.filter(day__lte=today - timedelta(days=days)).delete()[0]
+
+
+class FrequencyCap:
+    """
+    Частотные лимиты для одного запуска fan-out.
+
+    ``exclude`` отбрасывает получателей, достигших лимита канала, ``record``
+    учитывает созданные сообщения.
+    """
+
+    def __init__(self, caps):
+        self.caps = caps
+        self.excluded = 0
+
+    @classmethod
+    def from_settings(cls):
+        """Возвращает лимиты из настроек или ``None``, если они не заданы."""
+        caps = get_caps()
+        return cls(caps) if caps else None
+
+    def exclude(self, channel, recipients, get_client_id):
+        """
+        Отбрасывает получателей, достигших лимита канала.
+
+        Returns:
+            list: Оставшиеся получатели в исходном порядке
+        """
+        if channel not in self.caps or not recipients:
+            return recipients
+        limit, days = self.caps[channel]
+        capped = capped_clients(channel, [get_client_id(recipient) for recipient in recipients], limit, days)
+        if not capped:
+            return recipients
+        kept = [recipient for recipient in recipients if get_client_id(recipient) not in capped]
+        self.excluded += len(recipients) - len(kept)
+        return kept
+
+    def record(self, messages):
+        """Учитывает созданные сообщения каналов с лимитами."""
+        by_channel = {}
+        for message in messages:
+            if message.type in self.caps and message.client_id:
+                by_channel.setdefault(message.type, []).append(message.client_id)
+        for channel, client_ids in by_channel.items():
+            record_sends(channel, client_ids)
@@ -0,0 +1,64 @@
+"""
+Идемпотентное создание сообщений.
+
+Уникальный ``Message.idempotency_key`` не дает создать одно и то же
+сообщение дважды:
+
+* сообщения кампании получают ключ ``campaign:<запуск>:<канал>:<клиент>``,
+  поэтому повтор пачки fan-out (повторная доставка задачи, возобновление
+  после ошибки) не создает дубликатов для получателя;
+* сообщения, созданные через API с заголовком ``Idempotency-Key``, получают
+  ключ ``api:<пользователь>:<значение заголовка>``; повторный запрос
+  возвращает уже созданное сообщение.
+
+``create_messages`` не проверяет получателей по одному: ключи пачки,
+которые уже есть в базе, находятся одним запросом, остальные сообщения
+вставляются одним ``bulk_create``. Если параллельная вставка успела
+создать часть ключей, база данных отклоняет пачку, и вставка повторяется
+без уже созданных ключей, поэтому результат содержит только действительно
+вставленные сообщения и счетчики кампании не завышаются.
+"""
+from django.db import IntegrityError, transaction
+
+from .models import Message
+
+# Максимальная длина значения заголовка Idempotency-Key
+MAX_API_KEY_LENGTH = 200
+
+
+def campaign_message_key(fanout_id, message_type, client_id):
+    """Ключ сообщения кампании для получателя в рамках одного запуска."""
+    return f'campaign:{fanout_id}:{message_type}:{client_id}'
+
+
+def api_message_key(user_id, key):
+    """Ключ сообщения, созданного через API."""
+    return f'api:{user_id}:{key}'
+
+
+def create_messages(messages):
+    """
+    Сохраняет сообщения, пропуская уже существующие ключи.
+
+    Returns:
+        list: Вставленные сообщения
+    """
+    new, error = list(messages), None
+    while True:
+        keys = [message.idempotency_key for message in new if message.idempotency_key]
+        existing = set(
+            Message.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', flat=True)
+        ) if keys else set()
+        if error is not None and not existing:
+            # Ошибка не связана с ключами идемпотентности
+            raise error
+        new = [message for message in new if message.idempotency_key not in existing]
+        try:
+            with transaction.atomic():
+                Message.objects.bulk_create(new)
+        except IntegrityError as exc:
+            if not keys:
+                raise
+            error = exc
+            continue
+        return new
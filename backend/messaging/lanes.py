@@ -0,0 +1,95 @@
+"""
+Линии отправки сообщений.
+
+Сообщения разделены на линии: ``transactional`` (разовые сообщения без
+кампании), ``campaign`` (массовые рассылки) и ``retry`` (повторные попытки
+после временных ошибок). Каждая линия обрабатывается задачей в своей
+очереди Celery (``EMAIL_LANE_QUEUES``), которую слушают отдельные воркеры со
+своей параллельностью, поэтому запуск большой кампании не задерживает
+транзакционные письма.
+
+``lane_statistics`` показывает задержку в очереди по каждой линии.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Message
+
+LANES = [lane for lane, _ in Message.LANE_CHOICES]
+
+DEFAULT_LANE_QUEUES = {
+    'transactional': 'transactional',
+    'campaign': 'campaigns',
+    'retry': 'retry',
+}
+
+
+def get_lane_queue(lane):
+    """Возвращает имя очереди Celery для линии."""
+    return getattr(settings, 'EMAIL_LANE_QUEUES', DEFAULT_LANE_QUEUES)[lane]
+
+
+def enqueue_lane(lane):
+    """Ставит задачу отправки линии в ее очередь."""
+    from .tasks import send_queued_emails
+
+    send_queued_emails.apply_async(
+        kwargs={'lane': lane, 'enqueued_at': time.time()},
+        queue=get_lane_queue(lane)
+    )
+
+
+def _seconds(value):
+    return round(value.total_seconds(), 3) if value is not None else None
+
+
+def lane_statistics(window=3600):
+    """
+    Возвращает состояние очереди и задержку отправки по линиям.
+
+    Args:
+        window (int): Период в секундах для статистики отправленных
+
+    Returns:
+        list: Словари с ключами ``lane``, ``queue``, ``queued``,
+        ``oldest_queued_seconds``, ``sent``, ``avg_wait_seconds``,
+        ``max_wait_seconds``
+    """
+    now = timezone.now()
+    ready_at = Coalesce('scheduled_at', 'created_at')
+    wait = ExpressionWrapper(F('sent_at') - ready_at, output_field=DurationField())
+
+    pending = {
+        row['lane']: row
+        for row in Message.objects.filter(type='email', status__in=('queued', 'sending'))
+        .filter(Q(scheduled_at__isnull=True) | Q(scheduled_at__lte=now))
+        .order_by().values('lane')
+        .annotate(queued=Count('pk'), oldest=Min(ready_at))
+    }
+    sent = {
+        row['lane']: row
+        for row in Message.objects.filter(type='email', sent_at__gte=now - timedelta(seconds=window))
+        .order_by().values('lane')
+        .annotate(sent=Count('pk'), avg_wait=Avg(wait), max_wait=Max(wait))
+    }
+
+    statistics = []
+    for lane in LANES:
+        waiting = pending.get(lane, {})
+        done = sent.get(lane, {})
+        oldest = waiting.get('oldest')
+        statistics.append({
+            'lane': lane,
+            'queue': get_lane_queue(lane),
+            'queued': waiting.get('queued', 0),
+            'oldest_queued_seconds': _seconds(now - oldest) if oldest else None,
+            'sent': done.get('sent', 0),
+            'avg_wait_seconds': _seconds(done.get('avg_wait')),
+            'max_wait_seconds': _seconds(done.get('max_wait')),
+        })
+    return statistics
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['-created_at', '-id'], name='message_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='messageevent',
+            index=models.Index(fields=['-occurred_at', '-id'], name='msgevent_occurred_id_idx'),
+        ),
+    ]
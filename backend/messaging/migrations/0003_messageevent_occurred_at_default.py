@@ -0,0 +1,19 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='messageevent',
+            name='occurred_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время события'),
+        ),
+    ]
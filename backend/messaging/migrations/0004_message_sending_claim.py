@@ -0,0 +1,27 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0003_messageevent_occurred_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Взято в отправку'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Черновик'), ('queued', 'В очереди'), ('sending', 'Отправляется'), ('sent', 'Отправлено'), ('delivered', 'Доставлено'), ('read', 'Прочитано'), ('failed', 'Ошибка')], default='draft', max_length=10, verbose_name='Статус'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['type', 'status', 'id'], name='message_outbox_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:25
+
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Lower, StrIndex, Substr
+
+
+def fill_recipient_domain(apps, schema_editor):
+    Message = apps.get_model('messaging', 'Message')
+    Message.objects.filter(to_email__contains='@').update(
+        recipient_domain=Lower(Substr(F('to_email'), StrIndex(F('to_email'), Value('@')) + 1))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0004_message_sending_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='recipient_domain',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True, verbose_name='Домен получателя'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['type', 'status', 'recipient_domain'], name='message_outbox_domain_idx'),
+        ),
+        migrations.RunPython(fill_recipient_domain, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:27
+
+from django.db import migrations, models
+
+
+def fill_lane(apps, schema_editor):
+    Message = apps.get_model('messaging', 'Message')
+    Message.objects.filter(campaign__isnull=False).update(lane='campaign')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_message_recipient_domain'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='lane',
+            field=models.CharField(choices=[('transactional', 'Транзакционные'), ('campaign', 'Кампании'), ('retry', 'Повторные попытки')], default='transactional', max_length=15, verbose_name='Линия отправки'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['type', 'lane', 'status', 'id'], name='message_lane_outbox_idx'),
+        ),
+        migrations.RunPython(fill_lane, migrations.RunPython.noop),
+    ]
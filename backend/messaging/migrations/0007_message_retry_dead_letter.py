@@ -0,0 +1,35 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0006_message_lane'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Попыток отправки'),
+        ),
+        migrations.CreateModel(
+            name='MessageDeadLetter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('permanent', 'Постоянная ошибка'), ('exhausted', 'Исчерпаны попытки')], max_length=10, verbose_name='Причина')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='Ошибка')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток отправки')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('message', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dead_letter', to='messaging.message', verbose_name='Сообщение')),
+            ],
+            options={
+                'verbose_name': 'Неотправленное сообщение',
+                'verbose_name_plural': 'Неотправленные сообщения',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
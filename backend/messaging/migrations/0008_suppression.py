@@ -0,0 +1,67 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:33
+
+import hashlib
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_suppressions(apps, schema_editor):
+    """Блокирует адреса по уже полученным отказам и жалобам."""
+    MessageEvent = apps.get_model('messaging', 'MessageEvent')
+    Suppression = apps.get_model('messaging', 'Suppression')
+
+    events = (
+        MessageEvent.objects.filter(event_type__in=('bounce', 'complaint'))
+        .values_list('event_type', 'metadata', 'message_id',
+                     'message__type', 'message__to_email', 'message__to_number')
+        .order_by('occurred_at')
+    )
+    records = {}
+    for event_type, metadata, message_id, channel, to_email, to_number in events.iterator(chunk_size=10000):
+        if event_type == 'bounce' and isinstance(metadata, dict) and \
+                metadata.get('bounce_type') in ('soft', 'transient'):
+            continue
+        address = ((to_email if channel == 'email' else to_number) or '').strip()
+        address = address.lower() if channel == 'email' else re.sub(r'\D', '', address)
+        if not address:
+            continue
+        digest = hashlib.blake2b(f'{channel}:{address}'.encode(), digest_size=8).digest()
+        records[(channel, address)] = Suppression(
+            channel=channel,
+            address=address,
+            address_hash=int.from_bytes(digest, 'big', signed=True),
+            reason=event_type,
+            message_id=message_id,
+        )
+    Suppression.objects.bulk_create(records.values(), batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0007_message_retry_dead_letter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Suppression',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('email', 'Email'), ('whatsapp', 'WhatsApp')], max_length=10, verbose_name='Канал')),
+                ('address', models.CharField(max_length=255, verbose_name='Адрес')),
+                ('address_hash', models.BigIntegerField(editable=False, verbose_name='Хеш адреса')),
+                ('reason', models.CharField(choices=[('bounce', 'Отказ'), ('complaint', 'Жалоба'), ('manual', 'Вручную')], default='manual', max_length=10, verbose_name='Причина')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='suppressions', to='messaging.message', verbose_name='Сообщение')),
+            ],
+            options={
+                'verbose_name': 'Заблокированный адрес',
+                'verbose_name_plural': 'Заблокированные адреса',
+                'ordering': ['-created_at'],
+                'unique_together': {('channel', 'address')},
+            },
+        ),
+        migrations.RunPython(fill_suppressions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:35
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def fill_send_history(apps, schema_editor):
+    """Заполняет историю по сообщениям кампаний за окна частотных лимитов."""
+    Message = apps.get_model('messaging', 'Message')
+    ClientSendHistory = apps.get_model('messaging', 'ClientSendHistory')
+
+    caps = getattr(settings, 'MESSAGE_FREQUENCY_CAPS', {})
+    days = max((cap.get('days', 1) for cap in caps.values()), default=0)
+    if not days:
+        return
+    since = timezone.now() - timedelta(days=days)
+    rows = (
+        Message.objects.filter(
+            campaign__isnull=False, client__isnull=False, direction='outgoing', created_at__gte=since
+        )
+        .annotate(day=TruncDate('created_at'))
+        .order_by()
+        .values_list('client_id', 'type', 'day')
+        .annotate(count=Count('pk'))
+    )
+    batch = []
+    for client_id, channel, day, count in rows.iterator(chunk_size=10000):
+        batch.append(ClientSendHistory(client_id=client_id, channel=channel, day=day, count=count))
+        if len(batch) >= 10000:
+            ClientSendHistory.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    ClientSendHistory.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0002_client_client_created_id_idx'),
+        ('messaging', '0008_suppression'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientSendHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('email', 'Email'), ('whatsapp', 'WhatsApp')], max_length=10, verbose_name='Канал')),
+                ('day', models.DateField(verbose_name='День')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Сообщений')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='send_history', to='clients.client', verbose_name='Клиент')),
+            ],
+            options={
+                'verbose_name': 'История отправки клиенту',
+                'verbose_name_plural': 'История отправки клиентам',
+                'ordering': ['-day'],
+                'unique_together': {('client', 'channel', 'day')},
+            },
+        ),
+        migrations.RunPython(fill_send_history, migrations.RunPython.noop),
+    ]
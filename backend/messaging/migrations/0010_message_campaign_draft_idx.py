@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0009_clientsendhistory'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('status', 'draft')), fields=['campaign', 'id'], name='message_campaign_draft_idx'),
+        ),
+    ]
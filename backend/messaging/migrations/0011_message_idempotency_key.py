@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0010_message_campaign_draft_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True, unique=True, verbose_name='Ключ идемпотентности'),
+        ),
+    ]
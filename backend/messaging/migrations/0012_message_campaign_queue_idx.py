@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0011_message_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('status__in', ('queued', 'sending'))), fields=['campaign', 'type', 'scheduled_at'], name='message_campaign_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0012_message_campaign_queue_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('status__in', ('queued', 'sending'))), fields=['type', 'lane', 'scheduled_at'], name='message_queue_due_idx'),
+        ),
+    ]
@@ -1,8 +1,16 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from clients.models import Client
 
 
+def email_domain(email):
+    """Возвращает домен email-адреса в нижнем регистре."""
+    if not email or '@' not in email:
+        return None
+    return email.rsplit('@', 1)[1].strip().lower() or None
+
+
 class Message(models.Model):
     """Базовая модель для сообщений (email, WhatsApp) в системе."""
 
@@ -31,6 +39,10 @@ class Message(models.Model):
     from_number = models.CharField(_("От кого (номер)"), max_length=20, blank=True, null=True)
     to_email = models.EmailField(_("Кому (email)"), blank=True, null=True)
     to_number = models.CharField(_("Кому (номер)"), max_length=20, blank=True, null=True)
+    # Домен to_email: очередь отправки ограничивается по доменам получателей
+    recipient_domain = models.CharField(
+        _("Домен получателя"), max_length=255, blank=True, null=True, editable=False
+    )
 
     # Содержимое
     subject = models.CharField(_("Тема"), max_length=255, blank=True, null=True)  # Для email
@@ -43,6 +55,7 @@ class Message(models.Model):
     STATUS_CHOICES = (
         ('draft', _('Черновик')),
         ('queued', _('В очереди')),
+        ('sending', _('Отправляется')),
         ('sent', _('Отправлено')),
         ('delivered', _('Доставлено')),
         ('read', _('Прочитано')),
@@ -55,6 +68,14 @@ class Message(models.Model):
     track_opens = models.BooleanField(_("Отслеживать открытия"), default=True)  # Для email
     track_clicks = models.BooleanField(_("Отслеживать клики"), default=True)  # Для email и ссылок WhatsApp
 
+    # Линия отправки: разовые сообщения не ждут за массовыми рассылками
+    LANE_CHOICES = (
+        ('transactional', _('Транзакционные')),
+        ('campaign', _('Кампании')),
+        ('retry', _('Повторные попытки')),
+    )
+    lane = models.CharField(_("Линия отправки"), max_length=15, choices=LANE_CHOICES, default='transactional')
+
     # Связанная кампания
     campaign = models.ForeignKey(
         'campaigns.Campaign',
@@ -80,10 +101,46 @@ class Message(models.Model):
     delivered_at = models.DateTimeField(_("Дата доставки"), blank=True, null=True)
     read_at = models.DateTimeField(_("Дата прочтения"), blank=True, null=True)
 
+    # Количество неудачных попыток отправки (см. messaging.retry)
+    attempts = models.PositiveSmallIntegerField(_("Попыток отправки"), default=0)
+
+    # Время захвата сообщения воркером отправки (статус 'sending')
+    claimed_at = models.DateTimeField(_("Взято в отправку"), blank=True, null=True)
+
+    # Ключ идемпотентности (messaging.idempotency): повторное создание
+    # сообщения с тем же ключом отклоняется базой данных
+    idempotency_key = models.CharField(
+        _("Ключ идемпотентности"), max_length=255, unique=True, blank=True, null=True, editable=False
+    )
+
     class Meta:
         verbose_name = _("Сообщение")
         verbose_name_plural = _("Сообщения")
         ordering = ['-created_at']
+        indexes = [
+            # Для keyset-пагинации по (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='message_created_id_idx'),
+            # Для выборки очереди отправки
+            models.Index(fields=['type', 'status', 'id'], name='message_outbox_idx'),
+            models.Index(fields=['type', 'status', 'recipient_domain'], name='message_outbox_domain_idx'),
+            models.Index(fields=['type', 'lane', 'status', 'id'], name='message_lane_outbox_idx'),
+            # Наступившие сообщения очереди: отложенные scheduled_at (повторы,
+            # оптимальное время отправки) не просматриваются при выборке
+            models.Index(
+                fields=['type', 'lane', 'scheduled_at'], name='message_queue_due_idx',
+                condition=models.Q(status__in=('queued', 'sending'))
+            ),
+            # Очередь отправки кампании (campaigns.pacing.send_backlog)
+            models.Index(
+                fields=['campaign', 'type', 'scheduled_at'], name='message_campaign_queue_idx',
+                condition=models.Q(status__in=('queued', 'sending'))
+            ),
+            # Черновики кампаний с распределением отправки (campaigns.pacing)
+            models.Index(
+                fields=['campaign', 'id'], name='message_campaign_draft_idx',
+                condition=models.Q(status='draft')
+            ),
+        ]
 
     def __str__(self):
         if self.subject:
@@ -91,6 +148,15 @@ class Message(models.Model):
         else:
             return f"{self.get_type_display()}: {self.body[:50]}"
 
+    def save(self, *args, **kwargs):
+        self.recipient_domain = email_domain(self.to_email)
+        if self._state.adding and self.campaign_id and self.lane == 'transactional':
+            self.lane = 'campaign'
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'to_email' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'recipient_domain'}
+        super().save(*args, **kwargs)
+
     @property
     def is_email(self):
         return self.type == 'email'
@@ -103,26 +169,108 @@ class Message(models.Model):
     def is_read(self):
         return self.status == 'read' and self.read_at is not None
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем статус из базы, чтобы при сохранении обновить
+        # счетчики кампании только на величину перехода
+        if 'status' in instance.__dict__:
+            instance._loaded_status = instance.status
+        return instance
+
+    def _set_status(self, status, timestamp_field=None, **extra):
+        """Переводит сообщение в новый статус под блокировкой строки."""
+        with transaction.atomic():
+            self._loaded_status = (
+                Message.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values_list('status', flat=True)
+                .first()
+            )
+            self.status = status
+            update_fields = ['status']
+            if timestamp_field:
+                setattr(self, timestamp_field, timezone.now())
+                update_fields.append(timestamp_field)
+            for field, value in extra.items():
+                setattr(self, field, value)
+                update_fields.append(field)
+            self.save(update_fields=update_fields)
+
+    @classmethod
+    def bulk_set_status(cls, pks, status, timestamp_field=None):
+        """
+        Переводит сообщения в новый статус одним UPDATE.
+
+        Строки блокируются, чтобы счетчики кампаний изменились ровно на
+        величину переходов.
+
+        Returns:
+            int: Количество обновленных сообщений
+        """
+        from campaigns.counters import record_transitions
+
+        updates = {'status': status}
+        if timestamp_field:
+            updates[timestamp_field] = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                cls.objects.select_for_update()
+                .filter(pk__in=pks)
+                .values_list('campaign_id', 'status')
+            )
+            cls.objects.filter(pk__in=pks).update(**updates)
+            record_transitions((campaign_id, old, status, 1) for campaign_id, old in rows)
+        return len(rows)
+
     def mark_as_sent(self):
         """Отметить сообщение как отправленное с текущей отметкой времени."""
-        from django.utils import timezone
-        self.status = 'sent'
-        self.sent_at = timezone.now()
-        self.save(update_fields=['status', 'sent_at'])
+        self._set_status('sent', 'sent_at')
 
     def mark_as_delivered(self):
         """Отметить сообщение как доставленное с текущей отметкой времени."""
-        from django.utils import timezone
-        self.status = 'delivered'
-        self.delivered_at = timezone.now()
-        self.save(update_fields=['status', 'delivered_at'])
+        self._set_status('delivered', 'delivered_at')
 
     def mark_as_read(self):
         """Отметить сообщение как прочитанное с текущей отметкой времени."""
-        from django.utils import timezone
-        self.status = 'read'
-        self.read_at = timezone.now()
-        self.save(update_fields=['status', 'read_at'])
+        self._set_status('read', 'read_at')
+
+    def mark_as_failed(self, details=None):
+        """Отметить сообщение как неотправленное с описанием ошибки."""
+        self._set_status('failed', status_details=details)
+
+
+class MessageDeadLetter(models.Model):
+    """Сообщение, которое не удалось отправить и которое больше не повторяется."""
+
+    REASON_CHOICES = (
+        ('permanent', _('Постоянная ошибка')),
+        ('exhausted', _('Исчерпаны попытки')),
+    )
+
+    message = models.OneToOneField(
+        Message,
+        on_delete=models.CASCADE,
+        related_name='dead_letter',
+        verbose_name=_("Сообщение")
+    )
+    reason = models.CharField(_("Причина"), max_length=10, choices=REASON_CHOICES)
+    error = models.TextField(_("Ошибка"), blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(_("Попыток отправки"), default=0)
+    created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Неотправленное сообщение")
+        verbose_name_plural = _("Неотправленные сообщения")
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_reason_display()}: сообщение {self.message_id}"
+
+    def requeue(self):
+        """Возвращает сообщение в очередь отправки и удаляет запись."""
+        from .retry import requeue_dead_letters
+        requeue_dead_letters(MessageDeadLetter.objects.filter(pk=self.pk))
 
 
 class MessageAttachment(models.Model):
@@ -169,7 +317,8 @@ class MessageEvent(models.Model):
     )
     event_type = models.CharField(_("Тип события"), max_length=20, choices=EVENT_TYPES)
 
-    occurred_at = models.DateTimeField(_("Время события"), auto_now_add=True)
+    # Время от провайдера при приеме через вебхук, иначе время создания
+    occurred_at = models.DateTimeField(_("Время события"), default=timezone.now)
     ip_address = models.GenericIPAddressField(_("IP-адрес"), blank=True, null=True)
     user_agent = models.TextField(_("User Agent"), blank=True, null=True)
 
@@ -183,6 +332,85 @@ class MessageEvent(models.Model):
         verbose_name = _("Событие сообщения")
         verbose_name_plural = _("События сообщений")
         ordering = ['-occurred_at']
+        indexes = [
+            # Для keyset-пагинации по (occurred_at, id)
+            models.Index(fields=['-occurred_at', '-id'], name='msgevent_occurred_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_event_type_display()} для сообщения {self.message.id}"
+
+
+class Suppression(models.Model):
+    """Адрес, на который больше не отправляются сообщения (отказы и жалобы)."""
+
+    CHANNEL_CHOICES = (
+        ('email', _('Email')),
+        ('whatsapp', _('WhatsApp')),
+    )
+    channel = models.CharField(_("Канал"), max_length=10, choices=CHANNEL_CHOICES)
+
+    # Нормализованный адрес: email в нижнем регистре или номер из одних цифр
+    address = models.CharField(_("Адрес"), max_length=255)
+    # 64-битный хеш канала и адреса для фильтра в памяти (messaging.suppression)
+    address_hash = models.BigIntegerField(_("Хеш адреса"), editable=False)
+
+    REASON_CHOICES = (
+        ('bounce', _('Отказ')),
+        ('complaint', _('Жалоба')),
+        ('manual', _('Вручную')),
+    )
+    reason = models.CharField(_("Причина"), max_length=10, choices=REASON_CHOICES, default='manual')
+
+    # Сообщение, событие которого привело к блокировке
+    message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        related_name='suppressions',
+        verbose_name=_("Сообщение"),
+        blank=True,
+        null=True
+    )
+    created_at = models.DateTimeField(_("Дата создания"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Заблокированный адрес")
+        verbose_name_plural = _("Заблокированные адреса")
+        ordering = ['-created_at']
+        unique_together = ('channel', 'address')
+
+    def __str__(self):
+        return f"{self.get_channel_display()}: {self.address}"
+
+    def save(self, *args, **kwargs):
+        from .suppression import address_hash, normalize_address
+
+        self.address = normalize_address(self.channel, self.address)
+        self.address_hash = address_hash(self.channel, self.address)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'address' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'address_hash'}
+        super().save(*args, **kwargs)
+
+
+class ClientSendHistory(models.Model):
+    """Количество сообщений, созданных клиенту за день по каналу (частотные лимиты)."""
+
+    client = models.ForeignKey(
+        Client,
+        on_delete=models.CASCADE,
+        related_name='send_history',
+        verbose_name=_("Клиент")
+    )
+    channel = models.CharField(_("Канал"), max_length=10, choices=Message.TYPE_CHOICES)
+    day = models.DateField(_("День"))
+    count = models.PositiveIntegerField(_("Сообщений"), default=0)
+
+    class Meta:
+        verbose_name = _("История отправки клиенту")
+        verbose_name_plural = _("История отправки клиентам")
+        ordering = ['-day']
+        unique_together = ('client', 'channel', 'day')
 
     def __str__(self):
-        return f"{self.get_event_type_display()} для сообщения {self.message.id}"
\ No newline at end of file
+        return f"{self.client_id} {self.channel} {self.day}: {self.count}"
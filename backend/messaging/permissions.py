@@ -0,0 +1,18 @@
+import hmac
+
+from django.conf import settings
+from rest_framework import permissions
+
+
+class WebhookTokenPermission(permissions.BasePermission):
+    """
+    Доступ к вебхукам провайдеров по общему секрету.
+
+    Провайдер передает секрет в заголовке ``X-Webhook-Token``; если
+    ``MESSAGING_WEBHOOK_TOKEN`` не задан, вебхуки отключены.
+    """
+
+    def has_permission(self, request, view):
+        expected = getattr(settings, 'MESSAGING_WEBHOOK_TOKEN', None)
+        provided = request.headers.get('X-Webhook-Token', '')
+        return bool(expected) and hmac.compare_digest(provided, expected)
@@ -0,0 +1,198 @@
+"""
+Повторные попытки отправки и хранилище неотправленных сообщений.
+
+Ошибки делятся на временные (4xx SMTP, таймауты, ограничения скорости,
+переполненный ящик) и постоянные (остальные 5xx, несуществующий адрес).
+После временной ошибки сообщение возвращается в очередь на линию ``retry``
+со сдвигом ``scheduled_at`` по экспоненте с джиттером. После
+``MESSAGE_RETRY_MAX_ATTEMPTS`` попыток или при постоянной ошибке сообщение
+остается в статусе ``failed`` и попадает в ``MessageDeadLetter``.
+
+Все изменения выполняются пачками: ``bulk_update`` для сообщений,
+``bulk_create`` для записей dead-letter и одно обновление счетчиков на
+кампанию.
+"""
+import random
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from campaigns.counters import record_transitions
+from .models import Message, MessageDeadLetter
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+SMTP_CODE_RE = re.compile(r'\b([245])\d\d\b')
+
+TRANSIENT_MARKERS = (
+    'timeout', 'timed out', 'try again', 'temporar', 'rate limit', 'throttl',
+    'too many', 'greylist', 'deferred', 'mailbox full', 'quota', 'soft',
+    'connection', 'disconnected', 'соединение',
+)
+
+RETRY_FIELDS = ['status', 'status_details', 'attempts', 'scheduled_at', 'lane', 'claimed_at']
+
+
+def get_max_attempts():
+    return getattr(settings, 'MESSAGE_RETRY_MAX_ATTEMPTS', 5)
+
+
+def get_retry_window():
+    return getattr(settings, 'MESSAGE_RETRY_WINDOW', 3 * 24 * 60 * 60)
+
+
+def classify(error):
+    """
+    Определяет, временная ли ошибка отправки.
+
+    Код SMTP в тексте ошибки имеет приоритет: 4xx — временная,
+    5xx — постоянная. Без кода ошибка считается временной, если в тексте
+    есть признаки временного отказа.
+    """
+    text = (error or '').lower()
+    match = SMTP_CODE_RE.search(text)
+    if match:
+        return TRANSIENT if match.group(1) == '4' else PERMANENT
+    if any(marker in text for marker in TRANSIENT_MARKERS):
+        return TRANSIENT
+    return PERMANENT
+
+
+def backoff_delay(attempt):
+    """
+    Задержка перед попыткой с номером ``attempt`` (начиная с 1).
+
+    Экспонента ``base * 2^(attempt-1)``, ограниченная сверху, со случайным
+    разбросом в пределах второй половины интервала, чтобы повторы пачки не
+    приходили к провайдеру одновременно.
+    """
+    base = getattr(settings, 'MESSAGE_RETRY_BASE_DELAY', 60)
+    cap = getattr(settings, 'MESSAGE_RETRY_MAX_DELAY', 6 * 60 * 60)
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+def apply_failure(message, error, kind, now=None):
+    """
+    Применяет к сообщению результат неудачной попытки (без сохранения).
+
+    Returns:
+        str | None: Причина для dead-letter или ``None``, если сообщение
+        поставлено на повтор
+    """
+    now = now or timezone.now()
+    message.attempts += 1
+    message.status_details = error
+    message.claimed_at = None
+    if kind == PERMANENT:
+        message.status = 'failed'
+        return 'permanent'
+    if message.attempts >= get_max_attempts():
+        message.status = 'failed'
+        return 'exhausted'
+    message.status = 'queued'
+    message.lane = 'retry'
+    message.scheduled_at = now + backoff_delay(message.attempts)
+    return None
+
+
+def dead_letter_records(items):
+    """
+    Создает несохраненные записи dead-letter.
+
+    Args:
+        items: Пары (message, причина)
+    """
+    return [
+        MessageDeadLetter(
+            message_id=message.pk,
+            reason=reason,
+            error=message.status_details,
+            attempts=message.attempts,
+        )
+        for message, reason in items
+    ]
+
+
+def failed_queue(now):
+    """
+    Сообщения ``failed`` для разбора с блокировкой строк.
+
+    Проверка dead-letter выполняется через ``NOT EXISTS``, а не через
+    ``LEFT JOIN``: PostgreSQL не разрешает ``FOR UPDATE`` для nullable
+    стороны внешнего соединения.
+    """
+    return (
+        Message.objects.select_for_update(skip_locked=True, of=('self',))
+        .filter(
+            ~Exists(MessageDeadLetter.objects.filter(message=OuterRef('pk'))),
+            type='email', status='failed',
+            created_at__gte=now - timedelta(seconds=get_retry_window()),
+        )
+    )
+
+
+def retry_failed(batch_size=500):
+    """
+    Разбирает пачку сообщений ``failed``, еще не попавших в dead-letter.
+
+    Сюда попадают ошибки, записанные в обход отправки (например, отказы из
+    вебхуков провайдера): временные ставятся на повтор, постоянные и
+    исчерпавшие попытки — в dead-letter. Разбираются только письма (другие
+    каналы воркеры не отправляют), созданные не раньше чем
+    ``MESSAGE_RETRY_WINDOW`` секунд назад: старые ошибки не переотправляются.
+
+    Returns:
+        dict: Количество поставленных на повтор и отправленных в dead-letter
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            failed_queue(now)
+            .only('pk', 'campaign_id', *RETRY_FIELDS)
+            .order_by('pk')[:batch_size]
+        )
+        retried, dead = [], []
+        for message in messages:
+            reason = apply_failure(message, message.status_details, classify(message.status_details), now)
+            if reason is None:
+                retried.append(message)
+            else:
+                dead.append((message, reason))
+
+        Message.objects.bulk_update(messages, RETRY_FIELDS, batch_size=batch_size)
+        MessageDeadLetter.objects.bulk_create(dead_letter_records(dead), ignore_conflicts=True)
+        record_transitions((message.campaign_id, 'failed', 'queued', 1) for message in retried)
+
+    return {'retried': len(retried), 'dead_lettered': len(dead)}
+
+
+def requeue_dead_letters(queryset):
+    """
+    Возвращает сообщения из dead-letter в очередь отправки.
+
+    Счетчик попыток сбрасывается, записи dead-letter удаляются.
+
+    Returns:
+        int: Количество возвращенных сообщений
+    """
+    with transaction.atomic():
+        rows = list(
+            queryset.select_for_update()
+            .values_list('pk', 'message_id', 'message__campaign_id', 'message__status')
+        )
+        message_ids = [message_id for _, message_id, _, status in rows if status == 'failed']
+        Message.objects.filter(pk__in=message_ids).update(
+            status='queued', lane='retry', attempts=0, scheduled_at=None, claimed_at=None
+        )
+        MessageDeadLetter.objects.filter(pk__in=[pk for pk, *_ in rows]).delete()
+        record_transitions(
+            (campaign_id, 'failed', 'queued', 1)
+            for _, _, campaign_id, status in rows if status == 'failed'
+        )
+    return len(message_ids)
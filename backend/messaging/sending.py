@@ -0,0 +1,286 @@
+"""
+Отправка email-сообщений из очереди.
+
+Воркер захватывает пачку сообщений ``queued`` (статус ``sending``,
+``SELECT ... FOR UPDATE SKIP LOCKED``, поэтому несколько воркеров не берут
+одни и те же строки), отправляет их через постоянное SMTP-подключение
+процесса и записывает результаты всей пачки несколькими запросами:
+отправленные — ``sent``, после ошибок — повтор с задержкой на линии
+``retry`` или dead-letter (см. ``messaging.retry``). Сообщения, захваченные
+упавшим воркером, снова становятся доступны через
+``EMAIL_SENDING_CLAIM_TIMEOUT`` секунд.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from campaigns.counters import record_transitions
+from campaigns.models import Campaign
+from core.ratelimit import TokenBucket
+from .domains import adjust_rates, admit_domains, release_slots
+from .models import Message, MessageDeadLetter
+from .retry import PERMANENT, RETRY_FIELDS, TRANSIENT, apply_failure, dead_letter_records
+from .tracking import apply_tracking
+from .transport import DEFERRED, FAILED, SENT, smtp_pool
+
+MESSAGE_FIELDS = (
+    'pk', 'type', 'campaign_id', 'status', 'status_details', 'from_email', 'to_email',
+    'recipient_domain', 'lane', 'subject', 'body', 'track_opens', 'track_clicks', 'sent_at', 'claimed_at',
+    'attempts', 'scheduled_at', 'template__is_html',
+)
+
+
+def get_batch_size():
+    return getattr(settings, 'EMAIL_SEND_BATCH_SIZE', 100)
+
+
+def get_campaign_buckets(campaign_ids):
+    """Возвращает корзины дневных лимитов для кампаний, у которых они заданы."""
+    limits = Campaign.objects.filter(
+        pk__in=campaign_ids, max_messages_per_day__isnull=False
+    ).values_list('pk', 'max_messages_per_day')
+    return {
+        campaign_id: TokenBucket.per_day(f'campaign:{campaign_id}:daily', limit)
+        for campaign_id, limit in limits
+    }
+
+
+def admit_campaigns(candidates, exhausted):
+    """
+    Отбирает кандидатов, для которых есть токены дневного лимита кампании.
+
+    Токены запрашиваются одним вызовом на кампанию. Кампании, которым
+    выдано меньше запрошенного, добавляются в ``exhausted``.
+
+    Args:
+        candidates (list): Кортежи (id, id кампании, домен) в порядке очереди
+        exhausted (set): Кампании без токенов
+
+    Returns:
+        list: Допущенные кандидаты в порядке очереди
+    """
+    by_campaign = defaultdict(list)
+    for candidate in candidates:
+        by_campaign[candidate[1]].append(candidate)
+
+    buckets = get_campaign_buckets([cid for cid in by_campaign if cid is not None])
+    admitted = set()
+    for campaign_id, rows in by_campaign.items():
+        bucket = buckets.get(campaign_id)
+        if bucket is None:
+            admitted.update(rows)
+            continue
+        granted = bucket.acquire(len(rows))
+        if granted < len(rows):
+            exhausted.add(campaign_id)
+        admitted.update(rows[:granted])
+    return [candidate for candidate in candidates if candidate in admitted]
+
+
+def refund_campaigns(rejected):
+    """Возвращает токены дневного лимита кампаний за кандидатов, не допущенных доменами."""
+    counts = defaultdict(int)
+    for _message_id, campaign_id, _domain in rejected:
+        if campaign_id is not None:
+            counts[campaign_id] += 1
+    for campaign_id, bucket in get_campaign_buckets(list(counts)).items():
+        bucket.refund(counts[campaign_id])
+
+
+def claim_messages(limit, message_type='email', max_rounds=5, slots=None, lane=None):
+    """
+    Захватывает пачку сообщений для отправки.
+
+    Сообщения доменов без свободного слота или токенов и кампаний с
+    исчерпанным дневным лимитом остаются в очереди и исключаются из
+    следующих раундов выборки, чтобы не блокировать другие сообщения.
+
+    Args:
+        slots (dict): Сюда записываются занятые слоты доменов; их нужно
+            освободить через ``domains.release_slots`` после отправки
+        lane (str): Линия отправки; ``None`` — все линии
+
+    Returns:
+        list: id захваченных сообщений
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'EMAIL_SENDING_CLAIM_TIMEOUT', 600))
+    slots = {} if slots is None else slots
+    claimed, exhausted, blocked = [], set(), set()
+    with transaction.atomic():
+        queue = (
+            Message.objects.select_for_update(skip_locked=True)
+            .filter(type=message_type)
+            # Явное условие на статусы позволяет использовать частичный индекс
+            # message_queue_due_idx и не просматривать отложенные сообщения
+            .filter(status__in=('queued', 'sending'))
+            .filter(Q(status='queued') | Q(claimed_at__lt=stale))
+            .filter(Q(scheduled_at__isnull=True) | Q(scheduled_at__lte=now))
+            .order_by('pk')
+        )
+        if lane is not None:
+            queue = queue.filter(lane=lane)
+        for _ in range(max_rounds):
+            remaining = limit - len(claimed)
+            candidates = list(
+                queue.exclude(pk__in=claimed)
+                .exclude(campaign_id__in=exhausted)
+                .exclude(recipient_domain__in=blocked)
+                .values_list('pk', 'campaign_id', 'recipient_domain')[:remaining]
+            )
+            # Сначала лимит кампании: токены и слоты доменов расходуются только
+            # на сообщения, которые кампания может отправить
+            admitted = admit_campaigns(candidates, exhausted)
+            sendable = admit_domains(admitted, blocked, slots)
+            if len(sendable) < len(admitted):
+                refund_campaigns(set(admitted) - set(sendable))
+            claimed.extend(message_id for message_id, _campaign_id, _domain in sendable)
+            # Очередь закончилась или пачка набрана
+            if len(candidates) < remaining or len(claimed) >= limit:
+                break
+        Message.objects.filter(pk__in=claimed).update(status='sending', claimed_at=now)
+    return claimed
+
+
+def build_email(message):
+    """Создает письмо Django для сообщения, добавляя трекинг в HTML."""
+    from_email = message.from_email or settings.DEFAULT_FROM_EMAIL
+    subject = message.subject or ''
+    is_html = message.template.is_html if message.template_id else False
+    if not is_html:
+        return EmailMultiAlternatives(subject, message.body, from_email, [message.to_email])
+    email = EmailMultiAlternatives(subject, strip_tags(message.body), from_email, [message.to_email])
+    email.attach_alternative(apply_tracking(message, message.body), 'text/html')
+    return email
+
+
+class Throttle:
+    """Ограничение скорости отправки одного воркера (писем в секунду)."""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_at = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+            now = self.next_at
+        self.next_at = now + self.interval
+
+
+def send_messages(message_ids, connection=None, throttle=None):
+    """
+    Отправляет захваченные сообщения через одно SMTP-подключение.
+
+    Письма, которые не удается собрать (например, перевод строки в теме),
+    получают результат ``FAILED`` и не прерывают отправку пачки.
+
+    Returns:
+        dict: {результат: [(message, ошибка), ...]}
+    """
+    messages = (
+        Message.objects.filter(pk__in=message_ids, status='sending')
+        .select_related('template')
+        .only(*MESSAGE_FIELDS)
+        .order_by('pk')
+    )
+    connection = connection or smtp_pool.get()
+    throttle = throttle or Throttle(getattr(settings, 'EMAIL_MAX_PER_SECOND', None))
+    results = {SENT: [], FAILED: [], DEFERRED: []}
+    with connection.lock:
+        for message in messages:
+            try:
+                email_message = build_email(message)
+            except Exception as exc:
+                # Ошибка одного письма не должна оставлять всю пачку в 'sending'
+                results[FAILED].append((message, str(exc)))
+                continue
+            throttle.wait()
+            result, error = connection.send(email_message)
+            results[result].append((message, error))
+    return results
+
+
+def report_results(results):
+    """
+    Записывает результаты отправки пачки.
+
+    Строки блокируются и обновляются, только если они все еще в статусе
+    ``sending``: вебхук доставки мог успеть перевести сообщение дальше.
+    Неудачные попытки обрабатываются ``retry.apply_failure``: повтор с
+    задержкой или dead-letter.
+
+    Returns:
+        dict: Количество сообщений по результатам
+    """
+    now = timezone.now()
+    by_id = {}
+    for result, items in results.items():
+        for message, error in items:
+            by_id[message.pk] = (result, message, error)
+
+    with transaction.atomic():
+        current = set(
+            Message.objects.select_for_update()
+            .filter(pk__in=list(by_id), status='sending')
+            .values_list('pk', flat=True)
+        )
+        updated, transitions, dead = [], [], []
+        for pk in current:
+            result, message, error = by_id[pk]
+            if result == SENT:
+                message.status, message.sent_at, message.status_details = 'sent', now, None
+                message.claimed_at = None
+            else:
+                kind = TRANSIENT if result == DEFERRED else PERMANENT
+                reason = apply_failure(message, error, kind, now)
+                if reason is not None:
+                    dead.append((message, reason))
+            updated.append(message)
+            transitions.append((message.campaign_id, 'sending', message.status, 1))
+
+        Message.objects.bulk_update(updated, ['sent_at'] + RETRY_FIELDS, batch_size=500)
+        MessageDeadLetter.objects.bulk_create(dead_letter_records(dead), ignore_conflicts=True)
+        record_transitions(transitions)
+
+    return {result: len(items) for result, items in results.items()}
+
+
+def send_queued(batch_size=None, time_limit=None, lane=None):
+    """
+    Отправляет очередь пачками, пока она не опустеет или не выйдет время.
+
+    Returns:
+        dict: Суммарное количество сообщений по результатам
+    """
+    batch_size = batch_size or get_batch_size()
+    deadline = time.monotonic() + time_limit if time_limit else None
+    throttle = Throttle(getattr(settings, 'EMAIL_MAX_PER_SECOND', None))
+    totals = {SENT: 0, FAILED: 0, DEFERRED: 0}
+    while deadline is None or time.monotonic() < deadline:
+        slots = {}
+        try:
+            message_ids = claim_messages(batch_size, slots=slots, lane=lane)
+            if not message_ids:
+                break
+            results = send_messages(message_ids, throttle=throttle)
+        finally:
+            release_slots(slots)
+        adjust_rates(results)
+        counts = report_results(results)
+        for result, count in counts.items():
+            totals[result] += count
+        if counts[DEFERRED] == len(message_ids):
+            # Сервер недоступен: не перебираем очередь впустую
+            break
+    return totals
@@ -1,38 +1,95 @@
 from rest_framework import serializers
-from .models import Message, MessageAttachment, MessageEvent
-from clients.serializers import ClientSerializer
-from campaigns.serializers import CampaignSerializer
-from templates.serializers import MessageTemplateSerializer
+from core.serializers import DynamicFieldsModelSerializer
+from .models import Message, MessageAttachment, MessageDeadLetter, MessageEvent, Suppression
 
 
-class MessageAttachmentSerializer(serializers.ModelSerializer):
+class MessageAttachmentSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = MessageAttachment
         fields = ['id', 'file', 'filename', 'file_size', 'content_type', 'created_at']
 
 
-class MessageEventSerializer(serializers.ModelSerializer):
+class MessageEventSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = MessageEvent
         fields = ['id', 'event_type', 'occurred_at', 'ip_address', 'user_agent', 'url', 'metadata']
+        read_only_fields = ['occurred_at']
 
 
-class MessageSerializer(serializers.ModelSerializer):
-    client = ClientSerializer(read_only=True)
-    campaign = CampaignSerializer(read_only=True)
-    template = MessageTemplateSerializer(read_only=True)
+class MessageSerializer(DynamicFieldsModelSerializer):
+    client = serializers.PrimaryKeyRelatedField(read_only=True)
+    campaign = serializers.PrimaryKeyRelatedField(read_only=True)
+    template = serializers.PrimaryKeyRelatedField(read_only=True)
 
-    attachments = MessageAttachmentSerializer(many=True, read_only=True)
-    events = MessageEventSerializer(many=True, read_only=True)
+    attachments = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    events = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
 
     class Meta:
         model = Message
         fields = [
             'id', 'type', 'direction', 'client', 'from_email', 'from_number',
             'to_email', 'to_number', 'subject', 'body', 'has_attachments',
-            'status', 'status_details', 'track_opens', 'track_clicks',
-            'campaign', 'template', 'created_at', 'scheduled_at',
+            'status', 'status_details', 'lane', 'track_opens', 'track_clicks',
+            'campaign', 'template', 'idempotency_key', 'created_at', 'scheduled_at',
             'sent_at', 'delivered_at', 'read_at',
             'attachments', 'events'
         ]
-        read_only_fields = ['created_at', 'sent_at', 'delivered_at', 'read_at']
\ No newline at end of file
+        read_only_fields = ['idempotency_key', 'created_at', 'sent_at', 'delivered_at', 'read_at']
+        expandable_fields = {
+            'client': ('clients.serializers.ClientSerializer', {}),
+            'campaign': ('campaigns.serializers.CampaignSerializer', {}),
+            'template': ('templates.serializers.MessageTemplateSerializer', {}),
+            'attachments': ('messaging.serializers.MessageAttachmentSerializer', {'many': True}),
+            'events': ('messaging.serializers.MessageEventSerializer', {'many': True}),
+        }
+
+
+class MessageDeadLetterSerializer(DynamicFieldsModelSerializer):
+    message = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta:
+        model = MessageDeadLetter
+        fields = ['id', 'message', 'reason', 'error', 'attempts', 'created_at']
+        read_only_fields = fields
+        expandable_fields = {
+            'message': ('messaging.serializers.MessageSerializer', {}),
+        }
+
+
+class SuppressionSerializer(DynamicFieldsModelSerializer):
+    message = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta:
+        model = Suppression
+        fields = ['id', 'channel', 'address', 'reason', 'message', 'created_at']
+        read_only_fields = ['created_at']
+        expandable_fields = {
+            'message': ('messaging.serializers.MessageSerializer', {}),
+        }
+
+    def validate(self, attrs):
+        from .suppression import normalize_address
+
+        channel = attrs.get('channel', getattr(self.instance, 'channel', None))
+        address = attrs.get('address', getattr(self.instance, 'address', None))
+        attrs['address'] = normalize_address(channel, address)
+        if not attrs['address']:
+            raise serializers.ValidationError({'address': "Адрес не может быть пустым"})
+        duplicates = Suppression.objects.filter(channel=channel, address=attrs['address'])
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError({'address': "Адрес уже заблокирован"})
+        return attrs
+
+
+class WebhookEventSerializer(serializers.Serializer):
+    """Событие сообщения в формате вебхука провайдера."""
+
+    message_id = serializers.IntegerField(min_value=1)
+    event_type = serializers.ChoiceField(choices=MessageEvent.EVENT_TYPES)
+    occurred_at = serializers.DateTimeField(required=False)
+    ip_address = serializers.IPAddressField(required=False, allow_null=True)
+    user_agent = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    url = serializers.URLField(required=False, allow_null=True, allow_blank=True)
+    metadata = serializers.JSONField(required=False, allow_null=True)
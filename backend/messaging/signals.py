@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from campaigns.counters import record_transition
+from .models import Message, MessageEvent
+
+
+@receiver(post_save, sender=Message)
+def update_campaign_counters(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """Обновляет счетчики кампании на величину перехода статуса сообщения."""
+    if raw:
+        return
+    if created:
+        record_transition(instance.campaign_id, None, instance.status)
+    elif update_fields is None or 'status' in update_fields:
+        previous = getattr(instance, '_loaded_status', None)
+        if previous is not None and previous != instance.status:
+            record_transition(instance.campaign_id, previous, instance.status)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Message)
+def release_campaign_counters(sender, instance, **kwargs):
+    """Уменьшает счетчики кампании при удалении сообщения."""
+    record_transition(instance.campaign_id, instance.status, None)
+
+
+@receiver(post_save, sender=Message)
+def dispatch_transactional_email(sender, instance, created, raw=False, **kwargs):
+    """Сразу запускает отправку нового транзакционного письма, не дожидаясь планировщика."""
+    if raw or not created:
+        return
+    if instance.type == 'email' and instance.status == 'queued' and instance.lane == 'transactional':
+        from .lanes import enqueue_lane
+        transaction.on_commit(lambda: enqueue_lane('transactional'))
+
+
+@receiver(post_save, sender=MessageEvent)
+def suppress_recipient(sender, instance, created, raw=False, **kwargs):
+    """Блокирует адрес получателя при отказе или жалобе, созданных через API."""
+    if raw or not created:
+        return
+    from .suppression import is_suppressing, suppress_from_events
+    if is_suppressing(instance):
+        suppress_from_events([instance], {instance.message_id: instance.message})
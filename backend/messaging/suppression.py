@@ -0,0 +1,147 @@
+"""
+Список заблокированных адресов (suppression list).
+
+Отказы и жалобы (события ``bounce`` и ``complaint``) добавляют адрес
+получателя в ``Suppression``; мягкие отказы (``metadata.bounce_type`` —
+``soft`` или ``transient``) адрес не блокируют.
+
+Fan-out кампании не проверяет получателей по одному: в начале запуска
+хеши всех заблокированных адресов загружаются в отсортированный массив
+64-битных чисел (``SuppressionFilter``, 8 байт на адрес), и каждая пачка
+проверяется по нему бинарным поиском. Совпадения хешей подтверждаются
+одним запросом на пачку, поэтому коллизии не блокируют лишних адресов.
+"""
+import hashlib
+import re
+from array import array
+from bisect import bisect_left
+
+from .models import Suppression
+
+# Тип события -> причина блокировки
+SUPPRESSION_EVENTS = {
+    'bounce': 'bounce',
+    'complaint': 'complaint',
+}
+
+# Значения metadata.bounce_type для мягких отказов
+SOFT_BOUNCE_TYPES = ('soft', 'transient')
+
+NON_DIGITS_RE = re.compile(r'\D')
+
+
+def normalize_address(channel, address):
+    """Приводит адрес к каноническому виду для сравнения."""
+    address = (address or '').strip()
+    if channel == 'email':
+        return address.lower()
+    return NON_DIGITS_RE.sub('', address)
+
+
+def address_hash(channel, address):
+    """Возвращает знаковый 64-битный хеш нормализованного адреса канала."""
+    digest = hashlib.blake2b(f'{channel}:{address}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def message_address(message):
+    """Возвращает пару (канал, нормализованный адрес) получателя сообщения."""
+    address = message.to_email if message.type == 'email' else message.to_number
+    normalized = normalize_address(message.type, address)
+    return (message.type, normalized) if normalized else (None, None)
+
+
+def is_suppressing(event):
+    """Определяет, блокирует ли событие адрес получателя."""
+    if event.event_type == 'complaint':
+        return True
+    if event.event_type != 'bounce':
+        return False
+    metadata = event.metadata if isinstance(event.metadata, dict) else {}
+    return metadata.get('bounce_type') not in SOFT_BOUNCE_TYPES
+
+
+def suppress_from_events(events, messages):
+    """
+    Блокирует адреса получателей по событиям отказов и жалоб.
+
+    Args:
+        events: MessageEvent
+        messages (dict): {id: Message} с полями ``type``, ``to_email``,
+            ``to_number``
+
+    Returns:
+        int: Количество событий, приведших к блокировке
+    """
+    records = {}
+    for event in events:
+        message = messages.get(event.message_id)
+        if message is None or not is_suppressing(event):
+            continue
+        channel, address = message_address(message)
+        if address:
+            records[(channel, address)] = Suppression(
+                channel=channel,
+                address=address,
+                address_hash=address_hash(channel, address),
+                reason=SUPPRESSION_EVENTS[event.event_type],
+                message_id=message.pk,
+            )
+    Suppression.objects.bulk_create(records.values(), ignore_conflicts=True)
+    return len(records)
+
+
+class SuppressionFilter:
+    """
+    Проверка принадлежности адресов списку блокировки в памяти.
+
+    Хранит отсортированный массив хешей; ``exclude`` отбрасывает
+    заблокированных получателей пачки, подтверждая совпадения запросом.
+    """
+
+    def __init__(self, hashes):
+        self.hashes = array('q', sorted(hashes))
+        self.excluded = 0
+
+    @classmethod
+    def load(cls):
+        """Загружает хеши всех заблокированных адресов."""
+        return cls(
+            Suppression.objects.order_by().values_list('address_hash', flat=True).iterator(chunk_size=10000)
+        )
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def might_contain(self, channel, address):
+        value = address_hash(channel, address)
+        index = bisect_left(self.hashes, value)
+        return index < len(self.hashes) and self.hashes[index] == value
+
+    def exclude(self, channel, recipients, get_address):
+        """
+        Отбрасывает заблокированных получателей.
+
+        Args:
+            recipients (list): Получатели пачки
+            get_address: Функция, возвращающая адрес получателя
+
+        Returns:
+            list: Незаблокированные получатели в исходном порядке
+        """
+        if not self.hashes:
+            return recipients
+        addresses = [normalize_address(channel, get_address(recipient)) for recipient in recipients]
+        candidates = {address for address in addresses if address and self.might_contain(channel, address)}
+        if not candidates:
+            return recipients
+        suppressed = set(
+            Suppression.objects.filter(channel=channel, address__in=candidates)
+            .values_list('address', flat=True)
+        )
+        kept = [
+            recipient for recipient, address in zip(recipients, addresses)
+            if address not in suppressed
+        ]
+        self.excluded += len(recipients) - len(kept)
+        return kept
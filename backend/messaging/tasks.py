@@ -0,0 +1,91 @@
+import logging
+import time
+
+from celery import shared_task
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+
+from core.bulk import run_selection
+
+from .events import ingest_events
+from .frequency import prune_history
+from .lanes import LANES, enqueue_lane
+from .models import Message
+from .retry import retry_failed
+from .sending import send_queued
+from .transport import smtp_pool
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(acks_late=True)
+def ingest_message_events(events):
+    """
+    Сохраняет пачку событий от провайдера и обновляет статусы сообщений.
+
+    ``events`` — список словарей в формате вебхука (время в ISO 8601).
+    """
+    return ingest_events(events)
+
+
+@shared_task
+def send_queued_emails(batch_size=None, lane=None, enqueued_at=None):
+    """
+    Отправляет очередь email-сообщений через постоянное SMTP-подключение.
+
+    Запускается для каждой линии в ее очереди Celery (``lanes.enqueue_lane``);
+    несколько одновременных запусков не мешают друг другу. ``enqueued_at``
+    (unix-время постановки) позволяет измерить ожидание задачи в очереди.
+    """
+    queue_wait = time.time() - enqueued_at if enqueued_at else None
+    if queue_wait is not None:
+        logger.info('Линия %s: задача ждала в очереди %.3f с', lane, queue_wait)
+    time_limit = getattr(settings, 'EMAIL_SEND_TIME_LIMIT', 50)
+    totals = send_queued(batch_size=batch_size, time_limit=time_limit, lane=lane)
+    totals['queue_wait'] = queue_wait
+    return totals
+
+
+@shared_task
+def dispatch_email_lanes():
+    """Периодически ставит задачи отправки во все линии."""
+    for lane in LANES:
+        enqueue_lane(lane)
+
+
+@shared_task
+def retry_failed_messages(batch_size=500):
+    """
+    Разбирает сообщения ``failed`` вне dead-letter: временные ошибки ставятся
+    на повтор в линию ``retry``, остальные попадают в dead-letter.
+    """
+    totals = {'retried': 0, 'dead_lettered': 0}
+    while True:
+        counts = retry_failed(batch_size=batch_size)
+        for key, count in counts.items():
+            totals[key] += count
+        if sum(counts.values()) < batch_size:
+            break
+    if totals['retried']:
+        enqueue_lane('retry')
+    return totals
+
+
+@shared_task(bind=True)
+def bulk_set_message_status(self, selection, status, timestamp_field=None):
+    """Массово переводит сообщения в статус (действие администратора)."""
+    return run_selection(
+        selection, Message.bulk_set_status, task=self,
+        status=status, timestamp_field=timestamp_field
+    )
+
+
+@shared_task
+def prune_send_history():
+    """Удаляет историю отправки клиентам за пределами окон частотных лимитов."""
+    return prune_history()
+
+
+@worker_process_shutdown.connect
+def close_smtp_connections(**kwargs):
+    smtp_pool.close_all()
@@ -1,3 +1,440 @@
-from django.test import TestCase
+import base64
+import json
+import socketserver
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin import helpers
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from campaigns.models import Campaign
+from clients.models import Client
+from core.queries import QueryCounter
+from core.ratelimit import LocalBucketBackend, TokenBucket
+
+from .frequency import FrequencyCap, capped_clients, prune_history, record_sends
+from .idempotency import create_messages
+from .models import (
+    ClientSendHistory, Message, MessageAttachment, MessageDeadLetter, MessageEvent, Suppression
+)
+from .retry import failed_queue, retry_failed
+from .suppression import SuppressionFilter
+from .tasks import bulk_set_message_status
+from .sending import claim_messages, report_results, send_messages
+from .transport import FAILED, SENT, SMTPConnection
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP-сервер: принимает письма и складывает их в ``server.received``."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 stub')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 stub')
+            elif command.startswith('MAIL FROM'):
+                recipients = []
+                self.reply('250 OK')
+            elif command.startswith('RCPT TO'):
+                recipients.append(command)
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for data_line in self.rfile:
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(data_line)
+                self.server.received.append((recipients, b''.join(data)))
+                self.reply('250 OK')
+            elif command in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPStubHandler)
+        self.received = []
+
+
+class SendMessagesTests(TestCase):
+    """Отправка пачки через SMTP-заглушку."""
+
+    def setUp(self):
+        self.server = SMTPStub()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.connection = SMTPConnection(
+            host='127.0.0.1', port=self.server.server_address[1],
+            username='', password='', use_tls=False, use_ssl=False, timeout=5
+        )
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def create_message(self, **kwargs):
+        fields = {
+            'type': 'email', 'direction': 'outgoing', 'to_email': 'client@example.com',
+            'subject': 'Здравствуйте', 'body': 'Текст', 'status': 'sending',
+        }
+        fields.update(kwargs)
+        return Message.objects.create(**fields)
+
+    def test_sends_batch_over_one_connection(self):
+        messages = [self.create_message(to_email=f'client{i}@example.com') for i in range(3)]
+
+        results = send_messages([message.pk for message in messages], connection=self.connection)
+
+        self.assertEqual(len(results[SENT]), 3)
+        self.assertEqual(len(self.server.received), 3)
+        report_results(results)
+        self.assertEqual(
+            set(Message.objects.filter(pk__in=[m.pk for m in messages]).values_list('status', flat=True)),
+            {'sent'}
+        )
+
+    def test_bad_header_fails_only_its_message(self):
+        good = self.create_message()
+        bad = self.create_message(subject='Здравствуйте, Иван\nBcc: all@example.com')
+
+        results = send_messages([good.pk, bad.pk], connection=self.connection)
+
+        self.assertEqual([message.pk for message, _ in results[SENT]], [good.pk])
+        self.assertEqual([message.pk for message, _ in results[FAILED]], [bad.pk])
+        self.assertEqual(len(self.server.received), 1)
+        report_results(results)
+        bad.refresh_from_db()
+        self.assertNotEqual(bad.status, 'sending')
+
+
+class CreateMessagesTests(TestCase):
+    """Идемпотентное создание сообщений."""
+
+    def build(self, key):
+        return Message(
+            type='email', direction='outgoing', to_email='client@example.com',
+            subject='Здравствуйте', body='Текст', status='queued', idempotency_key=key
+        )
+
+    def test_returns_only_inserted_messages(self):
+        create_messages([self.build('campaign:1:email:1')])
+
+        created = create_messages([self.build('campaign:1:email:1'), self.build('campaign:1:email:2')])
+
+        self.assertEqual([message.idempotency_key for message in created], ['campaign:1:email:2'])
+        self.assertEqual(Message.objects.count(), 2)
+
+
+@override_settings(API_QUERY_BUDGET_STRICT=True)
+class MessageApiQueryBudgetTests(TestCase):
+    """Количество SQL-запросов списка сообщений со вложенными связями."""
+
+    url = '/api/messaging/messages/?expand=client,campaign,events,attachments'
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create_user('manager', password='secret'))
+        self.campaign = Campaign.objects.create(name='Акция', type='email')
+
+    def create_sent_messages(self, count):
+        for _ in range(count):
+            index = Message.objects.count()
+            client = Client.objects.create(
+                first_name='Иван', last_name='Петров', email=f'client{index}@example.com'
+            )
+            message = Message.objects.create(
+                type='email', direction='outgoing', client=client, campaign=self.campaign,
+                to_email=client.email, subject='Здравствуйте', body='Текст', status='sent'
+            )
+            for event_type in ('delivered', 'open'):
+                MessageEvent.objects.create(message=message, event_type=event_type)
+            MessageAttachment.objects.create(
+                message=message, file='message_attachments/price.pdf', filename='price.pdf',
+                file_size=1024, content_type='application/pdf'
+            )
+
+    def get_list(self):
+        with QueryCounter() as counter:
+            response = self.api.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(response['X-Query-Count']), counter.count)
+        return response, counter.count
+
+    def test_nested_list_within_budget(self):
+        self.create_sent_messages(2)
+        _, few = self.get_list()
+
+        self.create_sent_messages(8)
+        response, many = self.get_list()
+
+        self.assertEqual(many, few)
+        self.assertLessEqual(many, settings.API_QUERY_BUDGET)
+        results = response.data['results']
+        self.assertEqual(len(results), 10)
+        self.assertEqual(len(results[0]['events']), 2)
+        self.assertEqual(results[0]['attachments'][0]['filename'], 'price.pdf')
+        self.assertEqual(results[0]['campaign']['name'], 'Акция')
+
+
+class MessageCursorTests(TestCase):
+    """Курсорная пагинация списка сообщений."""
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(get_user_model().objects.create_user('manager', password='secret'))
+
+    def test_invalid_cursor_value_is_not_found(self):
+        payload = json.dumps({'v': 'не дата', 'id': 1}).encode()
+        cursor = base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+        response = self.api.get('/api/messaging/messages/', {'cursor': cursor})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class RetryFailedTests(TestCase):
+    """Разбор сообщений ``failed``."""
+
+    def create_failed(self, details):
+        return Message.objects.create(
+            type='email', direction='outgoing', to_email='client@example.com',
+            subject='Здравствуйте', body='Текст', status='failed', status_details=details
+        )
+
+    def test_queue_locks_messages_without_outer_join(self):
+        queryset = failed_queue(timezone.now())
+        sql = str(queryset.query).upper()
+
+        self.assertNotIn('OUTER JOIN', sql)
+        self.assertIn('NOT EXISTS', sql)
+        self.assertTrue(queryset.query.select_for_update_skip_locked)
+        self.assertEqual(queryset.query.select_for_update_of, ('self',))
+
+    def test_skips_dead_letters_and_retries_transient(self):
+        dead = self.create_failed('550 No such user')
+        MessageDeadLetter.objects.create(message=dead, reason='permanent', error='550 No such user')
+        transient = self.create_failed('421 Try again later')
+
+        result = retry_failed()
+
+        self.assertEqual(result, {'retried': 1, 'dead_lettered': 0})
+        transient.refresh_from_db()
+        self.assertEqual(transient.status, 'queued')
+
+
+@override_settings(ADMIN_BULK_ACTION_THRESHOLD=2, ADMIN_BULK_ACTION_CHUNK_SIZE=2)
+class MessageAdminBulkActionTests(TestCase):
+    """Массовые действия администратора над большими выборками."""
+
+    url = '/admin/messaging/message/?status__exact=queued'
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', password='secret'))
+        self.queued = [
+            Message.objects.create(
+                type='email', direction='outgoing', to_email=f'client{i}@example.com',
+                subject='Здравствуйте', body='Текст', status='queued'
+            )
+            for i in range(5)
+        ]
+        self.failed = Message.objects.create(
+            type='email', direction='outgoing', to_email='failed@example.com',
+            subject='Здравствуйте', body='Текст', status='failed'
+        )
+        self.payloads = []
+
+    def run_task(self, selection, **kwargs):
+        # Задача получает описание выборки через брокер (JSON)
+        selection = json.loads(json.dumps(selection))
+        self.payloads.append(selection)
+        return bulk_set_message_status.apply(args=[selection], kwargs=kwargs, throw=True)
+
+    def post_action(self, data):
+        # Прогресс пишется в result backend, которого в тестах нет
+        with mock.patch.object(bulk_set_message_status, 'delay', side_effect=self.run_task), \
+                mock.patch.object(bulk_set_message_status, 'update_state') as update_state:
+            response = self.client.post(self.url, {'action': 'mark_as_sent', **data})
+        self.assertEqual(response.status_code, 302)
+        return update_state
+
+    def test_select_across_passes_changelist_filters(self):
+        update_state = self.post_action({'select_across': '1', helpers.ACTION_CHECKBOX_NAME: [self.queued[0].pk]})
+
+        self.assertEqual(self.payloads[0]['filters'], 'status__exact=queued')
+        self.assertIsNone(self.payloads[0]['pks'])
+        self.assertEqual(self.payloads[0]['total'], 5)
+        statuses = dict(Message.objects.values_list('pk', 'status'))
+        self.assertEqual({statuses[message.pk] for message in self.queued}, {'sent'})
+        self.assertEqual(statuses[self.failed.pk], 'failed')
+        update_state.assert_called_with(state='PROGRESS', meta={'done': 5, 'total': 5})
+
+    def test_checked_rows_only(self):
+        checked = [message.pk for message in self.queued[:3]]
+        self.post_action({'select_across': '0', helpers.ACTION_CHECKBOX_NAME: checked})
+
+        self.assertEqual(self.payloads[0]['pks'], [str(pk) for pk in checked])
+        self.assertEqual(
+            set(Message.objects.filter(status='sent').values_list('pk', flat=True)), set(checked)
+        )
+
+
+@override_settings(EMAIL_DOMAIN_LIMITS={'example.com': {'rate': 0.5, 'burst_seconds': 10}})
+class ClaimMessagesTests(TestCase):
+    """Захват очереди с лимитами доменов и кампаний."""
+
+    def setUp(self):
+        patcher = mock.patch('core.ratelimit._backend', LocalBucketBackend())
+        self.backend = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Дневной лимит 1440 дает корзину с запасом в один токен
+        self.limited = Campaign.objects.create(name='С лимитом', type='email', max_messages_per_day=1440)
+        self.unlimited = Campaign.objects.create(name='Без лимита', type='email')
+
+    def create_queued(self, campaign, count):
+        return [
+            Message.objects.create(
+                type='email', direction='outgoing', to_email=f'{campaign.pk}-{i}@example.com',
+                recipient_domain='example.com', subject='Здравствуйте', body='Текст',
+                status='queued', campaign=campaign
+            ).pk
+            for i in range(count)
+        ]
+
+    def test_campaign_limit_does_not_consume_domain_tokens(self):
+        limited = self.create_queued(self.limited, 5)
+        unlimited = self.create_queued(self.unlimited, 5)
+        slots = {}
+
+        claimed = claim_messages(10, slots=slots)
+
+        # В корзине домена 5 токенов: один на сообщение кампании с лимитом,
+        # остальные — другой кампании
+        self.assertEqual(len(claimed), 5)
+        self.assertEqual(len(set(claimed) & set(limited)), 1)
+        self.assertEqual(len(set(claimed) & set(unlimited)), 4)
+
+    def test_refunds_campaign_tokens_for_blocked_domain(self):
+        self.create_queued(self.limited, 1)
+        domain_bucket = TokenBucket('domain:example.com', 0.5, 5)
+        self.assertEqual(domain_bucket.acquire(5), 5)
+
+        self.assertEqual(claim_messages(10, slots={}), [])
+
+        campaign_bucket = TokenBucket.per_day(f'campaign:{self.limited.pk}:daily', 1440)
+        self.assertEqual(campaign_bucket.acquire(1), 1)
+
+
+class SuppressionTests(TestCase):
+    """Блокировка адресов по отказам и жалобам и фильтр fan-out."""
+
+    def create_message(self, **kwargs):
+        fields = {
+            'type': 'email', 'direction': 'outgoing', 'to_email': 'Client@Example.com',
+            'subject': 'Здравствуйте', 'body': 'Текст', 'status': 'sent',
+        }
+        fields.update(kwargs)
+        return Message.objects.create(**fields)
+
+    def test_hard_bounce_and_complaint_suppress_normalized_address(self):
+        email = self.create_message()
+        whatsapp = self.create_message(type='whatsapp', to_email=None, to_number='+7 (900) 123-45-67')
+
+        MessageEvent.objects.create(message=email, event_type='bounce', metadata={'bounce_type': 'hard'})
+        MessageEvent.objects.create(message=whatsapp, event_type='complaint')
+
+        self.assertEqual(
+            set(Suppression.objects.values_list('channel', 'address', 'reason')),
+            {('email', 'client@example.com', 'bounce'), ('whatsapp', '79001234567', 'complaint')}
+        )
+
+    def test_soft_bounce_does_not_suppress(self):
+        message = self.create_message()
+
+        MessageEvent.objects.create(message=message, event_type='bounce', metadata={'bounce_type': 'soft'})
+
+        self.assertFalse(Suppression.objects.exists())
+
+    def test_filter_excludes_suppressed_recipients(self):
+        MessageEvent.objects.create(message=self.create_message(), event_type='complaint')
+        suppressions = SuppressionFilter.load()
+        recipients = ['CLIENT@example.com ', 'other@example.com', None]
+
+        kept = suppressions.exclude('email', recipients, lambda address: address)
+
+        self.assertEqual(kept, ['other@example.com', None])
+        self.assertEqual(suppressions.excluded, 1)
+        self.assertEqual(SuppressionFilter([]).exclude('email', recipients, lambda address: address), recipients)
+
+    def test_hash_collision_is_confirmed_by_database(self):
+        MessageEvent.objects.create(message=self.create_message(), event_type='complaint')
+        suppressions = SuppressionFilter.load()
+        recipients = ['client@example.com', 'other@example.com']
+
+        # Все адреса дают одинаковый хеш: совпадение в массиве не блокирует адрес
+        with mock.patch('messaging.suppression.address_hash', return_value=suppressions.hashes[0]):
+            kept = suppressions.exclude('email', recipients, lambda address: address)
+
+        self.assertEqual(kept, ['other@example.com'])
+        self.assertEqual(suppressions.excluded, 1)
+
+
+@override_settings(MESSAGE_FREQUENCY_CAPS={'email': {'limit': 2, 'days': 7}})
+class FrequencyCapTests(TestCase):
+    """Частотные лимиты сообщений клиенту."""
+
+    def setUp(self):
+        self.client_a = Client.objects.create(first_name='Иван', last_name='Петров', email='a@example.com')
+        self.client_b = Client.objects.create(first_name='Анна', last_name='Смирнова', email='b@example.com')
+        self.today = timezone.localdate()
+
+    def build(self, client, message_type='email'):
+        return Message(type=message_type, direction='outgoing', client=client, body='Текст')
+
+    def test_excludes_clients_at_limit(self):
+        frequency = FrequencyCap.from_settings()
+        frequency.record([self.build(self.client_a), self.build(self.client_b)])
+        frequency.record([self.build(self.client_a)])
+        recipients = [self.client_a.pk, self.client_b.pk]
+
+        self.assertEqual(frequency.exclude('email', recipients, lambda client_id: client_id), [self.client_b.pk])
+        self.assertEqual(frequency.excluded, 1)
+        # Канал без лимита не ограничивается и не учитывается
+        self.assertEqual(frequency.exclude('whatsapp', recipients, lambda client_id: client_id), recipients)
+        frequency.record([self.build(self.client_a, 'whatsapp')])
+        self.assertFalse(ClientSendHistory.objects.filter(channel='whatsapp').exists())
+
+    def test_window_boundary(self):
+        # Окно из 7 дней включает текущий день и шесть предыдущих
+        record_sends('email', [self.client_a.pk], today=self.today - timedelta(days=7))
+        record_sends('email', [self.client_a.pk, self.client_b.pk], today=self.today - timedelta(days=6))
+        record_sends('email', [self.client_b.pk], today=self.today)
+
+        self.assertEqual(
+            capped_clients('email', [self.client_a.pk, self.client_b.pk], 2, 7, today=self.today),
+            {self.client_b.pk}
+        )
+
+        self.assertEqual(prune_history(today=self.today), 1)
+        self.assertEqual(ClientSendHistory.objects.count(), 3)
@@ -0,0 +1,183 @@
+"""
+Отслеживание открытий и кликов email-сообщений.
+
+Ссылки трекинга содержат подписанный токен (``django.core.signing``) с id
+сообщения и адресом перехода, поэтому обработчики не обращаются к базе:
+токен проверяется по подписи, событие кладется в буфер в памяти процесса, а
+ответ (пиксель или редирект) отдается сразу.
+
+Буфер сбрасывается фоновым потоком пачками в задачу
+``ingest_message_events`` — по размеру пачки или по интервалу времени, а
+также при завершении процесса. События, не сброшенные до аварийного
+завершения процесса, теряются: для статистики открытий это допустимо.
+"""
+import atexit
+import base64
+import html as html_lib
+import ipaddress
+import logging
+import re
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = 'messaging.tracking'
+
+# Прозрачный GIF 1x1
+PIXEL_GIF = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+HREF_RE = re.compile(r'''(<a\b[^>]*?\bhref\s*=\s*)(["'])(https?://[^"']+)\2''', re.IGNORECASE)
+
+
+def make_token(message_id, url=None):
+    """Создает подписанный токен трекинга."""
+    payload = {'m': message_id}
+    if url is not None:
+        payload['u'] = url
+    return signing.dumps(payload, salt=TOKEN_SALT, compress=True)
+
+
+def read_token(token):
+    """
+    Проверяет токен трекинга.
+
+    Returns:
+        tuple | None: (message_id, url) или ``None`` для неверного токена
+    """
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT)
+        return int(payload['m']), payload.get('u')
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+def _absolute(path):
+    base_url = getattr(settings, 'MESSAGING_TRACKING_BASE_URL', '')
+    return f"{base_url.rstrip('/')}{path}"
+
+
+def open_pixel_url(message):
+    """URL пикселя открытия для сообщения."""
+    return _absolute(reverse('message-track-open', args=[make_token(message.pk)]))
+
+
+def click_url(message, url):
+    """URL перехода по ссылке с трекингом клика."""
+    return _absolute(reverse('message-track-click', args=[make_token(message.pk, url)]))
+
+
+def apply_tracking(message, html):
+    """
+    Добавляет трекинг в HTML-тело сообщения.
+
+    Ссылки ``http(s)`` заменяются на ссылки трекинга кликов (если включен
+    ``track_clicks``), в конец добавляется пиксель открытия (если включен
+    ``track_opens``).
+    """
+    if message.track_clicks:
+        html = HREF_RE.sub(
+            lambda match: f'{match.group(1)}{match.group(2)}'
+                          f'{click_url(message, html_lib.unescape(match.group(3)))}{match.group(2)}',
+            html
+        )
+    if message.track_opens:
+        html += f'<img src="{open_pixel_url(message)}" width="1" height="1" alt="" />'
+    return html
+
+
+class EventBuffer:
+    """
+    Буфер событий трекинга с фоновым сбросом пачками.
+
+    ``add`` только добавляет событие в очередь; фоновый поток раз в
+    ``flush_interval`` секунд (или при накоплении ``batch_size`` событий)
+    передает пачку в ``flush_callback``.
+    """
+
+    def __init__(self, flush_callback, batch_size=500, flush_interval=1.0):
+        self.flush_callback = flush_callback
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._events = deque()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, event):
+        self._events.append(event)
+        if self._thread is None:
+            self._start()
+        if len(self._events) >= self.batch_size:
+            self._wakeup.set()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='tracking-event-buffer', daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Сбрасывает все накопленные события пачками."""
+        while self._events:
+            batch = []
+            while self._events and len(batch) < self.batch_size:
+                batch.append(self._events.popleft())
+            try:
+                self.flush_callback(batch)
+            except Exception:
+                logger.exception('Не удалось сбросить %d событий трекинга', len(batch))
+
+    def __len__(self):
+        return len(self._events)
+
+
+def _enqueue_events(events):
+    from .tasks import ingest_message_events
+    ingest_message_events.delay(events)
+
+
+event_buffer = EventBuffer(
+    _enqueue_events,
+    batch_size=getattr(settings, 'MESSAGING_TRACKING_BATCH_SIZE', 500),
+    flush_interval=getattr(settings, 'MESSAGING_TRACKING_FLUSH_INTERVAL', 1.0)
+)
+
+
+def client_ip(request):
+    """IP-адрес получателя с учетом X-Forwarded-For; ``None``, если неверный."""
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded:
+        address = forwarded.split(',', 1)[0].strip()
+    else:
+        address = request.META.get('REMOTE_ADDR', '')
+    try:
+        return str(ipaddress.ip_address(address))
+    except ValueError:
+        return None
+
+
+def record_event(request, message_id, event_type, url=None):
+    """Кладет событие трекинга в буфер."""
+    event_buffer.add({
+        'message_id': message_id,
+        'event_type': event_type,
+        'occurred_at': timezone.now().isoformat(),
+        'ip_address': client_ip(request),
+        'user_agent': request.META.get('HTTP_USER_AGENT'),
+        'url': url,
+    })
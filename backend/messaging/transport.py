@@ -0,0 +1,147 @@
+"""
+Пул SMTP-подключений воркера.
+
+Каждый процесс воркера Celery держит открытое SMTP-подключение и отправляет
+через него много писем подряд (без повторного ``EHLO``/``AUTH`` и TLS на
+каждое письмо). Подключение переоткрывается после
+``EMAIL_MAX_MESSAGES_PER_CONNECTION`` писем, после простоя дольше
+``EMAIL_CONNECTION_IDLE_TIMEOUT`` секунд и при разрыве соединения сервером.
+
+Параметры сервера берутся из стандартных настроек Django: ``EMAIL_HOST``,
+``EMAIL_PORT``, ``EMAIL_HOST_USER``, ``EMAIL_HOST_PASSWORD``,
+``EMAIL_USE_TLS``, ``EMAIL_USE_SSL``, ``EMAIL_TIMEOUT``.
+"""
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+
+# Результаты отправки одного письма
+SENT = 'sent'
+FAILED = 'failed'  # Постоянная ошибка (5xx): повторять бессмысленно
+DEFERRED = 'deferred'  # Временная ошибка (4xx, разрыв соединения)
+
+
+class SMTPConnection:
+    """Долгоживущее SMTP-подключение с отправкой писем по одному."""
+
+    def __init__(self, host=None, port=None, username=None, password=None,
+                 use_tls=None, use_ssl=None, timeout=None,
+                 max_messages=None, idle_timeout=None):
+        self.host = host or settings.EMAIL_HOST
+        self.port = port or settings.EMAIL_PORT
+        self.username = settings.EMAIL_HOST_USER if username is None else username
+        self.password = settings.EMAIL_HOST_PASSWORD if password is None else password
+        self.use_tls = settings.EMAIL_USE_TLS if use_tls is None else use_tls
+        self.use_ssl = settings.EMAIL_USE_SSL if use_ssl is None else use_ssl
+        self.timeout = settings.EMAIL_TIMEOUT if timeout is None else timeout
+        self.max_messages = max_messages or getattr(settings, 'EMAIL_MAX_MESSAGES_PER_CONNECTION', 500)
+        self.idle_timeout = idle_timeout or getattr(settings, 'EMAIL_CONNECTION_IDLE_TIMEOUT', 30)
+        self.smtp = None
+        self.sent_on_connection = 0
+        self.last_used = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def is_stale(self):
+        return (
+            self.smtp is None or
+            self.sent_on_connection >= self.max_messages or
+            time.monotonic() - self.last_used > self.idle_timeout
+        )
+
+    def open(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        smtp = smtp_class(self.host, self.port, timeout=self.timeout)
+        if self.use_tls and not self.use_ssl:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        self.smtp = smtp
+        self.sent_on_connection = 0
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+        finally:
+            self.smtp = None
+
+    def _ensure_open(self):
+        if self.is_stale:
+            self.close()
+            self.open()
+
+    def send(self, email_message):
+        """
+        Отправляет одно письмо через открытое подключение.
+
+        Args:
+            email_message (django.core.mail.EmailMessage): Письмо
+
+        Returns:
+            tuple: (результат, описание ошибки или None)
+        """
+        recipients = email_message.recipients()
+        if not recipients:
+            return FAILED, 'Нет получателей'
+        try:
+            data = email_message.message().as_bytes(linesep='\r\n')
+        except ValueError as exc:
+            # BadHeaderError (перевод строки в заголовке) и ошибки кодировки:
+            # письмо не может быть отправлено ни с какой попытки
+            return FAILED, str(exc)
+
+        for attempt in range(2):
+            try:
+                self._ensure_open()
+                self.smtp.sendmail(email_message.from_email, recipients, data)
+            except smtplib.SMTPServerDisconnected as exc:
+                # Сервер закрыл простаивающее подключение: одна повторная попытка
+                self.smtp = None
+                if attempt:
+                    return DEFERRED, str(exc)
+                continue
+            except smtplib.SMTPRecipientsRefused as exc:
+                codes = [code for code, _ in exc.recipients.values()]
+                result = FAILED if all(code >= 500 for code in codes) else DEFERRED
+                return result, str(exc.recipients)
+            except (smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as exc:
+                return (FAILED if exc.smtp_code >= 500 else DEFERRED), str(exc)
+            except (smtplib.SMTPException, OSError) as exc:
+                self.close()
+                return DEFERRED, str(exc)
+            self.sent_on_connection += 1
+            self.last_used = time.monotonic()
+            return SENT, None
+        return DEFERRED, 'Соединение закрыто сервером'
+
+
+class SMTPConnectionPool:
+    """Подключения процесса, по одному на сервер."""
+
+    def __init__(self):
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def get(self, **options):
+        key = tuple(sorted(options.items()))
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is None:
+                connection = self._connections[key] = SMTPConnection(**options)
+            return connection
+
+    def close_all(self):
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections.clear()
+
+
+smtp_pool = SMTPConnectionPool()
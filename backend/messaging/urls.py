@@ -1,12 +1,21 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MessageViewSet, MessageAttachmentViewSet, MessageEventViewSet
+from .views import (
+    MessageViewSet, MessageAttachmentViewSet, MessageEventViewSet, MessageDeadLetterViewSet,
+    SuppressionViewSet, MessageEventWebhookView,
+    track_open, track_click
+)
 
 router = DefaultRouter()
 router.register(r'messages', MessageViewSet)
 router.register(r'attachments', MessageAttachmentViewSet)
 router.register(r'events', MessageEventViewSet)
+router.register(r'dead-letters', MessageDeadLetterViewSet)
+router.register(r'suppressions', SuppressionViewSet)
 
 urlpatterns = [
+    path('webhooks/events/', MessageEventWebhookView.as_view(), name='message-event-webhook'),
+    path('track/open/<str:token>.gif', track_open, name='message-track-open'),
+    path('track/click/<str:token>/', track_click, name='message-track-click'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,31 +1,89 @@
-from rest_framework import viewsets, permissions, filters
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Message, MessageAttachment, MessageEvent
+from core.pagination import KeysetOrLimitOffsetPagination
+from core.queries import QueryPlanningMixin
+from . import tracking
+from .idempotency import MAX_API_KEY_LENGTH, api_message_key
+from .lanes import lane_statistics
+from .models import Message, MessageAttachment, MessageDeadLetter, MessageEvent, Suppression
+from .permissions import WebhookTokenPermission
+from .retry import requeue_dead_letters
 from .serializers import (
     MessageSerializer,
     MessageAttachmentSerializer,
-    MessageEventSerializer
+    MessageEventSerializer,
+    MessageDeadLetterSerializer,
+    SuppressionSerializer,
+    WebhookEventSerializer
 )
+from .tasks import ingest_message_events
 
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     """
     API для работы с сообщениями
     """
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
+    pagination_class = KeysetOrLimitOffsetPagination
+    keyset_ordering = '-created_at'
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [
         DjangoFilterBackend,
         filters.SearchFilter,
         filters.OrderingFilter
     ]
-    filterset_fields = ['type', 'direction', 'status', 'client', 'campaign']
+    filterset_fields = ['type', 'direction', 'status', 'lane', 'client', 'campaign']
     search_fields = ['subject', 'body', 'from_email', 'to_email', 'from_number', 'to_number']
     ordering_fields = ['created_at', 'sent_at', 'delivered_at', 'read_at']
 
+    def create(self, request, *args, **kwargs):
+        """
+        Создание сообщения.
 
-class MessageAttachmentViewSet(viewsets.ModelViewSet):
+        С заголовком ``Idempotency-Key`` повторный запрос с тем же ключом не
+        создает новое сообщение, а возвращает ранее созданное (200).
+        """
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > MAX_API_KEY_LENGTH:
+            return Response(
+                {'detail': f'Idempotency-Key не может быть длиннее {MAX_API_KEY_LENGTH} символов'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        key = api_message_key(request.user.pk, key)
+        existing = Message.objects.filter(idempotency_key=key).first()
+        if existing is None:
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            try:
+                with transaction.atomic():
+                    serializer.save(idempotency_key=key)
+            except IntegrityError:
+                # Параллельный запрос с тем же ключом успел создать сообщение
+                existing = Message.objects.get(idempotency_key=key)
+            else:
+                headers = self.get_success_headers(serializer.data)
+                return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def lanes(self, request):
+        """
+        Состояние линий отправки: размер очереди и задержка до отправки
+        """
+        return Response(lane_statistics())
+
+
+class MessageAttachmentViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     """
     API для работы с вложениями сообщений
     """
@@ -40,12 +98,14 @@ class MessageAttachmentViewSet(viewsets.ModelViewSet):
     search_fields = ['filename']
 
 
-class MessageEventViewSet(viewsets.ModelViewSet):
+class MessageEventViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     """
     API для работы с событиями сообщений
     """
     queryset = MessageEvent.objects.all()
     serializer_class = MessageEventSerializer
+    pagination_class = KeysetOrLimitOffsetPagination
+    keyset_ordering = '-occurred_at'
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [
         DjangoFilterBackend,
@@ -54,4 +114,109 @@ class MessageEventViewSet(viewsets.ModelViewSet):
     ]
     filterset_fields = ['message', 'event_type']
     search_fields = ['ip_address', 'user_agent']
-    ordering_fields = ['occurred_at']
\ No newline at end of file
+    ordering_fields = ['occurred_at']
+
+
+class MessageDeadLetterViewSet(QueryPlanningMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    API для просмотра неотправленных сообщений и возврата их в очередь
+    """
+    queryset = MessageDeadLetter.objects.all()
+    serializer_class = MessageDeadLetterSerializer
+    pagination_class = KeysetOrLimitOffsetPagination
+    keyset_ordering = '-created_at'
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [
+        DjangoFilterBackend,
+        filters.SearchFilter,
+        filters.OrderingFilter
+    ]
+    filterset_fields = ['reason', 'message__campaign', 'message__recipient_domain']
+    search_fields = ['error', 'message__to_email']
+    ordering_fields = ['created_at', 'attempts']
+
+    @action(detail=True, methods=['post'])
+    def requeue(self, request, pk=None):
+        """
+        Вернуть сообщение в очередь отправки
+        """
+        requeued = requeue_dead_letters(MessageDeadLetter.objects.filter(pk=self.get_object().pk))
+        return Response({'requeued': requeued})
+
+    @action(detail=False, methods=['post'], url_path='requeue')
+    def requeue_filtered(self, request):
+        """
+        Вернуть в очередь все сообщения, подходящие под фильтры запроса
+        """
+        queryset = self.filter_queryset(MessageDeadLetter.objects.all())
+        return Response({'requeued': requeue_dead_letters(queryset)})
+
+
+class SuppressionViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
+    """
+    API для работы со списком заблокированных адресов
+    """
+    queryset = Suppression.objects.all()
+    serializer_class = SuppressionSerializer
+    pagination_class = KeysetOrLimitOffsetPagination
+    keyset_ordering = '-created_at'
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [
+        DjangoFilterBackend,
+        filters.SearchFilter,
+        filters.OrderingFilter
+    ]
+    filterset_fields = ['channel', 'reason']
+    search_fields = ['address']
+    ordering_fields = ['created_at', 'address']
+
+
+class MessageEventWebhookView(APIView):
+    """
+    Прием пачки событий сообщений от провайдера.
+
+    Принимает список событий (или объект ``{"events": [...]}``), проверяет
+    его и ставит в очередь на сохранение. Статусы сообщений обновляются
+    асинхронно задачей ``ingest_message_events``.
+    """
+    authentication_classes = []
+    permission_classes = [WebhookTokenPermission]
+
+    def post(self, request):
+        payload = request.data
+        if isinstance(payload, dict):
+            payload = payload.get('events', [])
+
+        max_batch = getattr(settings, 'MESSAGING_WEBHOOK_MAX_BATCH', 1000)
+        if not isinstance(payload, list) or len(payload) > max_batch:
+            return Response(
+                {'detail': f'Ожидается список не более чем из {max_batch} событий'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = WebhookEventSerializer(data=payload, many=True)
+        serializer.is_valid(raise_exception=True)
+        events = WebhookEventSerializer(serializer.validated_data, many=True).data
+        if events:
+            ingest_message_events.delay(events)
+        return Response({'accepted': len(events)}, status=status.HTTP_202_ACCEPTED)
+
+
+def track_open(request, token):
+    """Пиксель открытия письма: событие пишется в буфер, ответ — GIF 1x1."""
+    data = tracking.read_token(token)
+    if data is not None:
+        tracking.record_event(request, data[0], 'open')
+    response = HttpResponse(tracking.PIXEL_GIF, content_type='image/gif')
+    response['Cache-Control'] = 'no-store, no-cache, must-revalidate, private'
+    return response
+
+
+def track_click(request, token):
+    """Переход по ссылке из письма: событие пишется в буфер, ответ — редирект."""
+    data = tracking.read_token(token)
+    if data is None or not data[1]:
+        raise Http404
+    message_id, url = data
+    tracking.record_event(request, message_id, 'click', url)
+    return HttpResponseRedirect(url)
@@ -15,6 +15,7 @@ class MessageTemplateAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
     filter_horizontal = ('categories',)
     inlines = [TemplateAttachmentInline]
+    readonly_fields = ('used_variables',)
     fieldsets = (
         ('Основная информация', {
             'fields': ('name', 'description', 'type', 'is_active')
@@ -23,7 +24,7 @@ class MessageTemplateAdmin(admin.ModelAdmin):
             'fields': ('subject', 'body', 'is_html')
         }),
         ('Переменные и категории', {
-            'fields': ('variables', 'categories')
+            'fields': ('variables', 'used_variables', 'categories')
         })
     )
     actions = ['duplicate_template']
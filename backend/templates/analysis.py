@@ -0,0 +1,77 @@
+"""
+Статический анализ переменных шаблонов сообщений.
+
+Определяет, какие переменные контекста реально используются шаблоном, чтобы
+при рассылке загружать из базы только нужные столбцы клиентов.
+"""
+from django.template import Template, TemplateSyntaxError
+from django.template.base import FilterExpression, Node, NodeList, Variable
+from django.template.defaulttags import ForNode, WithNode
+from django.template.smartif import TokenBase
+
+# Глубина пути переменной, которая сохраняется (client.company, но не глубже)
+MAX_PATH_DEPTH = 2
+
+
+def _variable_path(variable):
+    return '.'.join(variable.lookups[:MAX_PATH_DEPTH])
+
+
+def _collect_expression(expression, bound, found):
+    if isinstance(expression.var, Variable) and expression.var.lookups:
+        if expression.var.lookups[0] not in bound:
+            found.add(_variable_path(expression.var))
+    for _func, args in expression.filters:
+        for is_lookup, arg in args:
+            if is_lookup and arg.lookups and arg.lookups[0] not in bound:
+                found.add(_variable_path(arg))
+
+
+def _collect(value, bound, found):
+    """Рекурсивно собирает переменные из узлов и выражений шаблона."""
+    if isinstance(value, FilterExpression):
+        _collect_expression(value, bound, found)
+    elif isinstance(value, Variable):
+        if value.lookups and value.lookups[0] not in bound:
+            found.add(_variable_path(value))
+    elif isinstance(value, (list, tuple, NodeList)):
+        for item in value:
+            _collect(item, bound, found)
+    elif isinstance(value, dict):
+        for item in value.values():
+            _collect(item, bound, found)
+    elif isinstance(value, ForNode):
+        _collect(value.sequence, bound, found)
+        loop_bound = bound | set(value.loopvars) | {'forloop'}
+        _collect(value.nodelist_loop, loop_bound, found)
+        _collect(value.nodelist_empty, bound, found)
+    elif isinstance(value, WithNode):
+        _collect(value.extra_context, bound, found)
+        _collect(value.nodelist, bound | set(value.extra_context), found)
+    elif isinstance(value, (Node, TokenBase)):
+        for attribute, item in vars(value).items():
+            if attribute not in ('origin', 'token'):
+                _collect(item, bound, found)
+
+
+def extract_variables(*sources):
+    """
+    Возвращает переменные контекста, используемые в исходниках шаблонов.
+
+    Переменные, объявленные внутри шаблона (``{% for %}``, ``{% with %}``),
+    не учитываются. Пути обрезаются до двух уровней: ``client.company``.
+
+    Returns:
+        list | None: Отсортированный список путей или ``None``, если
+        шаблон не удалось разобрать
+    """
+    found = set()
+    for source in sources:
+        if not source:
+            continue
+        try:
+            nodelist = Template(source).nodelist
+        except TemplateSyntaxError:
+            return None
+        _collect(nodelist, frozenset(), found)
+    return sorted(found)
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template import Template, Context
+from django.utils import timezone
+
+from templates.models import MessageTemplate
+from templates.rendering import compiled_templates
+
+SAMPLE_SUBJECT = "{{ first_name }}, специальное предложение от {{ company }}"
+SAMPLE_BODY = """
+<html><body>
+<h1>Здравствуйте, {{ full_name }}!</h1>
+{% if company %}<p>Для компании {{ company }} подготовлено предложение.</p>{% endif %}
+<ul>{% for item in items %}<li>{{ forloop.counter }}. {{ item|upper }}</li>{% endfor %}</ul>
+<p>С уважением, команда.</p>
+</body></html>
+"""
+
+
+class Command(BaseCommand):
+    help = "Сравнивает стоимость рендеринга шаблона без кеша и с кешем скомпилированных шаблонов"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=10000, help="Количество получателей")
+        parser.add_argument('--template', type=int, help="id существующего шаблона (по умолчанию — пример)")
+
+    def handle(self, *args, **options):
+        recipients = options['recipients']
+        if options.get('template'):
+            template = MessageTemplate.objects.get(pk=options['template'])
+        else:
+            template = MessageTemplate(
+                pk=0, name="benchmark", type='email',
+                subject=SAMPLE_SUBJECT, body=SAMPLE_BODY, updated_at=timezone.now()
+            )
+
+        contexts = [
+            {
+                'first_name': f"Имя{i}", 'full_name': f"Имя{i} Фамилия{i}",
+                'company': f"Компания {i}" if i % 2 else None, 'items': ['a', 'b', 'c'],
+            }
+            for i in range(recipients)
+        ]
+
+        def render_uncached(context):
+            template_context = Context(context)
+            result = {'body': Template(template.body).render(template_context)}
+            if template.is_email_template and template.subject:
+                result['subject'] = Template(template.subject).render(template_context)
+            return result
+
+        compiled_templates.clear()
+        before = self._measure(render_uncached, contexts)
+        after = self._measure(template.render, contexts)
+
+        self.stdout.write(f"Получателей: {recipients}")
+        self.stdout.write(f"Без кеша: {before * 1e6 / recipients:.1f} мкс на рендер ({before:.2f} с)")
+        self.stdout.write(f"С кешем:  {after * 1e6 / recipients:.1f} мкс на рендер ({after:.2f} с)")
+        self.stdout.write(f"Ускорение: x{before / after:.1f}")
+
+    @staticmethod
+    def _measure(render, contexts):
+        started = time.perf_counter()
+        for context in contexts:
+            render(context)
+        return time.perf_counter() - started
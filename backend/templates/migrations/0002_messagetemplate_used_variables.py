@@ -0,0 +1,29 @@
+# Generated by Django 4.2.9 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+
+def fill_used_variables(apps, schema_editor):
+    from templates.analysis import extract_variables
+
+    MessageTemplate = apps.get_model('templates', 'MessageTemplate')
+    templates = list(MessageTemplate.objects.only('id', 'subject', 'body'))
+    for template in templates:
+        template.used_variables = extract_variables(template.subject, template.body)
+    MessageTemplate.objects.bulk_update(templates, ['used_variables'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('templates', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagetemplate',
+            name='used_variables',
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name='Используемые переменные'),
+        ),
+        migrations.RunPython(fill_used_variables, migrations.RunPython.noop),
+    ]
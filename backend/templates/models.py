@@ -27,6 +27,9 @@ class MessageTemplate(models.Model):
     variables = models.JSONField(_("Переменные шаблона"), blank=True, null=True,
                                  help_text=_("Доступные переменные, которые можно использовать в этом шаблоне"))
 
+    # Переменные, которые реально используются в теме и теле (вычисляются при сохранении)
+    used_variables = models.JSONField(_("Используемые переменные"), blank=True, null=True, editable=False)
+
     # Статус
     is_active = models.BooleanField(_("Активен"), default=True)
 
@@ -45,6 +48,14 @@ class MessageTemplate(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        from .analysis import extract_variables
+        self.used_variables = extract_variables(self.subject, self.body)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ({'subject', 'body'} & set(update_fields)):
+            kwargs['update_fields'] = set(update_fields) | {'used_variables'}
+        super().save(*args, **kwargs)
+
     @property
     def is_email_template(self):
         return self.type == 'email'
@@ -63,21 +74,33 @@ class MessageTemplate(models.Model):
         Returns:
             str: Отрендеренное содержимое шаблона
         """
-        from django.template import Template, Context
+        from django.template import Context
+        from .rendering import SubstitutionTemplate, get_compiled
+
+        # Берем скомпилированные шаблоны из кеша
+        template = get_compiled(self, 'body')
+        subject_template = None
+        if self.is_email_template and self.subject:
+            subject_template = get_compiled(self, 'subject')
 
-        # Создаем Django шаблон из тела
-        template = Template(self.body)
+        # Контекст Django создаем, только если он нужен: шаблоны из простых
+        # подстановок рендерятся напрямую по словарю
+        template_context = None
+        if not isinstance(template, SubstitutionTemplate) or (
+                subject_template is not None and not isinstance(subject_template, SubstitutionTemplate)):
+            template_context = Context(context)
 
-        # Создаем контекст
-        template_context = Context(context)
+        def render_part(compiled):
+            if isinstance(compiled, SubstitutionTemplate):
+                return compiled.render(context)
+            return compiled.render(template_context)
 
         # Рендерим и возвращаем
-        rendered_body = template.render(template_context)
+        rendered_body = render_part(template)
 
         # Если это email, также рендерим тему
-        if self.is_email_template and self.subject:
-            subject_template = Template(self.subject)
-            rendered_subject = subject_template.render(template_context)
+        if subject_template is not None:
+            rendered_subject = render_part(subject_template)
             return {
                 'subject': rendered_subject,
                 'body': rendered_body
@@ -85,6 +108,27 @@ class MessageTemplate(models.Model):
 
         return {'body': rendered_body}
 
+    def render_many(self, contexts, processes=None, chunk_size=200):
+        """
+        Рендерит шаблон для потока контекстов получателей.
+
+        Args:
+            contexts: Итерируемое со словарями контекста
+            processes (int): Количество процессов для рендеринга (по умолчанию
+                ``MESSAGE_RENDER_PROCESSES``, без пула — в текущем процессе)
+            chunk_size (int): Размер пачки, передаваемой в процесс пула
+
+        Yields:
+            dict: Отрендеренные ``subject`` и ``body`` в порядке контекстов
+        """
+        from django.conf import settings
+        from .rendering import BatchRenderer
+
+        if processes is None:
+            processes = getattr(settings, 'MESSAGE_RENDER_PROCESSES', None)
+        with BatchRenderer(self, processes=processes, chunk_size=chunk_size) as renderer:
+            yield from renderer.render_many(contexts)
+
 
 class TemplateCategory(models.Model):
     """Модель для категоризации шаблонов сообщений."""
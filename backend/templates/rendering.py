@@ -0,0 +1,325 @@
+"""
+Кеш скомпилированных шаблонов сообщений.
+
+``django.template.Template`` разбирает исходный текст при создании, поэтому
+при рассылке одного шаблона тысячам получателей разбор повторялся бы для
+каждого из них. Кеш хранит скомпилированные шаблоны в памяти процесса
+(LRU) по ключу (id шаблона, ``updated_at``, часть шаблона, хеш исходника) и
+сбрасывается при сохранении или удалении шаблона.
+
+Шаблоны, состоящие только из текста и простых подстановок ``{{ variable }}``
+(типичные шаблоны WhatsApp), компилируются в ``SubstitutionTemplate``,
+который рендерится без ``Context`` и дерева узлов Django.
+"""
+import logging
+import multiprocessing
+import re
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.template import Engine, Template
+from django.template.base import (
+    Lexer, TokenType, Variable, VariableDoesNotExist, render_value_in_context
+)
+from django.template.context import Context
+
+logger = logging.getLogger(__name__)
+
+# Простая подстановка: имя переменной, возможно с атрибутами через точку
+PLAIN_VARIABLE_RE = re.compile(r'^[^\W\d]\w*(?:\.\w+)*$')
+
+# Имена, которые Context разрешает не из словаря, а из своих атрибутов
+# или встроенных значений; такие шаблоны рендерятся через Django
+CONTEXT_RESERVED_NAMES = frozenset(
+    set(vars(Context(None))) | {'True', 'False', 'None', 'data'}
+)
+
+
+class _LookupScope:
+    """
+    Минимальная замена ``Context`` для ``Variable._resolve_lookup``.
+
+    Обращается к словарю контекста напрямую и предоставляет атрибуты,
+    которые Django читает при разрешении и выводе переменной.
+    """
+
+    __slots__ = ('data',)
+
+    autoescape = True
+    use_l10n = None
+    use_tz = None
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def template(self):
+        # Django обращается к context.template.engine при ошибках разрешения
+        return Template('')
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+
+class SubstitutionTemplate:
+    """
+    Скомпилированный шаблон из текста и простых подстановок переменных.
+
+    Результат совпадает с рендерингом через ``django.template.Template``:
+    переменные разрешаются тем же ``Variable``, значения выводятся через
+    ``render_value_in_context`` с автоэкранированием, отсутствующие
+    переменные дают пустую строку.
+    """
+
+    def __init__(self, parts):
+        # Части: строки текста или объекты Variable
+        self.parts = parts
+
+    @classmethod
+    def compile(cls, source):
+        """
+        Компилирует исходник, если он подходит для быстрого пути.
+
+        Returns:
+            SubstitutionTemplate | None: ``None``, если в шаблоне есть теги,
+            фильтры или нестандартные переменные
+        """
+        engine = Engine.get_default()
+        if engine.string_if_invalid:
+            return None
+
+        parts = []
+        for token in Lexer(source).tokenize():
+            if token.token_type == TokenType.TEXT:
+                parts.append(token.contents)
+            elif token.token_type == TokenType.COMMENT:
+                continue
+            elif token.token_type == TokenType.VAR:
+                name = token.contents
+                if not PLAIN_VARIABLE_RE.match(name) or name.startswith('_') or '._' in name:
+                    return None
+                if name.split('.', 1)[0] in CONTEXT_RESERVED_NAMES:
+                    return None
+                variable = Variable(name)
+                if variable.lookups is None or variable.translate:
+                    return None
+                parts.append(variable)
+            else:
+                return None
+        return cls(parts)
+
+    def render(self, context):
+        """
+        Рендерит шаблон.
+
+        Args:
+            context (dict): Словарь с переменными
+
+        Returns:
+            str: Отрендеренный текст
+        """
+        scope = _LookupScope(context)
+        output = []
+        for part in self.parts:
+            if isinstance(part, str):
+                output.append(part)
+                continue
+            try:
+                value = part._resolve_lookup(scope)
+            except VariableDoesNotExist:
+                value = ''
+            output.append(render_value_in_context(value, scope))
+        return ''.join(output)
+
+
+def compile_source(source):
+    """Компилирует исходник в быстрый или полноценный шаблон Django."""
+    if getattr(settings, 'MESSAGE_TEMPLATE_FAST_PATH', True):
+        compiled = SubstitutionTemplate.compile(source)
+        if compiled is not None:
+            return compiled
+    return Template(source)
+
+
+class CompiledTemplateCache:
+    """Потокобезопасный LRU-кеш скомпилированных шаблонов."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, source):
+        """Возвращает скомпилированный шаблон, компилируя его при промахе."""
+        with self._lock:
+            compiled = self._items.get(key)
+            if compiled is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return compiled
+
+        compiled = compile_source(source)
+
+        with self._lock:
+            self.misses += 1
+            self._items[key] = compiled
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return compiled
+
+    def invalidate(self, template_id):
+        """Удаляет из кеша все версии шаблона."""
+        with self._lock:
+            for key in [key for key in self._items if key[0] == template_id]:
+                del self._items[key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+
+compiled_templates = CompiledTemplateCache(
+    maxsize=getattr(settings, 'MESSAGE_TEMPLATE_CACHE_SIZE', 256)
+)
+
+
+def get_compiled(message_template, part):
+    """
+    Возвращает скомпилированную часть шаблона сообщения.
+
+    Args:
+        message_template (MessageTemplate): Шаблон сообщения
+        part (str): 'body' или 'subject'
+
+    Returns:
+        SubstitutionTemplate | Template: Скомпилированный шаблон
+    """
+    source = getattr(message_template, part)
+    if message_template.pk is None or message_template.updated_at is None:
+        # Несохраненные шаблоны не кешируем
+        return compile_source(source)
+    key = (message_template.pk, message_template.updated_at, part, hash(source))
+    return compiled_templates.get(key, source)
+
+
+# Шаблон, загруженный в процесс пула рендеринга
+_worker_template = None
+
+
+def _init_worker(template_fields):
+    """Инициализирует процесс пула: настраивает Django и создает шаблон."""
+    global _worker_template
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    from .models import MessageTemplate
+    _worker_template = MessageTemplate(**template_fields)
+
+
+def _render_chunk(contexts):
+    return [_worker_template.render(context) for context in contexts]
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BatchRenderer:
+    """
+    Потоковый рендеринг шаблона для множества получателей.
+
+    Без ``processes`` рендеринг идет в текущем процессе через
+    ``MessageTemplate.render``. С ``processes > 1`` контексты пачками
+    отправляются в пул процессов, каждый из которых один раз компилирует
+    шаблон и рендерит его тем же кодом, что и ``render``, поэтому результат
+    совпадает побайтно. Порядок результатов сохраняется, а количество
+    пачек в работе ограничено ``max_pending``: следующая пачка читается из
+    входного итератора только после выдачи самой старой.
+
+    Контексты должны сериализоваться через pickle (словари, экземпляры
+    моделей). Используется как контекстный менеджер, чтобы пул процессов
+    переиспользовался между вызовами ``render_many``.
+
+    Демоническим процессам (воркеры Celery с пулом prefork) запрещено
+    создавать дочерние процессы, поэтому в них рендеринг выполняется в
+    текущем процессе с предупреждением в лог.
+    """
+
+    def __init__(self, message_template, processes=None, chunk_size=200, max_pending=None):
+        self.message_template = message_template
+        self.processes = processes or 1
+        if self.processes > 1 and multiprocessing.current_process().daemon:
+            logger.warning(
+                'Рендеринг шаблона %s в пуле из %s процессов недоступен в демоническом '
+                'процессе (воркер Celery prefork); рендеринг выполняется в текущем процессе',
+                message_template.pk, self.processes
+            )
+            self.processes = 1
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending or self.processes * 2
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            template = self.message_template
+            fields = {
+                'pk': template.pk, 'type': template.type, 'subject': template.subject,
+                'body': template.body, 'updated_at': template.updated_at,
+            }
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes, initializer=_init_worker, initargs=(fields,)
+            )
+        return self._executor
+
+    def render_many(self, contexts):
+        """
+        Рендерит шаблон для каждого контекста.
+
+        Args:
+            contexts: Итерируемое со словарями контекста
+
+        Yields:
+            dict: Результат ``MessageTemplate.render`` в порядке контекстов
+        """
+        if self.processes <= 1:
+            for context in contexts:
+                yield self.message_template.render(context)
+            return
+
+        executor = self._get_executor()
+        pending = deque()
+        for chunk in _chunked(contexts, self.chunk_size):
+            pending.append(executor.submit(_render_chunk, chunk))
+            if len(pending) >= self.max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -1,30 +1,35 @@
 from rest_framework import serializers
+from core.serializers import DynamicFieldsModelSerializer
 from .models import MessageTemplate, TemplateCategory, TemplateAttachment
 
 
-class TemplateCategorySerializer(serializers.ModelSerializer):
+class TemplateCategorySerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = TemplateCategory
         fields = ['id', 'name', 'description', 'created_at']
 
 
-class TemplateAttachmentSerializer(serializers.ModelSerializer):
+class TemplateAttachmentSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = TemplateAttachment
         fields = ['id', 'file', 'filename', 'content_type', 'created_at']
 
 
-class MessageTemplateSerializer(serializers.ModelSerializer):
-    categories = TemplateCategorySerializer(many=True, read_only=True)
-    attachments = TemplateAttachmentSerializer(many=True, read_only=True)
+class MessageTemplateSerializer(DynamicFieldsModelSerializer):
+    categories = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    attachments = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
 
     class Meta:
         model = MessageTemplate
         fields = [
             'id', 'name', 'description', 'type',
             'subject', 'body', 'is_html',
-            'variables', 'is_active',
+            'variables', 'used_variables', 'is_active',
             'created_at', 'updated_at',
             'categories', 'attachments'
         ]
-        read_only_fields = ['created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['used_variables', 'created_at', 'updated_at']
+        expandable_fields = {
+            'categories': ('templates.serializers.TemplateCategorySerializer', {'many': True}),
+            'attachments': ('templates.serializers.TemplateAttachmentSerializer', {'many': True}),
+        }
\ No newline at end of file
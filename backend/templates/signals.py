@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import MessageTemplate
+from .rendering import compiled_templates
+
+
+@receiver(post_save, sender=MessageTemplate)
+@receiver(post_delete, sender=MessageTemplate)
+def invalidate_compiled_template(sender, instance, **kwargs):
+    """Сбрасывает скомпилированные версии шаблона после изменения."""
+    compiled_templates.invalidate(instance.pk)
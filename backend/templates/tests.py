@@ -1,3 +1,30 @@
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from .models import MessageTemplate
+from .rendering import BatchRenderer
+
+
+class BatchRendererTests(TestCase):
+    """Пакетный рендеринг шаблона."""
+
+    def setUp(self):
+        self.template = MessageTemplate.objects.create(
+            name='Приветствие', type='email', subject='Здравствуйте, {{ first_name }}',
+            body='{{ first_name }}, для вас скидка {{ discount }}%'
+        )
+        self.contexts = [{'first_name': f'Клиент {i}', 'discount': i} for i in range(5)]
+
+    def test_daemonic_process_renders_in_process(self):
+        daemon = mock.Mock(daemon=True)
+        with mock.patch('templates.rendering.multiprocessing.current_process', return_value=daemon), \
+                self.assertLogs('templates.rendering', level='WARNING'):
+            renderer = BatchRenderer(self.template, processes=4)
+
+        with renderer:
+            results = list(renderer.render_many(self.contexts))
+
+        self.assertEqual(renderer.processes, 1)
+        self.assertIsNone(renderer._executor)
+        self.assertEqual(results, [self.template.render(context) for context in self.contexts])
@@ -1,5 +1,6 @@
 from rest_framework import viewsets, permissions, filters
 from django_filters.rest_framework import DjangoFilterBackend
+from core.queries import QueryPlanningMixin
 from .models import MessageTemplate, TemplateCategory, TemplateAttachment
 from .serializers import (
     MessageTemplateSerializer,
@@ -8,7 +9,7 @@ from .serializers import (
 )
 
 
-class MessageTemplateViewSet(viewsets.ModelViewSet):
+class MessageTemplateViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     """
     API для работы с шаблонами сообщений
     """
@@ -25,7 +26,7 @@ class MessageTemplateViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'updated_at']
 
 
-class TemplateCategoryViewSet(viewsets.ModelViewSet):
+class TemplateCategoryViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     """
     API для работы с категориями шаблонов
     """
@@ -37,7 +38,7 @@ class TemplateCategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at']
 
 
-class TemplateAttachmentViewSet(viewsets.ModelViewSet):
+class TemplateAttachmentViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     """
     API для работы с вложениями шаблонов
     """